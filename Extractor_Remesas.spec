@@ -10,8 +10,8 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
-    noarchive=True,
+    excludes=['matplotlib', 'scipy', 'IPython', 'jupyter', 'notebook', 'PyQt5', 'PyQt6', 'PySide2', 'PySide6', 'pytest', 'sphinx', 'docutils', 'setuptools', 'lib2to3', 'xmlrpc', 'PIL'],
+    noarchive=False,
     optimize=0,
 )
 pyz = PYZ(a.pure)
@@ -21,12 +21,12 @@ exe = EXE(
     a.scripts,
     a.binaries,
     a.datas,
-    [('v', None, 'OPTION')],
+    [],
     name='Extractor_Remesas',
-    debug=True,
+    debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,
     upx_exclude=[],
     runtime_tmpdir=None,
     console=False,
@@ -0,0 +1,134 @@
+import re
+import threading
+
+MARCA_ENTRADA = '=== DOCUMENTO {numero} ==='
+_PATRON_MARCA_SALIDA = re.compile(r'^\s*#+\s*DOCUMENTO\s+(\d+)\s*$', re.IGNORECASE)
+
+def componer_documentos(textos: list) -> str:
+    """Une varios textos en un único bloque, cada uno precedido de su delimitador"""
+    return '\n\n'.join(f"{MARCA_ENTRADA.format(numero=i)}\n{texto}" for i, texto in enumerate(textos, 1))
+
+def dividir_respuesta_lote(respuesta: str, num_documentos: int, num_columnas: int) -> list:
+    """
+    Separa la respuesta de una petición agrupada en el TSV de cada documento,
+    usando las líneas '### DOCUMENTO n'. Retorna una lista con num_documentos
+    elementos; un documento cuya sección falta o tiene alguna línea con un
+    número de columnas distinto de num_columnas queda como None.
+    """
+    secciones = {}
+    actual = None
+    for linea in respuesta.splitlines():
+        marca = _PATRON_MARCA_SALIDA.match(linea)
+        if marca:
+            actual = int(marca.group(1))
+            # Un número repetido invalida la sección: no se sabe qué líneas son de cuál
+            secciones[actual] = None if actual in secciones else []
+            continue
+        if actual is None or secciones.get(actual) is None or not linea.strip():
+            continue
+        secciones[actual].append(linea)
+
+    resultado = []
+    for numero in range(1, num_documentos + 1):
+        lineas = secciones.get(numero)
+        if not lineas or any(len(linea.split('\t')) != num_columnas for linea in lineas):
+            resultado.append(None)
+        else:
+            resultado.append('\n'.join(lineas))
+    return resultado
+
+class _Pendiente:
+    def __init__(self, texto: str, tokens: int):
+        self.texto = texto
+        self.tokens = tokens
+        self.resultado = None
+        self.terminado = threading.Event()
+
+class AgrupadorDocumentos:
+    """
+    Agrupa documentos pequeños que llegan desde varios hilos en una sola
+    petición al modelo. Cada hilo llama a estructurar(texto) y queda bloqueado
+    hasta tener su resultado. El lote se envía en cuanto alcanza
+    max_documentos o max_tokens, o cuando el primer documento lleva
+    espera_maxima segundos esperando; lo envía el hilo que lo completa o el
+    primero que se cansa de esperar, sin hilos adicionales.
+
+    enviar_lote(textos) debe retornar una lista con el TSV de cada texto (None
+    si no se pudo separar) y estructurar_individual(texto) se usa para
+    reenviar por separado los documentos que fallen dentro del lote.
+    """
+
+    def __init__(self, enviar_lote, estructurar_individual, max_documentos: int = 8,
+                 max_tokens: int = 4000, espera_maxima: float = 0.5, estimar_tokens=len):
+        self.enviar_lote = enviar_lote
+        self.estructurar_individual = estructurar_individual
+        self.max_documentos = max_documentos
+        self.max_tokens = max_tokens
+        self.espera_maxima = espera_maxima
+        self.estimar_tokens = estimar_tokens
+        self.lotes_enviados = 0
+        self.documentos_agrupados = 0
+        self.reenvios_individuales = 0
+        self._lote = []
+        self._tokens_lote = 0
+        self._lock = threading.Lock()
+
+    def _tomar_lote(self):
+        lote = self._lote
+        self._lote = []
+        self._tokens_lote = 0
+        return lote
+
+    def estructurar(self, texto: str):
+        pendiente = _Pendiente(texto, self.estimar_tokens(texto))
+        lote = None
+        with self._lock:
+            # Si el documento no cabe en el lote en curso, ese lote sale primero
+            if self._lote and self._tokens_lote + pendiente.tokens > self.max_tokens:
+                lote = self._tomar_lote()
+            self._lote.append(pendiente)
+            self._tokens_lote += pendiente.tokens
+            completo = len(self._lote) >= self.max_documentos or self._tokens_lote >= self.max_tokens
+        if lote:
+            self._procesar(lote)
+        if completo:
+            with self._lock:
+                lote = self._tomar_lote() if pendiente in self._lote else None
+            if lote:
+                self._procesar(lote)
+
+        if not pendiente.terminado.wait(self.espera_maxima):
+            with self._lock:
+                lote = self._tomar_lote() if pendiente in self._lote else None
+            if lote:
+                self._procesar(lote)
+            pendiente.terminado.wait()
+        return pendiente.resultado
+
+    def _procesar(self, lote: list) -> None:
+        try:
+            if len(lote) == 1:
+                resultados = [self.estructurar_individual(lote[0].texto)]
+            else:
+                try:
+                    resultados = self.enviar_lote([p.texto for p in lote])
+                except Exception as e:
+                    print(f"⚠️ Falló la petición agrupada de {len(lote)} documentos: {e}")
+                    resultados = [None] * len(lote)
+                with self._lock:
+                    self.lotes_enviados += 1
+                    self.documentos_agrupados += len(lote)
+            for pendiente, resultado in zip(lote, resultados):
+                if resultado is None and len(lote) > 1:
+                    # Su parte de la respuesta no se pudo separar: se envía solo
+                    with self._lock:
+                        self.reenvios_individuales += 1
+                    resultado = self.estructurar_individual(pendiente.texto)
+                pendiente.resultado = resultado
+        finally:
+            for pendiente in lote:
+                pendiente.terminado.set()
+
+    def resumen(self) -> str:
+        return (f"{self.lotes_enviados} peticiones agrupadas con {self.documentos_agrupados} documentos, "
+                f"{self.reenvios_individuales} reenviados por separado")
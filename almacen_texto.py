@@ -0,0 +1,91 @@
+import os
+import gzip
+import json
+import threading
+from manifiesto import calcular_hash_archivo
+from cache_llm import purgar_directorio
+
+def directorio_por_defecto() -> str:
+    return os.getenv("ALMACEN_TEXTO_DIR") or os.path.join(
+        os.path.expanduser("~"), ".extractor_remesas", "textos")
+
+class AlmacenTexto:
+    """
+    Almacén en disco del texto ya extraído de los PDFs. Cada entrada es un
+    archivo JSON comprimido con el texto de cada página, indexado por el hash
+    del contenido del PDF y por las opciones de extracción (incluida la versión
+    de PyMuPDF, que puede cambiar el resultado). Un PDF que no ha cambiado no
+    se vuelve a analizar, aunque se haya renombrado o copiado a otra carpeta.
+    Como la caché de respuestas, purgar() elimina las entradas sin usar desde
+    hace más de max_edad_segundos y, por encima de max_bytes, las menos usadas.
+    """
+
+    def __init__(self, directorio: str = None, max_bytes: int = 500 * 1024 * 1024,
+                 max_edad_segundos: float = 90 * 24 * 3600):
+        self.directorio = directorio or directorio_por_defecto()
+        self.max_bytes = max_bytes
+        self.max_edad_segundos = max_edad_segundos
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def _ruta(self, hash_pdf: str, ordenar: bool) -> str:
+        import fitz  # PyMuPDF
+
+        opciones = f"sort{int(ordenar)}-mupdf{fitz.VersionBind}"
+        return os.path.join(self.directorio, f"{hash_pdf}-{opciones}.json.gz")
+
+    def obtener(self, hash_pdf: str, ordenar: bool):
+        """
+        Retorna la lista de textos por página guardada, o None si no existe. Una
+        entrada dañada (cortada o con otro contenido) se elimina y cuenta como fallo.
+        """
+        ruta = self._ruta(hash_pdf, ordenar)
+        try:
+            with gzip.open(ruta, 'rt', encoding='utf-8') as f:
+                paginas = json.load(f)['paginas']
+            if not isinstance(paginas, list) or not all(isinstance(p, str) for p in paginas):
+                raise ValueError('entrada con otro contenido')
+            # Actualizar la fecha de uso para que la purga por tamaño sea LRU
+            os.utime(ruta, None)
+        except FileNotFoundError:
+            with self._lock:
+                self.fallos += 1
+            return None
+        except (OSError, EOFError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ Entrada del almacén de textos dañada ({e}); se vuelve a extraer.")
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+            with self._lock:
+                self.fallos += 1
+            return None
+        with self._lock:
+            self.aciertos += 1
+        return paginas
+
+    def guardar(self, hash_pdf: str, ordenar: bool, paginas: list) -> None:
+        """Guarda el texto de las páginas de forma atómica (temporal + renombrado)"""
+        ruta = self._ruta(hash_pdf, ordenar)
+        ruta_tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with gzip.open(ruta_tmp, 'wt', encoding='utf-8') as f:
+                json.dump({'paginas': paginas}, f, ensure_ascii=False)
+            os.replace(ruta_tmp, ruta)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el texto extraído: {e}")
+            if os.path.exists(ruta_tmp):
+                os.remove(ruta_tmp)
+
+    def purgar(self) -> int:
+        """Elimina las entradas antiguas y las menos usadas por encima de max_bytes. Retorna cuántas"""
+        return purgar_directorio(self.directorio, '.json.gz', self.max_bytes, self.max_edad_segundos)
+
+    @staticmethod
+    def hash_pdf(ruta_pdf: str) -> str:
+        return calcular_hash_archivo(ruta_pdf)
+
+    def resumen(self) -> str:
+        return f"{self.aciertos} aciertos, {self.fallos} fallos"
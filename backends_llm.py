@@ -0,0 +1,290 @@
+"""
+Backends del modelo de lenguaje.
+
+llamar_modelo solo necesita un objeto con generar(prompt, generation_config)
+que devuelva una respuesta con .text y .usage_metadata (prompt_token_count,
+candidates_token_count, total_token_count), igual que la de Gemini, y
+generar_streaming(prompt), que devuelve el texto a trozos según lo produce el
+modelo. Así el prompt, la caché, el limitador y el análisis de la respuesta
+no dependen del proveedor. Se incluyen:
+
+- 'gemini': la API de Google (google.generativeai).
+- 'openai': un servidor compatible con la API de OpenAI (/v1/chat/completions),
+  por ejemplo llama.cpp (llama-server) o vLLM en una máquina propia.
+
+Para añadir otro basta con una subclase de BackendLLM registrada con
+@registrar_backend.
+"""
+
+import json
+import threading
+import http.client
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+_BACKENDS = {}
+
+def registrar_backend(clase):
+    """Decorador que registra la clase del backend con su nombre"""
+    _BACKENDS[clase.nombre] = clase
+    return clase
+
+def backends_disponibles() -> list:
+    return sorted(_BACKENDS)
+
+def crear_backend(nombre: str, **opciones):
+    """Crea el backend registrado con ese nombre; ValueError si no existe"""
+    clase = _BACKENDS.get((nombre or '').strip().lower())
+    if clase is None:
+        raise ValueError(f"Backend de modelo desconocido: '{nombre}'. Disponibles: {', '.join(backends_disponibles())}")
+    return clase(**opciones)
+
+class FlujoRespuesta:
+    """
+    Respuesta en streaming: al iterarla se obtienen los trozos de texto según
+    llegan. usage_metadata está disponible cuando se ha consumido entera.
+    """
+
+    def __init__(self, generador):
+        self.usage_metadata = None
+        self._generador = generador(self)
+
+    def __iter__(self):
+        return self._generador
+
+class BackendLLM:
+    """
+    Interfaz de un backend. Las subclases implementan generar y, si el
+    servidor lo admite, generar_streaming
+    """
+
+    nombre = 'base'
+
+    def __init__(self, modelo: str):
+        self.modelo = modelo
+
+    @property
+    def identificador(self) -> str:
+        """Identifica backend y modelo (forma parte de la clave de la caché de respuestas)"""
+        return f"{self.nombre}:{self.modelo}"
+
+    def generar(self, prompt: str, generation_config: dict = None):
+        raise NotImplementedError
+
+    def generar_streaming(self, prompt: str, generation_config: dict = None) -> FlujoRespuesta:
+        """Por defecto, la respuesta completa como un único trozo"""
+        def trozos(flujo):
+            respuesta = self.generar(prompt, generation_config)
+            flujo.usage_metadata = getattr(respuesta, 'usage_metadata', None)
+            yield respuesta.text
+        return FlujoRespuesta(trozos)
+
+@registrar_backend
+class BackendGemini(BackendLLM):
+    """API de Gemini. El GenerativeModel se crea en la primera petición"""
+
+    nombre = 'gemini'
+
+    def __init__(self, modelo: str, api_key: str = None, **_):
+        super().__init__(modelo)
+        self.api_key = api_key
+        self._modelo = None
+        self._lock = threading.Lock()
+
+    @property
+    def identificador(self) -> str:
+        # Sin prefijo: las entradas de caché anteriores siguen siendo válidas
+        return self.modelo
+
+    def _cliente(self):
+        with self._lock:
+            if self._modelo is None:
+                import google.generativeai as genai
+
+                if self.api_key:
+                    genai.configure(api_key=self.api_key)
+                self._modelo = genai.GenerativeModel(self.modelo)
+            return self._modelo
+
+    def generar(self, prompt: str, generation_config: dict = None):
+        argumentos = {'generation_config': generation_config} if generation_config else {}
+        return self._cliente().generate_content(prompt, **argumentos)
+
+    def generar_streaming(self, prompt: str, generation_config: dict = None) -> FlujoRespuesta:
+        argumentos = {'generation_config': generation_config} if generation_config else {}
+
+        def trozos(flujo):
+            respuesta = self._cliente().generate_content(prompt, stream=True, **argumentos)
+            for trozo in respuesta:
+                try:
+                    texto = trozo.text
+                except ValueError:
+                    # Trozo sin texto (solo el motivo de finalización)
+                    continue
+                if texto:
+                    yield texto
+            flujo.usage_metadata = getattr(respuesta, 'usage_metadata', None)
+        return FlujoRespuesta(trozos)
+
+class ErrorBackend(Exception):
+    """Respuesta de error de un servidor de modelos"""
+
+# Los nombres coinciden con los que limitador.es_error_de_cuota reconoce como reintentables
+class TooManyRequests(ErrorBackend):
+    pass
+
+class ServiceUnavailable(ErrorBackend):
+    pass
+
+def _esquema_openai(esquema):
+    """Adapta el esquema de respuesta de Gemini al JSON Schema que esperan llama.cpp y vLLM"""
+    if isinstance(esquema, dict):
+        adaptado = {clave: _esquema_openai(valor) for clave, valor in esquema.items() if clave != 'nullable'}
+        if esquema.get('nullable') and isinstance(adaptado.get('type'), str):
+            adaptado['type'] = [adaptado['type'], 'null']
+        return adaptado
+    if isinstance(esquema, list):
+        return [_esquema_openai(valor) for valor in esquema]
+    return esquema
+
+@registrar_backend
+class BackendOpenAI(BackendLLM):
+    """
+    Cliente HTTP de un servidor compatible con OpenAI (chat/completions).
+    Cada hilo mantiene su propia conexión persistente (keep-alive) para no
+    pagar el establecimiento de la conexión en cada documento. El modo JSON
+    con esquema de respuesta se traduce a response_format de tipo json_schema.
+    """
+
+    nombre = 'openai'
+
+    def __init__(self, modelo: str, url: str = 'http://localhost:8080/v1', api_key: str = None,
+                 timeout: float = 600, max_tokens: int = None, **_):
+        super().__init__(modelo)
+        partes = urlsplit(url)
+        if partes.scheme not in ('http', 'https') or not partes.hostname:
+            raise ValueError(f"URL del servidor de modelos no válida: '{url}'")
+        self.url = url.rstrip('/')
+        self._https = partes.scheme == 'https'
+        self._host = partes.hostname
+        self._puerto = partes.port
+        self._ruta = partes.path.rstrip('/') + '/chat/completions'
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+        self._local = threading.local()
+
+    @property
+    def identificador(self) -> str:
+        return f"{self.nombre}:{self.url}:{self.modelo}"
+
+    def _conexion(self, nueva: bool = False):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None or nueva:
+            if conexion is not None:
+                conexion.close()
+            clase = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            conexion = clase(self._host, self._puerto, timeout=self.timeout)
+            self._local.conexion = conexion
+        return conexion
+
+    def _cuerpo(self, prompt: str, generation_config: dict, stream: bool = False) -> dict:
+        cuerpo = {
+            'model': self.modelo,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'temperature': 0,
+        }
+        if stream:
+            # include_usage: el último evento trae los tokens consumidos
+            cuerpo.update(stream=True, stream_options={'include_usage': True})
+        if self.max_tokens:
+            cuerpo['max_tokens'] = self.max_tokens
+        if generation_config and generation_config.get('response_schema'):
+            cuerpo['response_format'] = {
+                'type': 'json_schema',
+                'json_schema': {'name': 'remesa', 'schema': _esquema_openai(generation_config['response_schema'])},
+            }
+        elif generation_config and generation_config.get('response_mime_type') == 'application/json':
+            cuerpo['response_format'] = {'type': 'json_object'}
+        return cuerpo
+
+    def _enviar(self, cuerpo: dict):
+        """Envía la petición y retorna la respuesta HTTP (sin leer) si es 200; si no, lanza el error"""
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8')
+        cabeceras = {'Content-Type': 'application/json'}
+        if self.api_key:
+            cabeceras['Authorization'] = f"Bearer {self.api_key}"
+        # Si el servidor cerró la conexión persistente se reintenta una vez con una nueva
+        for intento in range(2):
+            conexion = self._conexion(nueva=intento > 0)
+            try:
+                conexion.request('POST', self._ruta, body=datos, headers=cabeceras)
+                respuesta = conexion.getresponse()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                conexion.close()
+                self._local.conexion = None
+                if intento:
+                    raise
+        if respuesta.status == 200:
+            return respuesta
+        mensaje = f"HTTP {respuesta.status} de {self.url}: {respuesta.read()[:300].decode('utf-8', 'replace')}"
+        reintentar_en = respuesta.getheader('Retry-After')
+        if reintentar_en and reintentar_en.strip().replace('.', '', 1).isdigit():
+            mensaje += f" (retry in {reintentar_en.strip()}s)"
+        if respuesta.status == 429:
+            raise TooManyRequests(mensaje)
+        if respuesta.status == 503:
+            raise ServiceUnavailable(mensaje)
+        raise ErrorBackend(mensaje)
+
+    @staticmethod
+    def _uso(datos: dict):
+        uso = datos.get('usage') or {}
+        return SimpleNamespace(
+            prompt_token_count=uso.get('prompt_tokens', 0),
+            candidates_token_count=uso.get('completion_tokens', 0),
+            total_token_count=uso.get('total_tokens', 0),
+        )
+
+    def generar(self, prompt: str, generation_config: dict = None):
+        cuerpo = self._enviar(self._cuerpo(prompt, generation_config)).read()
+        try:
+            datos = json.loads(cuerpo)
+            texto = datos['choices'][0]['message'].get('content') or ''
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise ErrorBackend(f"Respuesta no válida de {self.url}: {e}") from e
+        return SimpleNamespace(text=texto, usage_metadata=self._uso(datos))
+
+    def generar_streaming(self, prompt: str, generation_config: dict = None) -> FlujoRespuesta:
+        """Lee los eventos 'data: {...}' (server-sent events) hasta 'data: [DONE]'"""
+        def trozos(flujo):
+            respuesta = self._enviar(self._cuerpo(prompt, generation_config, stream=True))
+            terminada = False
+            try:
+                for linea in respuesta:
+                    linea = linea.strip()
+                    if not linea.startswith(b'data:'):
+                        continue
+                    evento = linea[5:].strip()
+                    if evento == b'[DONE]':
+                        break
+                    try:
+                        datos = json.loads(evento)
+                    except ValueError as e:
+                        raise ErrorBackend(f"Evento no válido de {self.url}: {e}") from e
+                    if datos.get('usage'):
+                        flujo.usage_metadata = self._uso(datos)
+                    for opcion in datos.get('choices') or []:
+                        texto = (opcion.get('delta') or {}).get('content')
+                        if texto:
+                            yield texto
+                respuesta.read()
+                terminada = True
+            finally:
+                if not terminada:
+                    # Respuesta a medio leer: la conexión no se puede reutilizar
+                    respuesta.close()
+                    self._conexion().close()
+                    self._local.conexion = None
+        return FlujoRespuesta(trozos)
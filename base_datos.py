@@ -0,0 +1,278 @@
+import os
+import re
+import io
+import csv
+import sys
+import sqlite3
+import argparse
+import threading
+
+NOMBRE_BASE_DATOS = 'remesas.sqlite'
+
+# Columnas con significado propio en la base de datos (el resto se guardan tal cual)
+COLUMNA_ARCHIVO = 'Archivo_Origen'
+COLUMNA_REFERENCIA = 'Referencia Única del Documento'
+COLUMNA_IBAN = 'IBAN'
+COLUMNA_EMISOR = 'Emisor'
+COLUMNA_VENCIMIENTO = 'Vencimiento'
+COLUMNA_FECHA = 'Fecha del Documento'
+
+# Columnas auxiliares de la tabla de filas: la clave (junto con el archivo y la
+# referencia), el orden de la fila en su TSV, la versión del archivo que la
+# escribió y los valores normalizados por los que se consulta
+COLUMNAS_INTERNAS = ['ocurrencia', 'posicion', 'version', 'iban_normalizado', 'vencimiento_iso', 'fecha_documento_iso']
+
+_PATRON_FECHA = re.compile(r'(\d{2})/(\d{2})/(\d{4})')
+
+def ruta_base_datos_activa(directorio_salida: str):
+    """
+    BASE_DATOS_SQLITE en el .env: 1 para guardar las filas en
+    output/remesas.sqlite, o la ruta de la base de datos. Vacío (por
+    defecto) la desactiva.
+    """
+    valor = os.getenv("BASE_DATOS_SQLITE", "").strip()
+    if not valor or valor.lower() in ("0", "no", "false"):
+        return None
+    if valor.lower() in ("1", "si", "sí", "true"):
+        return os.path.join(directorio_salida, NOMBRE_BASE_DATOS)
+    return valor
+
+def fecha_iso(valor: str):
+    """DD/MM/YYYY -> YYYY-MM-DD (ordenable); None si no tiene ese formato"""
+    coincidencia = _PATRON_FECHA.fullmatch((valor or '').strip())
+    if not coincidencia:
+        return None
+    dia, mes, anio = coincidencia.groups()
+    return f"{anio}-{mes}-{dia}"
+
+def _iban_normalizado(valor: str) -> str:
+    return re.sub(r'\s+', '', valor or '').upper()
+
+def _id(columna: str) -> str:
+    return '"' + columna.replace('"', '""') + '"'
+
+class BaseDatosRemesas:
+    """
+    Base de datos SQLite con las filas de los TSV de cada documento, para
+    consultar y exportar subconjuntos (por IBAN, emisor o fechas) sin
+    recorrer el archivo combinado. Las filas se insertan o actualizan
+    (upsert) con la clave (Archivo_Origen, Referencia Única del Documento,
+    ocurrencia), donde la ocurrencia distingue las filas de un archivo con la
+    misma referencia (o sin ella). De cada archivo se guarda el tamaño y la
+    fecha de su TSV: solo se vuelven a leer los TSV nuevos o modificados.
+    Con columnas=None se abre una base de datos existente con sus columnas.
+    """
+
+    def __init__(self, ruta: str, columnas: list = None):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(directorio, exist_ok=True)
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        existentes = [fila[1] for fila in self._conexion.execute("PRAGMA table_info(filas)")]
+        if existentes:
+            self.columnas = [c for c in existentes if c not in COLUMNAS_INTERNAS]
+            if columnas is not None and list(columnas) != self.columnas:
+                # Otras columnas (nueva versión del programa): se reconstruye desde los TSV
+                print("⚠️ Las columnas de la base de datos han cambiado; se vuelve a crear.")
+                with self._conexion:
+                    self._conexion.execute("DROP TABLE filas")
+                    self._conexion.execute("DROP TABLE IF EXISTS documentos")
+                existentes = []
+        if not existentes:
+            if columnas is None:
+                raise ValueError(f"'{ruta}' no es una base de datos de remesas")
+            self.columnas = list(columnas)
+            self._crear_tablas()
+
+    def _crear_tablas(self) -> None:
+        faltan = [c for c in (COLUMNA_ARCHIVO, COLUMNA_REFERENCIA, COLUMNA_IBAN, COLUMNA_EMISOR,
+                              COLUMNA_VENCIMIENTO, COLUMNA_FECHA) if c not in self.columnas]
+        if faltan:
+            raise ValueError(f"Faltan las columnas: {', '.join(faltan)}")
+        datos = ', '.join(f"{_id(c)} TEXT NOT NULL DEFAULT ''" for c in self.columnas)
+        with self._conexion:
+            self._conexion.execute(
+                f"CREATE TABLE filas ({datos}, ocurrencia INTEGER NOT NULL, posicion INTEGER NOT NULL, "
+                f"version INTEGER NOT NULL, iban_normalizado TEXT, vencimiento_iso TEXT, fecha_documento_iso TEXT, "
+                f"PRIMARY KEY ({_id(COLUMNA_ARCHIVO)}, {_id(COLUMNA_REFERENCIA)}, ocurrencia))")
+            indices = {
+                'filas_orden': f"{_id(COLUMNA_ARCHIVO)}, posicion",
+                'filas_iban': 'iban_normalizado',
+                'filas_emisor': f"{_id(COLUMNA_EMISOR)}, fecha_documento_iso",
+                'filas_vencimiento': 'vencimiento_iso',
+                'filas_fecha': 'fecha_documento_iso',
+            }
+            for nombre, columnas in indices.items():
+                self._conexion.execute(f"CREATE INDEX {nombre} ON filas ({columnas})")
+            self._conexion.execute(
+                "CREATE TABLE documentos (archivo TEXT PRIMARY KEY, tamano INTEGER, mtime_ns INTEGER, "
+                "filas INTEGER, version INTEGER NOT NULL)")
+
+    @staticmethod
+    def _firma(ruta_tsv: str):
+        estado = os.stat(ruta_tsv)
+        return estado.st_size, estado.st_mtime_ns
+
+    def _filas_tsv(self, nombre: str, ruta_tsv: str, version: int):
+        """Filas del TSV con las columnas de la tabla, en el orden del archivo"""
+        with open(ruta_tsv, 'r', encoding='utf-8', newline='') as f:
+            lector = csv.reader(f, delimiter='\t')
+            cabecera = next(lector, [])
+            posiciones = [cabecera.index(c) if c in cabecera else None for c in self.columnas]
+            indice = {c: self.columnas.index(c) for c in (COLUMNA_ARCHIVO, COLUMNA_REFERENCIA, COLUMNA_IBAN,
+                                                          COLUMNA_VENCIMIENTO, COLUMNA_FECHA)}
+            ocurrencias = {}
+            for posicion, campos in enumerate(lector):
+                fila = [campos[i] if i is not None and i < len(campos) else '' for i in posiciones]
+                fila[indice[COLUMNA_ARCHIVO]] = nombre
+                referencia = fila[indice[COLUMNA_REFERENCIA]]
+                ocurrencia = ocurrencias.get(referencia, 0)
+                ocurrencias[referencia] = ocurrencia + 1
+                yield fila + [ocurrencia, posicion, version, _iban_normalizado(fila[indice[COLUMNA_IBAN]]),
+                              fecha_iso(fila[indice[COLUMNA_VENCIMIENTO]]), fecha_iso(fila[indice[COLUMNA_FECHA]])]
+
+    def actualizar_archivo(self, nombre: str, ruta_tsv: str):
+        """
+        Inserta o actualiza las filas del TSV de un archivo y elimina las que
+        ya no están en él, en una sola transacción. Retorna el número de
+        filas, o None si el TSV no ha cambiado desde la última vez.
+        """
+        firma = self._firma(ruta_tsv)
+        todas = self.columnas + COLUMNAS_INTERNAS
+        clave = {COLUMNA_ARCHIVO, COLUMNA_REFERENCIA, 'ocurrencia'}
+        insertar = (f"INSERT INTO filas ({', '.join(_id(c) for c in todas)}) VALUES ({', '.join('?' * len(todas))}) "
+                    f"ON CONFLICT ({_id(COLUMNA_ARCHIVO)}, {_id(COLUMNA_REFERENCIA)}, ocurrencia) DO UPDATE SET "
+                    + ', '.join(f"{_id(c)} = excluded.{_id(c)}" for c in todas if c not in clave))
+        with self._lock, self._conexion:
+            anterior = self._conexion.execute(
+                "SELECT tamano, mtime_ns, version FROM documentos WHERE archivo = ?", (nombre,)).fetchone()
+            if anterior is not None and tuple(anterior[:2]) == tuple(firma):
+                return None
+            version = anterior[2] + 1 if anterior is not None else 1
+            filas = self._conexion.executemany(insertar, self._filas_tsv(nombre, ruta_tsv, version)).rowcount
+            self._conexion.execute(f"DELETE FROM filas WHERE {_id(COLUMNA_ARCHIVO)} = ? AND version < ?", (nombre, version))
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO documentos (archivo, tamano, mtime_ns, filas, version) VALUES (?, ?, ?, ?, ?)",
+                (nombre, firma[0], firma[1], filas, version))
+        return filas
+
+    def eliminar_archivo(self, nombre: str) -> None:
+        with self._lock, self._conexion:
+            self._conexion.execute(f"DELETE FROM filas WHERE {_id(COLUMNA_ARCHIVO)} = ?", (nombre,))
+            self._conexion.execute("DELETE FROM documentos WHERE archivo = ?", (nombre,))
+
+    def sincronizar(self, archivos: dict) -> tuple:
+        """
+        Deja en la base de datos exactamente los archivos indicados
+        (nombre -> ruta de su TSV): actualiza los TSV nuevos o modificados y
+        elimina los archivos que ya no están. Retorna
+        (archivos actualizados, filas escritas, archivos eliminados).
+        """
+        with self._lock:
+            registrados = {fila[0] for fila in self._conexion.execute("SELECT archivo FROM documentos")}
+        eliminados = registrados - set(archivos)
+        for nombre in eliminados:
+            self.eliminar_archivo(nombre)
+        actualizados = filas = 0
+        for nombre, ruta_tsv in archivos.items():
+            try:
+                escritas = self.actualizar_archivo(nombre, ruta_tsv)
+            except (OSError, csv.Error) as e:
+                print(f"⚠️ No se pudo guardar {nombre} en la base de datos: {e}")
+                continue
+            if escritas is not None:
+                actualizados += 1
+                filas += escritas
+        return actualizados, filas, len(eliminados)
+
+    def consultar(self, iban: str = None, emisor: str = None, desde: str = None, hasta: str = None,
+                  vencimiento_desde: str = None, vencimiento_hasta: str = None, archivo: str = None):
+        """
+        Filas (listas de valores, en el orden de las columnas) que cumplen
+        todos los filtros indicados, en el orden del archivo combinado. desde
+        y hasta filtran (inclusive) por Fecha del Documento y
+        vencimiento_desde y vencimiento_hasta por Vencimiento; las fechas se
+        indican como DD/MM/YYYY o YYYY-MM-DD.
+        """
+        condiciones, parametros = [], []
+        if iban:
+            condiciones.append("iban_normalizado = ?")
+            parametros.append(_iban_normalizado(iban))
+        if emisor:
+            condiciones.append(f"{_id(COLUMNA_EMISOR)} = ?")
+            parametros.append(emisor)
+        if archivo:
+            condiciones.append(f"{_id(COLUMNA_ARCHIVO)} = ?")
+            parametros.append(archivo)
+        for columna, operador, valor in (('fecha_documento_iso', '>=', desde), ('fecha_documento_iso', '<=', hasta),
+                                         ('vencimiento_iso', '>=', vencimiento_desde),
+                                         ('vencimiento_iso', '<=', vencimiento_hasta)):
+            if valor:
+                condiciones.append(f"{columna} {operador} ?")
+                parametros.append(fecha_iso(valor) or valor)
+        consulta = f"SELECT {', '.join(_id(c) for c in self.columnas)} FROM filas"
+        if condiciones:
+            consulta += " WHERE " + " AND ".join(condiciones)
+        consulta += f" ORDER BY {_id(COLUMNA_ARCHIVO)}, posicion"
+        with self._lock:
+            filas = self._conexion.execute(consulta, parametros).fetchall()
+        for fila in filas:
+            yield list(fila)
+
+    def exportar_tsv(self, destino, **filtros) -> int:
+        """
+        Escribe en destino (ruta o archivo abierto) un TSV con el formato del
+        combinado con las filas de consultar(**filtros). Retorna el número de filas.
+        """
+        if isinstance(destino, str):
+            with open(destino, 'w', encoding='utf-8', newline='') as f:
+                return self.exportar_tsv(f, **filtros)
+        escritor = csv.writer(destino, delimiter='\t', lineterminator=os.linesep)
+        escritor.writerow(self.columnas)
+        filas = 0
+        for fila in self.consultar(**filtros):
+            escritor.writerow(fila)
+            filas += 1
+        return filas
+
+    def total_filas(self) -> int:
+        with self._lock:
+            return self._conexion.execute("SELECT COUNT(*) FROM filas").fetchone()[0]
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._conexion.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta a TSV las filas de la base de datos de remesas que cumplen los filtros.")
+    parser.add_argument('base_datos', help=f"Ruta de la base de datos (por ejemplo output/{NOMBRE_BASE_DATOS}).")
+    parser.add_argument('--iban')
+    parser.add_argument('--emisor')
+    parser.add_argument('--desde', help="Fecha del Documento mínima (DD/MM/YYYY).")
+    parser.add_argument('--hasta', help="Fecha del Documento máxima (DD/MM/YYYY).")
+    parser.add_argument('--vencimiento-desde')
+    parser.add_argument('--vencimiento-hasta')
+    parser.add_argument('--archivo', help="Solo las filas de este PDF.")
+    parser.add_argument('-o', '--salida', help="TSV de salida (por defecto, la salida estándar).")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.base_datos):
+        print(f"❌ No existe la base de datos '{args.base_datos}'.", file=sys.stderr)
+        return 1
+    base_datos = BaseDatosRemesas(args.base_datos)
+    filtros = {clave: valor for clave, valor in vars(args).items() if clave not in ('base_datos', 'salida')}
+    try:
+        if args.salida:
+            filas = base_datos.exportar_tsv(args.salida, **filtros)
+            print(f"✅ {filas} fila(s) exportadas a {args.salida}")
+        else:
+            salida = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline='')
+            base_datos.exportar_tsv(salida, **filtros)
+            salida.flush()
+            salida.detach()
+    finally:
+        base_datos.cerrar()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import os
+import sys
+import json
+import time
+import platform
+import statistics
+import argparse
+import subprocess
+from datetime import datetime
+
+def medir_arranque(comando: list, repeticiones: int) -> list:
+    """
+    Lanza `comando --medir-arranque` varias veces y mide el tiempo de reloj
+    hasta que el proceso termina. Con esa opción main.py sale justo en el
+    punto en el que mostraría el diálogo de selección de carpeta, así que el
+    tiempo medido es el tiempo hasta el diálogo (descompresión del ejecutable
+    e importaciones incluidas).
+    """
+    entorno = dict(os.environ)
+    # La comprobación de la API Key ocurre antes del diálogo: basta con un valor ficticio
+    entorno.setdefault("GOOGLE_API_KEY", "benchmark")
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = subprocess.run(comando + ['--medir-arranque'], env=entorno,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        tiempos.append(time.perf_counter() - inicio)
+        if resultado.returncode != 0:
+            raise RuntimeError(f"El comando terminó con código {resultado.returncode}: {' '.join(comando)}")
+    return tiempos
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el tiempo de arranque hasta el diálogo de selección de carpeta.")
+    parser.add_argument('--ejecutable', help="Ejecutable a medir (por defecto: python main.py).")
+    parser.add_argument('--repeticiones', type=int, default=10)
+    parser.add_argument('--etiqueta', default='', help="Versión o nombre de la build, para comparar entre releases.")
+    parser.add_argument('--salida', default=os.path.join('benchmarks', 'arranque.jsonl'),
+                        help="Archivo JSONL al que se añade el resultado.")
+    args = parser.parse_args()
+
+    if args.ejecutable:
+        comando = [os.path.abspath(args.ejecutable)]
+    else:
+        comando = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')]
+
+    print(f"⏱️ Midiendo arranque de: {' '.join(comando)} ({args.repeticiones} repeticiones)")
+    tiempos = medir_arranque(comando, args.repeticiones)
+
+    # La primera ejecución es la más lenta (caché de disco fría, descompresión del onefile)
+    resultado = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'etiqueta': args.etiqueta,
+        'comando': os.path.basename(comando[-1]),
+        'plataforma': platform.platform(),
+        'python': platform.python_version(),
+        'repeticiones': args.repeticiones,
+        'primera_s': round(tiempos[0], 4),
+        'mediana_s': round(statistics.median(tiempos), 4),
+        'minimo_s': round(min(tiempos), 4),
+        'maximo_s': round(max(tiempos), 4),
+    }
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+
+    directorio = os.path.dirname(args.salida)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    with open(args.salida, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(resultado, ensure_ascii=False) + '\n')
+    print(f"✅ Resultado añadido a {args.salida}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
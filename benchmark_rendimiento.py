@@ -0,0 +1,265 @@
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import threading
+import contextlib
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+import fitz  # PyMuPDF
+
+import main
+from backends_llm import BackendLLM, FlujoRespuesta
+from respuesta_json import CAMPOS
+
+NOMBRES = ['Ana', 'Luis', 'Marta', 'Jorge', 'Lucia', 'Pablo', 'Elena', 'Carlos', 'Sara', 'Diego']
+APELLIDOS = ['Garcia', 'Lopez', 'Martin', 'Sanchez', 'Perez', 'Gomez', 'Ruiz', 'Diaz', 'Moreno', 'Romero']
+EMISORES = ['Distribuciones Norte SL', 'Talleres Levante SA', 'Suministros Ibericos SL', 'Comercial Sur SA']
+LINEAS_POR_PAGINA_MAX = 60
+
+_PATRON_DETALLE = re.compile(r'^(R\d{6})\s+(.+?)\s+([A-Z]{2}\d{2}[A-Z0-9]{11,30})\s+([\d.,]+)\s+(\d{2}/\d{2}/\d{4})\s*$', re.MULTILINE)
+_PATRONES_CABECERA = {
+    'emisor': r'^Emisor:\s*(.+?)\s*$',
+    'identificacion_emisor': r'^Identificaci.n del Emisor:\s*(\S+)',
+    'referencia_fichero': r'^Referencia del Fichero:\s*(\S+)',
+    'fecha_recepcion': r'Fecha de Recepci.n:\s*(\d{2}/\d{2}/\d{4})',
+    'fecha_documento': r'Fecha del Documento:\s*(\d{2}/\d{2}/\d{4})',
+}
+
+def iban_espanol(rnd: random.Random) -> str:
+    """IBAN español aleatorio con dígitos de control correctos"""
+    bban = ''.join(rnd.choice('0123456789') for _ in range(20))
+    return f"ES{98 - int(bban + '142800') % 97:02d}{bban}"
+
+def importe_espanol(valor: float) -> str:
+    return f"{valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+def generar_remesa(ruta_pdf: str, paginas: int, filas_por_pagina: int, rnd: random.Random) -> int:
+    """
+    Genera un PDF de remesa sintético: encabezado repetido en cada página,
+    una tabla de líneas de detalle (referencia, librado, IBAN, importe con
+    formato español y vencimiento) y el número de página al pie.
+    Retorna el número de líneas de detalle.
+    """
+    fecha = datetime(2025, 1, 1) + timedelta(days=rnd.randint(0, 300))
+    encabezado = [
+        f"Emisor: {rnd.choice(EMISORES)}",
+        f"Identificación del Emisor: ES{rnd.randint(10, 99)}000B{rnd.randint(10000000, 99999999)}",
+        f"Referencia del Fichero: PRE{rnd.randint(10 ** 9, 10 ** 10 - 1)}",
+        f"Fecha de Recepción: {(fecha + timedelta(days=1)):%d/%m/%Y}   Fecha del Documento: {fecha:%d/%m/%Y}",
+        "",
+        "Referencia   Librado   IBAN   Importe   Vencimiento",
+    ]
+    filas_por_pagina = min(filas_por_pagina, LINEAS_POR_PAGINA_MAX)
+    documento = fitz.open()
+    numero = 0
+    for indice in range(paginas):
+        lineas = list(encabezado)
+        for _ in range(filas_por_pagina):
+            numero += 1
+            vencimiento = fecha + timedelta(days=rnd.randint(10, 90))
+            lineas.append(f"R{numero:06d}  {rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}  {iban_espanol(rnd)}  "
+                          f"{importe_espanol(rnd.uniform(5, 5000))}  {vencimiento:%d/%m/%Y}")
+        lineas += ["", f"Página {indice + 1} de {paginas}"]
+        documento.new_page().insert_text((36, 40), "\n".join(lineas), fontsize=7)
+    documento.save(ruta_pdf)
+    documento.close()
+    return numero
+
+def generar_corpus(directorio: str, documentos: int, paginas: tuple, filas: tuple, semilla: int) -> int:
+    """Genera `documentos` remesas con páginas y filas por página aleatorias dentro de los rangos"""
+    rnd = random.Random(semilla)
+    total_filas = 0
+    for i in range(documentos):
+        total_filas += generar_remesa(os.path.join(directorio, f"remesa_{i:04d}.pdf"),
+                                      rnd.randint(*paginas), rnd.randint(*filas), rnd)
+    return total_filas
+
+def _respuesta_documento(texto: str, formato: str) -> str:
+    """Respuesta que daría el modelo para el texto de un documento, en el formato pedido"""
+    cabecera = {campo: (re.search(patron, texto, re.MULTILINE) or [None, 'null'])[1]
+                for campo, patron in _PATRONES_CABECERA.items()}
+    filas = []
+    for referencia, nombre, iban, importe, vencimiento in _PATRON_DETALLE.findall(texto):
+        filas.append(dict(cabecera, referencia_unica=referencia, nombre_librado=nombre, iban=iban,
+                          importe=importe.replace('.', '').replace(',', '.'), vencimiento=vencimiento,
+                          referencia_unica_documento=cabecera['referencia_fichero']))
+    if formato == 'json':
+        return json.dumps(filas, ensure_ascii=False)
+    if formato == 'compacto':
+        lineas = ['\t'.join(['CABECERA'] + [cabecera[c] for c in _PATRONES_CABECERA])]
+        detalle = ['referencia_unica', 'nombre_librado', 'iban', 'importe', 'vencimiento', 'referencia_unica_documento']
+        return '\n'.join(lineas + ['\t'.join(fila[c] for c in detalle) for fila in filas])
+    return '\n'.join('\t'.join(fila[c] for c in CAMPOS) for fila in filas)
+
+class ModeloSimulado(BackendLLM):
+    """
+    Backend simulado: generar espera latencia ± jitter segundos y responde
+    con las filas que contiene el prompt, en el formato que pide (completo,
+    compacto, JSON o varios documentos agrupados), con su usage_metadata;
+    generar_streaming entrega la respuesta a trozos. Como sustituye solo al backend, el limitador, los reintentos y el informe
+    de ejecución funcionan igual que con la API real.
+    """
+
+    nombre = 'simulado'
+
+    def __init__(self, latencia: float, jitter: float, semilla: int):
+        super().__init__('simulado')
+        self.latencia = latencia
+        self.jitter = jitter
+        self._rnd = random.Random(semilla)
+        self._lock = threading.Lock()
+
+    def generar(self, prompt: str, generation_config: dict = None):
+        with self._lock:
+            espera = max(0.0, self.latencia + self._rnd.uniform(-self.jitter, self.jitter))
+        time.sleep(espera)
+        if '=== DOCUMENTO' in prompt:
+            partes = re.split(r'^=== DOCUMENTO (\d+) ===$', prompt, flags=re.MULTILINE)
+            texto = '\n'.join(f"### DOCUMENTO {numero}\n{_respuesta_documento(cuerpo, 'completo')}"
+                              for numero, cuerpo in zip(partes[1::2], partes[2::2]))
+        else:
+            formato = 'json' if generation_config else ('compacto' if 'CABECERA\t' in prompt else 'completo')
+            texto = _respuesta_documento(prompt, formato)
+        return SimpleNamespace(text=texto, usage_metadata=self._uso(prompt, texto))
+
+    @staticmethod
+    def _uso(prompt: str, texto: str):
+        tokens_prompt = main.estimar_tokens(prompt)
+        tokens_respuesta = main.estimar_tokens(texto)
+        return SimpleNamespace(prompt_token_count=tokens_prompt, candidates_token_count=tokens_respuesta,
+                               total_token_count=tokens_prompt + tokens_respuesta)
+
+    def generar_streaming(self, prompt: str, generation_config: dict = None):
+        """
+        El primer trozo llega al 10% de la latencia (procesado del prompt) y
+        el resto de la respuesta, en trozos de ~200 caracteres, se reparte el
+        tiempo restante, como cuando el modelo genera tokens a ritmo constante
+        """
+        with self._lock:
+            latencia = max(0.0, self.latencia + self._rnd.uniform(-self.jitter, self.jitter))
+        formato = 'compacto' if 'CABECERA\t' in prompt else 'completo'
+        texto = _respuesta_documento(prompt, formato)
+        trozos = [texto[i:i + 200] for i in range(0, len(texto), 200)] or ['']
+
+        def generar(flujo):
+            time.sleep(latencia * 0.1)
+            for trozo in trozos:
+                time.sleep(latencia * 0.9 / len(trozos))
+                yield trozo
+            flujo.usage_metadata = self._uso(prompt, texto)
+        return FlujoRespuesta(generar)
+
+def memoria_pico_mb():
+    """Memoria residente máxima del proceso (no disponible en Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def ejecutar_benchmark(args) -> dict:
+    main.configurar_backend(ModeloSimulado(args.latencia, args.jitter, args.semilla))
+    main.configurar_agrupador(main.crear_agrupador())
+    main.configurar_peticiones_en_curso(args.concurrencia)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        print(f"📄 Generando {args.documentos} remesas sintéticas...")
+        filas_esperadas = generar_corpus(directorio, args.documentos, args.paginas, args.filas, args.semilla)
+        pool = main.crear_pool_extraccion(args.procesos_extraccion)
+        main.configurar_pool_extraccion(pool)
+        # Los tiempos por etapa y los tokens salen del informe de ejecución
+        informe = main.InformeEjecucion(os.path.join(directorio, 'output'))
+        main.configurar_informe(informe)
+        print(f"⏱️ Procesando {filas_esperadas} líneas de detalle (concurrencia {args.concurrencia})...")
+        salida = sys.stdout if args.detalle else io.StringIO()
+        try:
+            inicio = time.perf_counter()
+            with contextlib.redirect_stdout(salida):
+                procesados = main.procesar_carpeta(directorio, args.concurrencia)
+            total = time.perf_counter() - inicio
+        finally:
+            main.configurar_pool_extraccion(None)
+            main.configurar_informe(None)
+            if pool is not None:
+                pool.shutdown()
+        resumen = informe.cerrar()
+        with open(os.path.join(directorio, 'output', main.NOMBRE_COMBINADO), encoding='utf-8') as f:
+            filas = sum(1 for _ in f) - 1
+
+    # Segundos por etapa sumados entre todos los archivos (e hilos), más las etapas de la ejecución
+    etapas = dict(resumen['etapas'], **resumen['etapas_ejecucion'])
+    # Sin streaming, las filas de un archivo aparecen cuando termina
+    primeras_filas = [r.get('segundos_primera_fila', r['segundos']) for r in informe.registros if r['ok']]
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'etiqueta': args.etiqueta,
+        'plataforma': platform.platform(),
+        'python': platform.python_version(),
+        'documentos': args.documentos,
+        'paginas': list(args.paginas),
+        'filas_por_pagina': list(args.filas),
+        'latencia_s': args.latencia,
+        'jitter_s': args.jitter,
+        'concurrencia': args.concurrencia,
+        'procesos_extraccion': args.procesos_extraccion,
+        'formato_respuesta': os.getenv('FORMATO_RESPUESTA', 'completo'),
+        'respuesta_streaming': main.respuesta_streaming_activa(),
+        'procesados': len(procesados),
+        'filas_esperadas': filas_esperadas,
+        'filas': filas,
+        'peticiones': resumen['peticiones'],
+        'tokens_prompt': resumen['tokens_prompt'],
+        'tokens_respuesta': resumen['tokens_respuesta'],
+        'segundos_total': round(total, 4),
+        'archivos_por_s': round(len(procesados) / total, 3) if total else None,
+        'filas_por_s': round(filas / total, 1) if total else None,
+        'primera_fila_media_s': round(sum(primeras_filas) / len(primeras_filas), 4) if primeras_filas else None,
+        'memoria_pico_mb': memoria_pico_mb(),
+        'etapas_s': etapas,
+    }
+
+def _rango(valor: str) -> tuple:
+    """'3' -> (3, 3); '1-5' -> (1, 5)"""
+    minimo, _, maximo = valor.partition('-')
+    return int(minimo), int(maximo or minimo)
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Mide el rendimiento del procesamiento sin llamar a la API, "
+                                                 "con remesas PDF sintéticas y un modelo simulado.")
+    parser.add_argument('--documentos', type=int, default=50)
+    parser.add_argument('--paginas', type=_rango, default=(1, 5), help="Páginas por documento, p. ej. 1-5.")
+    parser.add_argument('--filas', type=_rango, default=(5, 40),
+                        help=f"Líneas de detalle por página, p. ej. 5-40 (máx. {LINEAS_POR_PAGINA_MAX}).")
+    parser.add_argument('--latencia', type=float, default=1.0, help="Segundos por llamada al modelo simulado.")
+    parser.add_argument('--jitter', type=float, default=0.3, help="Variación aleatoria (±) de la latencia.")
+    parser.add_argument('--concurrencia', type=int, default=4)
+    parser.add_argument('--procesos-extraccion', type=int, default=1)
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--etiqueta', default='', help="Versión o nombre de la prueba, para comparar entre cambios.")
+    parser.add_argument('--detalle', action='store_true', help="Mostrar la salida del procesamiento.")
+    parser.add_argument('--salida', default=os.path.join('benchmarks', 'rendimiento.jsonl'),
+                        help="Archivo JSONL al que se añade el resultado.")
+    args = parser.parse_args()
+
+    resultado = ejecutar_benchmark(args)
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+
+    directorio = os.path.dirname(args.salida)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    with open(args.salida, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(resultado, ensure_ascii=False) + '\n')
+    print(f"✅ Resultado añadido a {args.salida}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main_benchmark())
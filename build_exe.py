@@ -63,7 +63,26 @@ VSVersionInfo(
     with open('file_version_info.txt', 'w', encoding='utf-8') as f:
         f.write(version_file)
 
+# Módulos que PyInstaller arrastra a través de pandas/google pero que la
+# aplicación nunca usa; excluirlos reduce el tamaño y el tiempo de arranque
+MODULOS_EXCLUIDOS = [
+    'matplotlib', 'scipy', 'IPython', 'jupyter', 'notebook', 'PyQt5', 'PyQt6',
+    'PySide2', 'PySide6', 'pytest', 'sphinx', 'docutils', 'setuptools',
+    'lib2to3', 'xmlrpc',
+    # Pillow solo se usa al construir, para generar el icono
+    'PIL',
+]
+
 def main():
+    """
+    Uso: python build_exe.py [--onedir] [--debug]
+      --onedir  genera una carpeta en lugar de un único .exe: arranca mucho más
+                rápido porque no hay que descomprimir nada en cada ejecución
+      --debug   incluye el bootloader de depuración (más lento, solo para diagnosticar)
+    """
+    onedir = '--onedir' in sys.argv[1:]
+    debug = '--debug' in sys.argv[1:]
+
     # Obtener la ruta absoluta del directorio actual
     current_dir = os.path.dirname(os.path.abspath(__file__))
     
@@ -79,20 +98,24 @@ def main():
     # Definir los archivos y opciones para PyInstaller
     options = [
         'main.py',  # Script principal
-        '--onefile',  # Crear un solo archivo ejecutable
+        '--onedir' if onedir else '--onefile',  # Carpeta (arranque rápido) o un solo ejecutable
         '--windowed',  # No mostrar la consola en Windows
         '--name', 'Extractor_Remesas',  # Nombre del ejecutable
         '--icon', os.path.join(current_dir, 'resources', 'app_icon.ico'),  # Icono de la aplicación
         '--version-file', 'file_version_info.txt',  # Información de versión
         '--clean',  # Limpiar archivos temporales
         '--noconfirm',  # No preguntar sobre sobreescribir
-        '--debug', 'all',  # Mantener logs para debugging
+        '--noupx',  # UPX reduce el tamaño pero hay que descomprimir en cada arranque
         # Añadir los hooks necesarios para las dependencias
         '--hidden-import', 'google.generativeai',
         '--hidden-import', 'pandas',
         '--hidden-import', 'fitz',
     '--hidden-import', 'dotenv',
     ]
+    if debug:
+        options.extend(['--debug', 'all'])  # Logs del bootloader para diagnosticar
+    for modulo in MODULOS_EXCLUIDOS:
+        options.extend(['--exclude-module', modulo])
     
     # Agregar archivos de datos
     data_files = [
@@ -107,7 +130,10 @@ def main():
     try:
         PyInstaller.__main__.run(options)
         print("\n✅ Ejecutable creado exitosamente en la carpeta 'dist'")
-        print(f"📁 Ruta: {os.path.join(current_dir, 'dist', 'Extractor_Remesas.exe')}")
+        if onedir:
+            print(f"📁 Ruta: {os.path.join(current_dir, 'dist', 'Extractor_Remesas', 'Extractor_Remesas.exe')}")
+        else:
+            print(f"📁 Ruta: {os.path.join(current_dir, 'dist', 'Extractor_Remesas.exe')}")
     except Exception as e:
         print(f"\n❌ Error al crear el ejecutable: {e}")
         sys.exit(1)
@@ -0,0 +1,167 @@
+import os
+import time
+import hashlib
+import threading
+import contextlib
+
+def _eliminar_archivo(ruta: str) -> int:
+    try:
+        os.remove(ruta)
+        return 1
+    except OSError:
+        return 0
+
+def purgar_directorio(directorio: str, extension: str, max_bytes: int, max_edad_segundos: float) -> int:
+    """
+    Elimina de directorio los archivos con la extensión indicada que llevan más
+    de max_edad_segundos sin usarse (según su fecha de modificación, que se
+    actualiza en cada lectura) y, si los demás siguen superando max_bytes, los
+    menos usados recientemente. Retorna el número de archivos eliminados.
+    """
+    entradas = []
+    for nombre in os.listdir(directorio):
+        if not nombre.endswith(extension):
+            continue
+        ruta = os.path.join(directorio, nombre)
+        try:
+            estado = os.stat(ruta)
+        except OSError:
+            continue
+        entradas.append((estado.st_mtime, estado.st_size, ruta))
+
+    eliminadas = 0
+    ahora = time.time()
+    vigentes = []
+    for mtime, tamano, ruta in entradas:
+        if ahora - mtime > max_edad_segundos:
+            eliminadas += _eliminar_archivo(ruta)
+        else:
+            vigentes.append((mtime, tamano, ruta))
+
+    total = sum(tamano for _, tamano, _ in vigentes)
+    for mtime, tamano, ruta in sorted(vigentes):
+        if total <= max_bytes:
+            break
+        eliminadas += _eliminar_archivo(ruta)
+        total -= tamano
+    return eliminadas
+
+class CacheRespuestas:
+    """
+    Caché en disco de las respuestas del modelo, direccionada por contenido.
+    Cada entrada es un archivo cuyo nombre es el hash SHA-256 de
+    (texto extraído, plantilla del prompt, nombre del modelo), de modo que
+    cualquier cambio en el prompt o en el modelo invalida automáticamente
+    las entradas anteriores.
+    """
+
+    def __init__(self, directorio: str, max_bytes: int = 200 * 1024 * 1024, max_edad_segundos: float = 30 * 24 * 3600):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.max_edad_segundos = max_edad_segundos
+        self.aciertos = 0
+        self.fallos = 0
+        self._refrescar = False
+        self._lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+
+    @staticmethod
+    def calcular_clave(texto: str, plantilla: str, modelo: str) -> str:
+        """Calcula la clave de la entrada a partir de todo lo que determina la respuesta"""
+        h = hashlib.sha256()
+        for parte in (modelo, plantilla, texto):
+            datos = parte.encode('utf-8')
+            # Prefijo de longitud para que no haya colisiones al concatenar
+            h.update(len(datos).to_bytes(8, 'big'))
+            h.update(datos)
+        return h.hexdigest()
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, f"{clave}.txt")
+
+    def obtener(self, clave: str):
+        """Devuelve la respuesta guardada para la clave o None si no existe o ha caducado"""
+        ruta = self._ruta(clave)
+        try:
+            if self._refrescar:
+                raise FileNotFoundError(ruta)
+            edad = time.time() - os.path.getmtime(ruta)
+            if edad > self.max_edad_segundos:
+                os.remove(ruta)
+                raise FileNotFoundError(ruta)
+            with open(ruta, 'r', encoding='utf-8') as f:
+                respuesta = f.read()
+            # Actualizar la fecha de acceso para que la purga por tamaño sea LRU
+            os.utime(ruta, None)
+        except OSError:
+            with self._lock:
+                self.fallos += 1
+            return None
+        with self._lock:
+            self.aciertos += 1
+        return respuesta
+
+    def guardar(self, clave: str, respuesta: str) -> None:
+        """Guarda la respuesta de forma atómica (escritura a temporal + renombrado)"""
+        ruta = self._ruta(clave)
+        ruta_tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(ruta_tmp, 'w', encoding='utf-8') as f:
+                f.write(respuesta)
+            os.replace(ruta_tmp, ruta)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar en la caché: {e}")
+            if os.path.exists(ruta_tmp):
+                os.remove(ruta_tmp)
+
+    def eliminar(self, clave: str) -> None:
+        """Elimina la entrada de la clave, si existe"""
+        self._eliminar(self._ruta(clave))
+
+    @contextlib.contextmanager
+    def refrescando(self):
+        """
+        Mientras dura el contexto obtener() no devuelve las entradas guardadas,
+        así que cada respuesta se vuelve a pedir al modelo y la nueva reemplaza
+        a la entrada anterior (para corregir respuestas que se sabe incorrectas).
+        """
+        self._refrescar = True
+        try:
+            yield self
+        finally:
+            self._refrescar = False
+
+    @contextlib.contextmanager
+    def escritor(self, clave: str):
+        """
+        Guarda una respuesta que llega a trozos (streaming) sin tenerla entera
+        en memoria: se escribe en un temporal que solo reemplaza a la entrada
+        si el contexto termina sin error y se escribió algo.
+        """
+        ruta = self._ruta(clave)
+        ruta_tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        f = open(ruta_tmp, 'w', encoding='utf-8')
+        try:
+            yield f
+            vacia = f.tell() == 0
+            f.close()
+            if not vacia:
+                os.replace(ruta_tmp, ruta)
+        finally:
+            f.close()
+            if os.path.exists(ruta_tmp):
+                os.remove(ruta_tmp)
+
+    def purgar(self) -> int:
+        """
+        Elimina las entradas caducadas y, si la caché sigue superando max_bytes,
+        las menos usadas recientemente. Retorna el número de entradas eliminadas.
+        """
+        return purgar_directorio(self.directorio, '.txt', self.max_bytes, self.max_edad_segundos)
+
+    @staticmethod
+    def _eliminar(ruta: str) -> int:
+        return _eliminar_archivo(ruta)
+
+    def resumen(self) -> str:
+        return f"{self.aciertos} aciertos, {self.fallos} fallos"
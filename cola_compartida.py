@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+import contextlib
+
+DIRECTORIO_COLA = '.cola'
+EXTENSION_CONCESION = '.concesion'
+
+def identificador_trabajador() -> str:
+    """Nombre del equipo y PID: distingue los trabajadores de varias máquinas"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class ColaCompartida:
+    """
+    Coordina varios procesos, en una o varias máquinas, que procesan la misma
+    carpeta compartida. Cada PDF (o recurso compartido, como el manifiesto) se
+    reclama creando 'output/.cola/<nombre>.concesion' con O_CREAT | O_EXCL,
+    que es atómico también en carpetas de red: solo un trabajador lo consigue.
+    Mientras el trabajador vive, un hilo renueva la fecha de sus concesiones;
+    la de un trabajador caído deja de renovarse y, pasada duracion_concesion,
+    otro trabajador puede recuperarla. Cada concesión lleva un token propio
+    para que su dueño compruebe, antes de confirmar el resultado, que no se
+    la han quitado. Los relojes de las máquinas deben estar sincronizados.
+    """
+
+    def __init__(self, directorio_salida: str, trabajador: str = None, duracion_concesion: float = 120.0):
+        self.directorio = os.path.join(directorio_salida, DIRECTORIO_COLA)
+        self.trabajador = trabajador or identificador_trabajador()
+        self.duracion_concesion = duracion_concesion
+        self.recuperadas = 0
+        self._propias = {}  # nombre -> token
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._hilo = None
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def _ruta(self, nombre: str) -> str:
+        return os.path.join(self.directorio, f"{nombre}{EXTENSION_CONCESION}")
+
+    @staticmethod
+    def _leer(ruta: str) -> dict:
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def reclamar(self, nombre: str) -> bool:
+        """Intenta obtener la concesión de nombre. Retorna True si ahora es de este trabajador"""
+        ruta = self._ruta(nombre)
+        for _ in range(2):
+            try:
+                fd = os.open(ruta, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._recuperar_caducada(nombre, ruta):
+                    return False
+                continue
+            token = uuid.uuid4().hex
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'trabajador': self.trabajador, 'token': token, 'inicio': time.time()}, f)
+            with self._lock:
+                self._propias[nombre] = token
+            self._iniciar_renovacion()
+            return True
+        return False
+
+    def _recuperar_caducada(self, nombre: str, ruta: str) -> bool:
+        """
+        Elimina la concesión de un trabajador que ha dejado de renovarla.
+        Retorna True si ya no hay concesión (se puede volver a reclamar).
+        """
+        try:
+            if time.time() - os.path.getmtime(ruta) <= self.duracion_concesion:
+                return False
+        except FileNotFoundError:
+            return True  # Liberada mientras tanto
+        caducada = self._leer(ruta)
+        # Renombrar a un nombre único es atómico: solo un trabajador se queda con ella
+        destino = f"{ruta}.{self.trabajador}.{uuid.uuid4().hex[:8]}"
+        try:
+            os.rename(ruta, destino)
+        except OSError:
+            return False  # Otro trabajador la recuperó antes
+        if self._leer(destino).get('token') != caducada.get('token'):
+            # Entre la comprobación y el renombrado otro trabajador la había recuperado y reclamado
+            try:
+                os.rename(destino, ruta)
+            except OSError:
+                os.remove(destino)
+            return False
+        os.remove(destino)
+        with self._lock:
+            self.recuperadas += 1
+        print(f"⏰ Recuperada la concesión caducada de {nombre} ({caducada.get('trabajador', '?')}).")
+        return True
+
+    def es_propia(self, nombre: str) -> bool:
+        """Comprueba en disco que la concesión sigue siendo de este trabajador"""
+        with self._lock:
+            token = self._propias.get(nombre)
+        return token is not None and self._leer(self._ruta(nombre)).get('token') == token
+
+    def liberar(self, nombre: str) -> None:
+        with self._lock:
+            token = self._propias.pop(nombre, None)
+        if token is not None and self._leer(self._ruta(nombre)).get('token') == token:
+            try:
+                os.remove(self._ruta(nombre))
+            except OSError:
+                pass
+
+    @contextlib.contextmanager
+    def exclusivo(self, nombre: str, espera: float = 0.05):
+        """Sección exclusiva entre todos los trabajadores (por ejemplo, para actualizar el manifiesto)"""
+        while not self.reclamar(nombre):
+            time.sleep(espera)
+        try:
+            yield
+        finally:
+            self.liberar(nombre)
+
+    def _iniciar_renovacion(self) -> None:
+        with self._lock:
+            if self._hilo is not None:
+                return
+            self._hilo = threading.Thread(target=self._renovar, name='renovacion-concesiones', daemon=True)
+            self._hilo.start()
+
+    def _renovar(self) -> None:
+        """Actualiza la fecha de las concesiones propias y olvida las que se han perdido"""
+        while not self._parar.wait(self.duracion_concesion / 3):
+            with self._lock:
+                propias = dict(self._propias)
+            for nombre, token in propias.items():
+                ruta = self._ruta(nombre)
+                if self._leer(ruta).get('token') != token:
+                    with self._lock:
+                        if self._propias.get(nombre) == token:
+                            del self._propias[nombre]
+                            print(f"⚠️ Se ha perdido la concesión de {nombre}.")
+                    continue
+                try:
+                    os.utime(ruta, None)
+                except OSError:
+                    pass
+
+    def cerrar(self) -> None:
+        """Detiene la renovación y libera las concesiones que queden"""
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join()
+        with self._lock:
+            propias = list(self._propias)
+        for nombre in propias:
+            self.liberar(nombre)
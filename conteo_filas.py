@@ -0,0 +1,83 @@
+import re
+from collections import Counter
+
+# IBAN seguido o con espacios cada 4 caracteres (15 a 34 caracteres en total);
+# debe terminar en un espacio o fin de línea para no tomar el principio del importe
+_PATRON_IBAN = re.compile(r'\b[A-Z]{2}\d{2}(?:[A-Z0-9]{11,30}|(?: [A-Z0-9]{4}){2,7}(?: [A-Z0-9]{1,3})?)(?=\s|$)')
+_PATRON_IMPORTE = re.compile(r'\d[\d.,]*[.,]\d{2}\b')
+
+def normalizar_iban(valor) -> str:
+    return re.sub(r'\s+', '', str(valor)).upper()
+
+def iban_correcto(iban: str) -> bool:
+    """Dígitos de control del IBAN (módulo 97)"""
+    if not 15 <= len(iban) <= 34:
+        return False
+    reordenado = iban[4:] + iban[:4]
+    try:
+        return int(''.join(str(int(caracter, 36)) for caracter in reordenado)) % 97 == 1
+    except ValueError:
+        return False
+
+def _iban_de_coincidencia(texto: str):
+    """IBAN válido de una coincidencia del patrón, o None"""
+    iban = normalizar_iban(texto)
+    if iban_correcto(iban):
+        return iban
+    # Un grupo final corto puede ser el número siguiente (p. ej. el importe): se prueba sin él
+    partes = texto.split(' ')
+    if len(partes) > 1 and len(partes[-1]) < 4 and iban_correcto(normalizar_iban(''.join(partes[:-1]))):
+        return normalizar_iban(''.join(partes[:-1]))
+    return None
+
+def ibans_de_linea(linea: str) -> list:
+    """IBAN válidos de una línea de detalle (con un importe en la misma línea); [] si no lo es"""
+    ibans = [iban for iban in (_iban_de_coincidencia(m.group(0)) for m in _PATRON_IBAN.finditer(linea)) if iban]
+    if ibans and _PATRON_IMPORTE.search(_PATRON_IBAN.sub(' ', linea)):
+        return ibans
+    return []
+
+def ibans_por_pagina(paginas: list) -> list:
+    """
+    Cuenta, en cada página, los IBAN válidos que aparecen en una línea con un
+    importe: cada uno corresponde a una línea de detalle. Los IBAN sin importe
+    en la misma línea (el del acreedor en el encabezado, por ejemplo) no se
+    cuentan. Retorna una lista de Counter {iban: apariciones}, una por página.
+    """
+    resultado = []
+    for pagina in paginas:
+        conteo = Counter()
+        for linea in pagina.splitlines():
+            conteo.update(ibans_de_linea(linea))
+        resultado.append(conteo)
+    return resultado
+
+def ibans_faltantes(por_pagina: list, ibans_devueltos: list) -> Counter:
+    """IBAN (con el número de filas que faltan) que aparecen en el texto más veces que en la respuesta"""
+    total = Counter()
+    for conteo in por_pagina:
+        total.update(conteo)
+    return total - Counter(normalizar_iban(iban) for iban in ibans_devueltos)
+
+def pagina_de_iban(por_pagina: list, iban) -> int:
+    """Primera página en la que aparece el IBAN, o None"""
+    iban = normalizar_iban(iban)
+    return next((i for i, conteo in enumerate(por_pagina) if iban in conteo), None)
+
+def intercalar_por_pagina(filas: list, paginas_filas: list, nuevas: list, paginas_nuevas: list) -> list:
+    """
+    Inserta las filas nuevas entre las existentes según su página, sin cambiar
+    el orden de las existentes: cada fila nueva va detrás de la última fila
+    existente de su página o de una anterior. Una fila existente sin página
+    conocida (None) se considera de la misma página que la anterior.
+    """
+    claves = []
+    pagina_actual = 0
+    for pagina in paginas_filas:
+        if pagina is not None:
+            pagina_actual = max(pagina_actual, pagina)
+        claves.append(pagina_actual)
+    claves += [pagina if pagina is not None else pagina_actual for pagina in paginas_nuevas]
+    todas = list(filas) + list(nuevas)
+    # sorted es estable: a igual página, las existentes quedan antes que las nuevas
+    return [todas[i] for i in sorted(range(len(todas)), key=lambda i: claves[i])]
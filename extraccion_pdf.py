@@ -0,0 +1,88 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Los documentos con más páginas que esto se reparten en varias tareas
+PAGINAS_POR_TAREA = 8
+
+def _extraer_rango(ruta_pdf: str, inicio: int, fin: int, ordenar: bool) -> list:
+    """
+    Extrae el texto de las páginas [inicio, fin) de un PDF. Se ejecuta en los
+    procesos del pool, por eso vive en un módulo que solo depende de fitz.
+    """
+    import fitz  # PyMuPDF
+
+    documento = fitz.open(ruta_pdf)
+    try:
+        return [documento[i].get_text(sort=ordenar) for i in range(inicio, min(fin, len(documento)))]
+    finally:
+        documento.close()
+
+def contar_paginas(ruta_pdf: str) -> int:
+    import fitz  # PyMuPDF
+
+    documento = fitz.open(ruta_pdf)
+    try:
+        return len(documento)
+    finally:
+        documento.close()
+
+def _extraer_con_pool(pool, ruta_pdf: str, rangos: list, ordenar: bool):
+    """
+    Reparte los rangos de páginas entre los procesos del pool y une su texto en
+    el orden de las páginas. Retorna None si el pool ya no se puede usar; los
+    errores al leer el PDF se propagan como sin pool.
+    """
+    try:
+        futuros = [pool.submit(_extraer_rango, ruta_pdf, inicio, fin, ordenar) for inicio, fin in rangos]
+    except RuntimeError as e:  # El pool ya estaba cerrado (o roto) y no admite tareas
+        print(f"⚠️ No se pudo usar el pool de extracción ({e}); se extrae en el proceso actual.")
+        return None
+    paginas = []
+    try:
+        for futuro in futuros:
+            paginas.extend(futuro.result())
+    except BrokenProcessPool as e:
+        print(f"⚠️ Un proceso de extracción terminó de forma inesperada ({e}); se extrae en el proceso actual.")
+        return None
+    return paginas
+
+def extraer_paginas(ruta_pdf: str, pool=None, ordenar: bool = True, paginas_por_tarea: int = PAGINAS_POR_TAREA, almacen=None) -> tuple:
+    """
+    Extrae el texto de cada página de un PDF. Con un pool de procesos, los
+    documentos grandes se reparten por rangos de páginas entre los procesos;
+    sin él, o si el pool ya no se puede usar (un proceso murió o se cerró), se
+    extraen en el proceso actual. Con un AlmacenTexto, un PDF cuyo
+    contenido ya se extrajo antes se lee del almacén sin analizarlo.
+    Retorna (lista de textos por página, segundos empleados).
+    """
+    inicio_reloj = time.perf_counter()
+    hash_pdf = None
+    if almacen is not None:
+        hash_pdf = almacen.hash_pdf(ruta_pdf)
+        paginas = almacen.obtener(hash_pdf, ordenar)
+        if paginas is not None:
+            return paginas, time.perf_counter() - inicio_reloj
+
+    num_paginas = contar_paginas(ruta_pdf)
+    if pool is None:
+        paginas = _extraer_rango(ruta_pdf, 0, num_paginas, ordenar)
+    else:
+        rangos = [(i, i + paginas_por_tarea) for i in range(0, num_paginas, paginas_por_tarea)] or [(0, 0)]
+        paginas = _extraer_con_pool(pool, ruta_pdf, rangos, ordenar)
+        if paginas is None:
+            paginas = _extraer_rango(ruta_pdf, 0, num_paginas, ordenar)
+    if almacen is not None:
+        almacen.guardar(hash_pdf, ordenar, paginas)
+    return paginas, time.perf_counter() - inicio_reloj
+
+def procesos_extraccion_por_defecto() -> int:
+    """Un proceso por núcleo, dejando uno libre, con un máximo de 8"""
+    return max(1, min(8, (os.cpu_count() or 2) - 1))
+
+def crear_pool_extraccion(procesos: int):
+    """Crea el pool de procesos de extracción, o None si procesos <= 1"""
+    if procesos <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=procesos)
@@ -0,0 +1,126 @@
+import os
+import re
+import json
+import hashlib
+import threading
+
+NOMBRE_INDICE = 'indice_remesas.json'
+
+# Valor de un campo de la clave: una palabra (hasta 35 caracteres) con los
+# caracteres admitidos por SEPA, en la misma línea que su etiqueta. Si el campo
+# está vacío no se toma la etiqueta siguiente: lo que termina en ':' o sigue,
+# separado por espacios simples, hasta un ':' ("Fecha de Envío:") es una etiqueta
+_CARACTERES_SEPA = r"A-Za-z0-9/\-?().,'+"
+_VALOR = rf"[ \t]*:[ \t]*([{_CARACTERES_SEPA}:]{{0,34}}[{_CARACTERES_SEPA}])(?=\s|$)(?!(?: [^\s:]+){{0,4}}[ \t]*:)"
+_PATRON_REFERENCIA = re.compile(r'Referencia del Fichero' + _VALOR)
+_PATRON_EMISOR = re.compile(r'Identificaci[oó]n del Emisor' + _VALOR)
+
+def huella_texto(texto: str) -> str:
+    """SHA-256 del texto extraído sin diferencias de espacios ni mayúsculas"""
+    return hashlib.sha256(' '.join(texto.split()).casefold().encode('utf-8')).hexdigest()
+
+def clave_remesa(texto: str):
+    """
+    'Referencia del Fichero|Identificación del Emisor' leídos del texto, o
+    None si falta alguno
+    """
+    referencia = _PATRON_REFERENCIA.search(texto)
+    emisor = _PATRON_EMISOR.search(texto)
+    if not referencia or not emisor:
+        return None
+    return f"{referencia.group(1).upper()}|{emisor.group(1).upper()}"
+
+class IndiceRemesas:
+    """
+    Índice persistente, guardado en el directorio de salida, de las remesas
+    ya incorporadas: para cada PDF, la huella de su texto y la clave de la
+    remesa (Referencia del Fichero e Identificación del Emisor). Los bancos
+    reenvían a menudo la misma remesa con otro nombre de archivo; con el
+    índice se detecta antes de enviarla al modelo.
+
+    Un PDF cuenta como duplicado si su huella o su clave ya pertenecen a otro
+    PDF que sigue en la carpeta (si el original ya no está, el nuevo ocupa su
+    lugar para que sus filas no desaparezcan del combinado). Los duplicados
+    también se guardan, con su original, para reprocesarlos si este se elimina.
+    """
+
+    def __init__(self, directorio_salida: str):
+        self.ruta = os.path.join(directorio_salida, NOMBRE_INDICE)
+        self._lock = threading.Lock()
+        self._cargar()
+
+    def _cargar(self) -> None:
+        self.remesas, self.duplicados = {}, {}
+        self._por_huella, self._por_clave = {}, {}
+        if os.path.exists(self.ruta):
+            try:
+                with open(self.ruta, 'r', encoding='utf-8') as f:
+                    datos = json.load(f)
+                self.remesas = datos.get('remesas', {})
+                self.duplicados = datos.get('duplicados', {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Índice de remesas ilegible, se empieza de nuevo: {e}")
+        for nombre, entrada in self.remesas.items():
+            self._indexar(nombre, entrada)
+
+    def recargar(self) -> None:
+        """Vuelve a leer el índice del disco (lo que hayan guardado otros procesos)"""
+        with self._lock:
+            self._cargar()
+
+    def _indexar(self, nombre: str, entrada: dict) -> None:
+        self._por_huella[entrada['huella']] = nombre
+        if entrada.get('clave'):
+            self._por_clave[entrada['clave']] = nombre
+
+    def _quitar(self, nombre: str) -> None:
+        self.duplicados.pop(nombre, None)
+        entrada = self.remesas.pop(nombre, None)
+        if entrada is None:
+            return
+        if self._por_huella.get(entrada['huella']) == nombre:
+            del self._por_huella[entrada['huella']]
+        if entrada.get('clave') and self._por_clave.get(entrada['clave']) == nombre:
+            del self._por_clave[entrada['clave']]
+
+    def reclamar(self, ruta_pdf: str, texto: str):
+        """
+        Comprueba si el PDF es una remesa ya incorporada. Si lo es, retorna
+        el nombre del PDF original; si no, lo registra como original (antes
+        de procesarlo, para que otro hilo con la misma remesa lo detecte) y
+        retorna None.
+        """
+        nombre = os.path.basename(ruta_pdf)
+        directorio_pdfs = os.path.dirname(ruta_pdf)
+        entrada = {'huella': huella_texto(texto), 'clave': clave_remesa(texto)}
+        with self._lock:
+            self._quitar(nombre)
+            for original in (self._por_huella.get(entrada['huella']), self._por_clave.get(entrada['clave'])):
+                if original and os.path.exists(os.path.join(directorio_pdfs, original)):
+                    self.duplicados[nombre] = original
+                    self._guardar()
+                    return original
+            self.remesas[nombre] = entrada
+            self._indexar(nombre, entrada)
+            self._guardar()
+        return None
+
+    def liberar(self, ruta_pdf: str) -> None:
+        """Olvida un PDF cuyo procesamiento falló, para que otra copia de la remesa pueda procesarse"""
+        with self._lock:
+            nombre = os.path.basename(ruta_pdf)
+            if nombre in self.remesas:
+                self._quitar(nombre)
+                self._guardar()
+
+    def original_de(self, nombre: str):
+        """PDF original del que nombre es duplicado, o None"""
+        return self.duplicados.get(os.path.basename(nombre))
+
+    def _guardar(self) -> None:
+        # Escritura atómica, como el manifiesto
+        ruta_tmp = f"{self.ruta}.{os.getpid()}.tmp"
+        with open(ruta_tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'remesas': self.remesas, 'duplicados': self.duplicados}, f,
+                      ensure_ascii=False, indent=1)
+        os.replace(ruta_tmp, self.ruta)
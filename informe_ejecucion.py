@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import heapq
+import threading
+import contextlib
+from datetime import datetime
+
+NOMBRE_INFORME = 'informe_ejecucion.jsonl'
+DIRECTORIO_PERFILES = 'perfiles'
+
+class InformeEjecucion:
+    """
+    Instrumentación de una ejecución: para cada archivo registra el tiempo de
+    cada etapa, las peticiones al modelo con sus tokens (según usage_metadata),
+    los reintentos, los aciertos de caché y las filas generadas. Cada archivo
+    se escribe como una línea JSON al terminar y, al cerrar, una línea de
+    resumen; todas llevan el identificador de la ejecución, así que el archivo
+    acumula el historial de ejecuciones.
+
+    El archivo en curso se asocia al hilo que lo procesa; propagar() permite
+    que los hilos auxiliares (fragmentos de un documento) anoten en él. En las
+    peticiones agrupadas, los tokens se anotan al documento cuyo hilo envía el lote.
+
+    Con perfilar_mas_lentos > 0 cada archivo se ejecuta bajo cProfile y se
+    guardan en la carpeta 'perfiles' los perfiles de los N archivos más lentos.
+    El perfil solo cubre el hilo que procesa el archivo (los fragmentos en
+    paralelo y la extracción en otros procesos aparecen como espera), y en
+    Python 3.12+ solo puede haber uno activo: los archivos deben procesarse de
+    uno en uno; si no, los que coinciden con otro no se perfilan (con un aviso).
+    """
+
+    def __init__(self, directorio_salida: str, perfilar_mas_lentos: int = 0):
+        self.ruta = os.path.join(directorio_salida, NOMBRE_INFORME)
+        self.directorio_perfiles = os.path.join(directorio_salida, DIRECTORIO_PERFILES)
+        self.perfilar_mas_lentos = max(0, perfilar_mas_lentos)
+        self.ejecucion = datetime.now().isoformat(timespec='seconds')
+        self.registros = []
+        self.etapas_ejecucion = {}
+        self._inicio = time.perf_counter()
+        self._perfiles = []  # montículo de (segundos, contador, archivo, perfil)
+        self._contador = 0
+        self._sin_perfil = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        os.makedirs(directorio_salida, exist_ok=True)
+
+    def registro_actual(self):
+        return getattr(self._local, 'registro', None)
+
+    @contextlib.contextmanager
+    def archivo(self, nombre: str):
+        """Contexto de procesamiento de un archivo en el hilo actual"""
+        registro = {
+            'tipo': 'archivo', 'ejecucion': self.ejecucion, 'archivo': nombre, 'ok': False,
+            'segundos': 0.0, 'etapas': {}, 'peticiones': 0, 'reintentos': 0,
+            'tokens_prompt': 0, 'tokens_respuesta': 0, 'aciertos_cache': 0, 'filas': 0,
+        }
+        perfil = self._iniciar_perfil()
+        self._local.registro = registro
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        finally:
+            registro['segundos'] = round(time.perf_counter() - inicio, 4)
+            self._local.registro = None
+            if perfil is not None:
+                perfil.disable()
+            with self._lock:
+                registro['etapas'] = {etapa: round(segundos, 4) for etapa, segundos in registro['etapas'].items()}
+                self.registros.append(registro)
+                self._escribir(registro)
+                if perfil is not None:
+                    self._conservar_perfil(registro['segundos'], nombre, perfil)
+
+    def _iniciar_perfil(self):
+        if not self.perfilar_mas_lentos:
+            return None
+        import cProfile
+
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Python 3.12+ solo admite un perfilador activo a la vez: este archivo no se perfila
+            with self._lock:
+                self._sin_perfil += 1
+                if self._sin_perfil == 1:
+                    print("⚠️ Otro archivo se está perfilando a la vez: los archivos concurrentes no se perfilan.")
+            return None
+        return perfil
+
+    def _conservar_perfil(self, segundos: float, nombre: str, perfil) -> None:
+        self._contador += 1
+        elemento = (segundos, self._contador, nombre, perfil)
+        if len(self._perfiles) < self.perfilar_mas_lentos:
+            heapq.heappush(self._perfiles, elemento)
+        else:
+            heapq.heappushpop(self._perfiles, elemento)
+
+    @contextlib.contextmanager
+    def asociar(self, registro):
+        """Asocia el hilo actual al registro de otro hilo mientras dura el contexto"""
+        anterior = self.registro_actual()
+        self._local.registro = registro
+        try:
+            yield
+        finally:
+            self._local.registro = anterior
+
+    def propagar(self, funcion):
+        """Envuelve funcion para que, ejecutada en otro hilo, anote en el archivo del hilo actual"""
+        registro = self.registro_actual()
+
+        def envuelta(*args, **kwargs):
+            with self.asociar(registro):
+                return funcion(*args, **kwargs)
+        return envuelta
+
+    @contextlib.contextmanager
+    def etapa(self, nombre: str):
+        """
+        Suma el tiempo pasado en la etapa al archivo en curso o, fuera de un
+        archivo (combinado, validación...), a las etapas de la ejecución
+        """
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            registro = self.registro_actual()
+            etapas = registro['etapas'] if registro is not None else self.etapas_ejecucion
+            with self._lock:
+                etapas[nombre] = etapas.get(nombre, 0.0) + time.perf_counter() - inicio
+
+    def anotar(self, **valores) -> None:
+        """Suma los valores indicados (peticiones, tokens_prompt, filas...) al archivo en curso"""
+        registro = self.registro_actual()
+        if registro is None:
+            return
+        with self._lock:
+            for clave, valor in valores.items():
+                registro[clave] = registro.get(clave, 0) + valor
+
+    def _escribir(self, registro: dict) -> None:
+        try:
+            with open(self.ruta, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"⚠️ No se pudo escribir el informe de ejecución: {e}")
+
+    def resumen(self) -> dict:
+        etapas = {}
+        for registro in self.registros:
+            for etapa, segundos in registro['etapas'].items():
+                etapas[etapa] = round(etapas.get(etapa, 0.0) + segundos, 4)
+        totales = {clave: sum(r[clave] for r in self.registros)
+                   for clave in ('peticiones', 'reintentos', 'tokens_prompt', 'tokens_respuesta', 'aciertos_cache', 'filas')}
+        lentos = sorted(self.registros, key=lambda r: r['segundos'], reverse=True)[:5]
+        return {
+            'tipo': 'resumen', 'ejecucion': self.ejecucion,
+            'segundos_total': round(time.perf_counter() - self._inicio, 4),
+            'archivos': len(self.registros), 'exitosos': sum(1 for r in self.registros if r['ok']),
+            **totales, 'etapas': etapas,
+            'etapas_ejecucion': {etapa: round(segundos, 4) for etapa, segundos in self.etapas_ejecucion.items()},
+            'mas_lentos': [{'archivo': r['archivo'], 'segundos': r['segundos']} for r in lentos],
+        }
+
+    def cerrar(self) -> dict:
+        """Escribe la línea de resumen y los perfiles de los archivos más lentos; retorna el resumen"""
+        with self._lock:
+            resumen = self.resumen()
+            self._escribir(resumen)
+            if self._perfiles:
+                os.makedirs(self.directorio_perfiles, exist_ok=True)
+                for segundos, _, nombre, perfil in self._perfiles:
+                    perfil.dump_stats(os.path.join(self.directorio_perfiles, f"{os.path.splitext(nombre)[0]}.prof"))
+        return resumen
@@ -0,0 +1,117 @@
+import re
+import time
+import random
+import threading
+
+class LimitadorPeticiones:
+    """
+    Limitador de tipo token bucket para las llamadas al modelo, compartido
+    por todos los hilos. Respeta dos presupuestos por minuto: peticiones
+    (rpm) y tokens (tpm); un valor de 0 desactiva ese límite.
+
+    Es adaptativo: cuando la API responde que se ha superado la cuota, todas
+    las peticiones se detienen durante el tiempo que indique la API (o un
+    retroceso exponencial) y el ritmo se reduce a la mitad; con cada respuesta
+    correcta se recupera poco a poco hasta el ritmo configurado.
+    """
+
+    FACTOR_MINIMO = 0.1
+    RECUPERACION_POR_EXITO = 0.05
+    ESPERA_MAXIMA = 120.0
+
+    def __init__(self, rpm: float = 0, tpm: float = 0):
+        self.rpm = max(0.0, float(rpm))
+        self.tpm = max(0.0, float(tpm))
+        self.factor = 1.0
+        self.limites_recibidos = 0
+        self.segundos_en_espera = 0.0
+        self._peticiones = self.rpm
+        self._tokens = self.tpm
+        self._ultimo = time.monotonic()
+        self._pausa_hasta = 0.0
+        self._fallos_seguidos = 0
+        self._condicion = threading.Condition()
+
+    def _recargar(self, ahora: float) -> None:
+        transcurrido = ahora - self._ultimo
+        self._ultimo = ahora
+        if self.rpm:
+            self._peticiones = min(self.rpm, self._peticiones + transcurrido * self.rpm * self.factor / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + transcurrido * self.tpm * self.factor / 60)
+
+    def adquirir(self, tokens_estimados: int = 0) -> None:
+        """Bloquea hasta que la petición cabe en ambos presupuestos y la descuenta"""
+        # Una petición mayor que el presupuesto completo nunca cabría: se limita a él
+        tokens = min(float(tokens_estimados), self.tpm) if self.tpm else 0.0
+        inicio = time.monotonic()
+        with self._condicion:
+            while True:
+                ahora = time.monotonic()
+                self._recargar(ahora)
+                if ahora < self._pausa_hasta:
+                    espera = self._pausa_hasta - ahora
+                elif (not self.rpm or self._peticiones >= 1) and (not self.tpm or self._tokens >= tokens):
+                    if self.rpm:
+                        self._peticiones -= 1
+                    if self.tpm:
+                        self._tokens -= tokens
+                    self.segundos_en_espera += time.monotonic() - inicio
+                    return
+                else:
+                    espera = 0.0
+                    if self.rpm and self._peticiones < 1:
+                        espera = max(espera, (1 - self._peticiones) * 60 / (self.rpm * self.factor))
+                    if self.tpm and self._tokens < tokens:
+                        espera = max(espera, (tokens - self._tokens) * 60 / (self.tpm * self.factor))
+                self._condicion.wait(timeout=min(espera, self.ESPERA_MAXIMA))
+
+    def registrar_uso_real(self, tokens_estimados: int, tokens_reales: int) -> None:
+        """Corrige el presupuesto de tokens con el consumo real que informa la API"""
+        if not self.tpm or not tokens_reales:
+            return
+        with self._condicion:
+            self._tokens -= tokens_reales - min(float(tokens_estimados), self.tpm)
+
+    def notificar_exito(self) -> None:
+        with self._condicion:
+            self._fallos_seguidos = 0
+            self.factor = min(1.0, self.factor + self.RECUPERACION_POR_EXITO)
+
+    def notificar_limite(self, espera_sugerida: float = None) -> float:
+        """
+        Registra una respuesta de cuota superada: pausa todas las peticiones y
+        reduce el ritmo. Retorna los segundos de pausa aplicados.
+        """
+        with self._condicion:
+            self.limites_recibidos += 1
+            self._fallos_seguidos += 1
+            self.factor = max(self.FACTOR_MINIMO, self.factor / 2)
+            if espera_sugerida is None:
+                espera_sugerida = min(self.ESPERA_MAXIMA, 2 ** self._fallos_seguidos)
+            # Un poco de azar para que los hilos no vuelvan todos a la vez
+            espera = espera_sugerida + random.uniform(0, 1)
+            self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + espera)
+            # Vaciar los cubos para que la reanudación sea gradual
+            self._peticiones = min(self._peticiones, 0.0)
+            self._tokens = min(self._tokens, 0.0)
+            self._condicion.notify_all()
+            return espera
+
+    def resumen(self) -> str:
+        return (f"{self.limites_recibidos} avisos de cuota, {self.segundos_en_espera:.1f}s en espera, "
+                f"ritmo actual {self.factor:.0%}")
+
+def es_error_de_cuota(error: Exception) -> bool:
+    """Indica si una excepción de la API corresponde a cuota superada (429) o saturación (503)"""
+    if type(error).__name__ in ('ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable'):
+        return True
+    mensaje = str(error).lower()
+    return '429' in mensaje or 'quota' in mensaje or 'rate limit' in mensaje or 'resource has been exhausted' in mensaje
+
+def espera_sugerida(error: Exception):
+    """Extrae del mensaje de error los segundos de espera que sugiere la API, si los hay"""
+    mensaje = str(error)
+    coincidencia = (re.search(r'retry_delay\s*\{\s*seconds:\s*(\d+)', mensaje)
+                    or re.search(r'retry in\s*([\d.]+)\s*s', mensaje, re.IGNORECASE))
+    return float(coincidencia.group(1)) if coincidencia else None
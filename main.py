@@ -1,13 +1,39 @@
 import os
 import sys
-import fitz  # PyMuPDF
-import pandas as pd
-import google.generativeai as genai
+# pandas, google.generativeai, fitz y tkinter se importan dentro de las funciones
+# que los usan: importarlos aquí retrasa varios segundos la aparición del diálogo
+# de selección de carpeta, sobre todo en el ejecutable de PyInstaller.
 from dotenv import load_dotenv
+from cache_llm import CacheRespuestas
+from almacen_texto import AlmacenTexto
+from manifiesto import Manifiesto, NOMBRE_MANIFIESTO
+from plugins_bancos import extraer_con_parsers_locales
+from minimizador import minimizar_paginas
+from limitador import LimitadorPeticiones, es_error_de_cuota, espera_sugerida
+from agrupador import AgrupadorDocumentos, componer_documentos, dividir_respuesta_lote
+from salida_columnar import formato_columnar_activo, escribir_salida_columnar
+from base_datos import BaseDatosRemesas, ruta_base_datos_activa
+from respuesta_json import esquema_respuesta, extraer_objetos, validar_fila, fila_a_tsv
+from validacion import validar_archivo_combinado, validar_filas_anexadas, NOMBRE_INFORME, COLUMNA_VALIDACION
+from conteo_filas import ibans_por_pagina, ibans_faltantes, normalizar_iban, pagina_de_iban, intercalar_por_pagina
+from collections import Counter
+from informe_ejecucion import InformeEjecucion
+from backends_llm import BackendGemini, crear_backend, backends_disponibles
+from respuesta_streaming import lineas_completas, FilasTSV, EscritorTSVIncremental
+from indice_remesas import IndiceRemesas, NOMBRE_INDICE
+from cola_compartida import ColaCompartida
+import contextlib
+import csv
+import json
+from extraccion_pdf import extraer_paginas, crear_pool_extraccion, procesos_extraccion_por_defecto
 from io import StringIO
 import re
-import tkinter as tk
-from tkinter import filedialog, messagebox
+import argparse
+import time
+import multiprocessing
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
 
 def resource_path(relative_path):
     """Obtiene la ruta absoluta al recurso, funciona tanto en desarrollo como en el ejecutable"""
@@ -20,39 +46,115 @@ def resource_path(relative_path):
 
 def mostrar_error(mensaje):
     """Muestra un mensaje de error en una ventana emergente"""
+    import tkinter as tk
+    from tkinter import messagebox
+
     root = tk.Tk()
     root.withdraw()
     messagebox.showerror("Error", mensaje)
     root.destroy()
 
-def extraer_texto_pdf(ruta_pdf: str) -> str:
+# Pool de procesos y almacén de textos para la extracción; se configuran en main()
+_pool_extraccion = None
+_almacen_texto = None
+
+def configurar_pool_extraccion(pool) -> None:
+    """Usa el pool de procesos indicado para extraer texto (None: en el proceso actual)"""
+    global _pool_extraccion
+    _pool_extraccion = pool
+
+def configurar_almacen_texto(almacen) -> None:
+    """Activa (o desactiva con None) el almacén persistente de textos extraídos"""
+    global _almacen_texto
+    _almacen_texto = almacen
+
+def crear_almacen_texto():
     """
-    Extrae el texto de un archivo PDF manteniendo un orden de lectura lógico,
-    similar a como lo haría un usuario.
+    Crea el almacén de textos extraídos salvo que ALMACEN_TEXTO=0 en el .env.
+    La carpeta se puede cambiar con ALMACEN_TEXTO_DIR, y su tamaño y antigüedad
+    máximos con ALMACEN_TEXTO_MAX_MB (por defecto 500) y ALMACEN_TEXTO_MAX_DIAS
+    (por defecto 90).
+    """
+    if os.getenv("ALMACEN_TEXTO", "1").strip().lower() in ("0", "false", "no"):
+        return None
+    try:
+        max_mb = float(os.getenv("ALMACEN_TEXTO_MAX_MB", "500"))
+        max_dias = float(os.getenv("ALMACEN_TEXTO_MAX_DIAS", "90"))
+        almacen = AlmacenTexto(max_bytes=int(max_mb * 1024 * 1024), max_edad_segundos=max_dias * 24 * 3600)
+    except (ValueError, OSError) as e:
+        print(f"⚠️ No se pudo inicializar el almacén de textos: {e}")
+        return None
+    eliminadas = almacen.purgar()
+    if eliminadas:
+        print(f"🧹 Almacén de textos: {eliminadas} entrada(s) antiguas eliminadas.")
+    return almacen
+
+def obtener_procesos_extraccion() -> int:
+    """
+    Lee PROCESOS_EXTRACCION del entorno (.env): procesos dedicados a extraer
+    texto de los PDFs. Por defecto, uno por núcleo menos uno; 1 desactiva el pool.
+    """
+    valor = os.getenv("PROCESOS_EXTRACCION", "")
+    if not valor.strip():
+        return procesos_extraccion_por_defecto()
+    try:
+        return max(1, int(valor))
+    except ValueError:
+        print(f"⚠️ PROCESOS_EXTRACCION no válido ('{valor}'), se extrae en el proceso principal.")
+        return 1
+
+def extraer_paginas_pdf(ruta_pdf: str) -> list:
+    """
+    Extrae el texto de cada página de un PDF manteniendo un orden de lectura
+    lógico, similar a como lo haría un usuario. Retorna una lista con el texto
+    de cada página (vacía si no se pudo leer el documento).
+    Si hay un pool de extracción configurado, las páginas de los documentos
+    grandes se reparten entre sus procesos. Los PDFs ya extraídos antes se leen
+    del almacén de textos, si está activo.
     """
     try:
-        documento = fitz.open(ruta_pdf)
-        texto_completo = ""
-        for pagina in documento:
-            # Usar sort=True para un orden de lectura más natural, crucial para tablas
-            texto_completo += pagina.get_text(sort=True) + "\n"
-        documento.close()
-        return texto_completo.strip()
+        # Usar sort=True para un orden de lectura más natural, crucial para tablas
+        paginas, _ = extraer_paginas(ruta_pdf, _pool_extraccion, ordenar=True, almacen=_almacen_texto)
+        return paginas
     except Exception as e:
         print(f"❌ Error al leer el PDF {ruta_pdf}: {e}")
-        return ""
+        return []
 
-def estructurar_informacion_con_gemini(texto_pdf: str) -> str:
+def unir_paginas(paginas: list) -> str:
+    """Une el texto de las páginas en un único texto, una página tras otra"""
+    return "\n".join(paginas).strip()
+
+def extraer_texto_pdf(ruta_pdf: str) -> str:
     """
-    Envía el texto extraído a Gemini y le pide que estructure los datos
-    en formato TSV (Tab-Separated Values).
+    Extrae el texto de un archivo PDF manteniendo un orden de lectura lógico,
+    similar a como lo haría un usuario.
     """
-    # Usamos el modelo 'flash' que es rápido y eficiente, como solicitaste.
-    # Nota: 'gemini-2.5-flash' no es un modelo válido actualmente. Usamos 'gemini-1.5-flash'.
-    model = genai.GenerativeModel('models/gemini-2.5-flash')
+    return unir_paginas(extraer_paginas_pdf(ruta_pdf))
+
+# Columnas que devuelve el modelo, en orden, y columnas de los TSV de salida
+COLUMNAS_TSV = [
+    'Referencia Única', 'Nombre del Librado', 'IBAN', 'Importe', 
+    'Vencimiento', 'Emisor', 'Identificación del Emisor', 
+    'Referencia del Fichero', 'Fecha de Recepción', 'Fecha del Documento', 
+    'Referencia Única del Documento'
+]
+COLUMNAS_SALIDA = COLUMNAS_TSV + ['Archivo_Origen']
 
-    # Prompt ajustado a tus especificaciones, con instrucciones claras para el formato de salida.
-    prompt = f"""
+# Columnas de encabezado: tienen el mismo valor en todas las filas de un documento
+COLUMNAS_CABECERA = [
+    'Emisor', 'Identificación del Emisor', 'Referencia del Fichero',
+    'Fecha de Recepción', 'Fecha del Documento'
+]
+COLUMNAS_DETALLE = [columna for columna in COLUMNAS_TSV if columna not in COLUMNAS_CABECERA]
+
+NOMBRE_COMBINADO = "todos_los_documentos.tsv"
+
+# Modelo y plantilla del prompt. Ambos forman parte de la clave de la caché de
+# respuestas, así que cualquier cambio en ellos invalida las entradas antiguas.
+MODELO_GEMINI = 'models/gemini-2.5-flash'
+URL_LLM_LOCAL = 'http://localhost:8080/v1'
+
+PLANTILLA_PROMPT_TSV = """
 Te voy a dar el texto de un pdf pegado aqui y tu tienes que estructurar los datos de la siguiente manera:
 
 El formato de salida debe ser un fichero TSV (valores separados por tabuladores) SIN LÍNEA DE CABECERA.
@@ -77,16 +179,412 @@ Texto del documento a procesar:
 ---
 """
 
+# Variante compacta del prompt: el modelo devuelve el encabezado una sola vez
+# y luego solo los campos de detalle. procesar_pdf expande la respuesta al
+# formato completo, así que el TSV de salida es idéntico y el modelo genera
+# muchos menos tokens en documentos con muchas líneas.
+MARCA_CABECERA = 'CABECERA'
+
+PLANTILLA_PROMPT_COMPACTA = """
+Te voy a dar el texto de un pdf pegado aqui y tu tienes que estructurar los datos de la siguiente manera:
+
+El formato de salida debe ser TSV (valores separados por tabuladores) SIN LÍNEA DE NOMBRES DE COLUMNA.
+
+La PRIMERA línea de tu respuesta debe ser el encabezado del documento, con este formato EXACTO:
+CABECERA\tEmisor\tIdentificación del Emisor\tReferencia del Fichero\tFecha de Recepción\tFecha del Documento
+
+A continuación, una línea por cada línea de detalle del documento, con estas columnas en este orden EXACTO:
+Referencia Única\tNombre del Librado\tIBAN\tImporte\tVencimiento\tReferencia Única del Documento
+
+INSTRUCCIONES IMPORTANTES:
+1.  Los campos de encabezado (Emisor, Identificación del Emisor, Referencia del Fichero, Fecha de Recepción, Fecha del Documento) aparecen SOLO en la primera línea, precedidos de la palabra CABECERA. NO los repitas en las líneas de detalle.
+2.  Las líneas de detalle tienen exactamente 6 columnas.
+3.  Si un campo no se encuentra, utiliza la palabra 'null'.
+4.  El importe debe ser un número decimal usando el punto (.) como separador, sin símbolo de moneda ni separadores de miles.
+5.  Las fechas deben estar en formato DD/MM/YYYY.
+6.  Asegúrate de que cada línea de detalle de tu respuesta corresponda a una línea de detalle del documento.
+7.  La columna Importe debe conservar la separacion decimal tal y como se muestra en el documento.
+8.  No hagas comentarios adicionales, devuelve solo el TSV.
+
+Texto del documento a procesar:
+---
+{texto_pdf}
+---
+"""
+
+# Variante con salida estructurada: el modelo devuelve JSON que cumple un
+# esquema (respuesta_json.esquema_respuesta) y cada fila se valida por
+# separado; solo las filas no válidas se vuelven a pedir, con
+# PLANTILLA_REPARACION_JSON, sin reenviar el documento.
+PLANTILLA_PROMPT_JSON = """
+Te voy a dar el texto de un pdf pegado aqui y tu tienes que estructurar los datos de la siguiente manera:
+
+El formato de salida debe ser una lista JSON con un objeto por cada línea de detalle del documento, con estos campos (todos de tipo texto):
+referencia_unica, nombre_librado, iban, importe, vencimiento, emisor, identificacion_emisor, referencia_fichero, fecha_recepcion, fecha_documento, referencia_unica_documento
+
+INSTRUCCIONES IMPORTANTES:
+1.  Hay campos que son de encabezado (emisor, identificacion_emisor, referencia_fichero, fecha_recepcion, fecha_documento). Estos campos se repiten en CADA OBJETO de la lista. Rellena el mismo valor en todos los objetos.
+2.  Los otros campos (referencia_unica, nombre_librado, iban, importe, vencimiento, referencia_unica_documento) son específicos de cada línea de detalle del documento.
+3.  Si un campo no se encuentra, utiliza la palabra 'null'.
+4.  El importe debe ser un número decimal usando el punto (.) como separador, sin símbolo de moneda ni separadores de miles.
+5.  Las fechas deben estar en formato DD/MM/YYYY.
+6.  Asegúrate de que cada objeto de tu respuesta corresponda a una línea de detalle del documento.
+7.  No hagas comentarios adicionales, devuelve solo el JSON.
+
+Texto del documento a procesar:
+---
+{texto_pdf}
+---
+"""
+
+PLANTILLA_REPARACION_JSON = """
+Las siguientes {num_filas} filas extraídas de una remesa no cumplen el formato esperado. Cada una va acompañada de los errores encontrados.
+
+Devuelve una lista JSON con las {num_filas} filas corregidas, en el mismo orden, con los campos:
+referencia_unica, nombre_librado, iban, importe, vencimiento, emisor, identificacion_emisor, referencia_fichero, fecha_recepcion, fecha_documento, referencia_unica_documento
+
+INSTRUCCIONES IMPORTANTES:
+1.  Corrige SOLO el formato: conserva los valores de cada fila.
+2.  Si un campo no se encuentra, utiliza la palabra 'null'.
+3.  El importe debe ser un número decimal usando el punto (.) como separador, sin símbolo de moneda ni separadores de miles.
+4.  Las fechas deben estar en formato DD/MM/YYYY.
+5.  No hagas comentarios adicionales, devuelve solo el JSON.
+
+Filas a corregir:
+{filas}
+"""
+
+# Prompt para varios documentos pequeños en una sola petición. Cada documento
+# va precedido de '=== DOCUMENTO n ===' y el modelo devuelve sus filas bajo
+# '### DOCUMENTO n', lo que permite separar la respuesta por archivo.
+PLANTILLA_PROMPT_LOTE = """
+Te voy a dar el texto de {num_documentos} pdf pegados aqui, cada uno precedido de una línea "=== DOCUMENTO n ===", y tu tienes que estructurar los datos de cada uno de la siguiente manera:
+
+Para cada documento, escribe primero una línea "### DOCUMENTO n" (con el mismo número n) y debajo sus datos en formato TSV (valores separados por tabuladores) SIN LÍNEA DE CABECERA.
+
+El orden EXACTO de las columnas debe ser:
+Referencia Única\tNombre del Librado\tIBAN\tImporte\tVencimiento\tEmisor\tIdentificación del Emisor\tReferencia del Fichero\tFecha de Recepción\tFecha del Documento\tReferencia Única del Documento
+
+INSTRUCCIONES IMPORTANTES:
+1.  Hay campos que son de encabezado (Emisor, Identificación del Emisor, Referencia del Fichero, Fecha de Recepción, Fecha del Documento). Estos campos se repiten en CADA LÍNEA del TSV de su documento. Rellena el mismo valor para todas las filas de un documento.
+2.  Los otros campos (Referencia Única, Nombre del Librado, IBAN, Importe, Vencimiento, Referencia Única del Documento) son específicos de cada línea de detalle del documento.
+3.  Si un campo no se encuentra, utiliza la palabra 'null'.
+4.  El importe debe ser un número decimal usando el punto (.) como separador, sin símbolo de moneda ni separadores de miles.
+5.  Las fechas deben estar en formato DD/MM/YYYY.
+6.  NO incluyas la línea de cabecera en tu respuesta. Devuelve únicamente las líneas "### DOCUMENTO n" y los datos.
+7.  Asegúrate de que cada línea de tu respuesta corresponda a una línea de detalle del documento.
+8.  La columna Importe debe conservar la separacion decimal tal y como se muestra en el documento.
+9.  Cada documento es independiente: NO mezcles datos de un documento con los de otro.
+10. Escribe la línea "### DOCUMENTO n" de TODOS los documentos, en orden.
+11. No hagas comentarios adicionales, devuelve solo el TSV.
+
+Documentos a procesar:
+{documentos}
+"""
+
+def plantilla_prompt_activa() -> str:
+    """
+    FORMATO_RESPUESTA en el .env elige el prompt: 'completo' (por defecto, el
+    encabezado se repite en cada línea), 'compacto' (encabezado una sola vez)
+    o 'json' (salida estructurada con esquema y validación por fila).
+    """
+    formato = os.getenv("FORMATO_RESPUESTA", "completo").strip().lower()
+    if formato == "compacto":
+        return PLANTILLA_PROMPT_COMPACTA
+    if formato == "json":
+        return PLANTILLA_PROMPT_JSON
+    return PLANTILLA_PROMPT_TSV
+
+def expandir_respuesta_compacta(datos_tsv: str) -> str:
+    """
+    Convierte una respuesta en formato compacto (línea CABECERA + líneas de
+    detalle) al TSV completo de 11 columnas, repitiendo el encabezado en cada
+    fila. Una respuesta que ya está en formato completo se devuelve tal cual.
+    Las líneas que no encajan en el formato (columnas de más o de menos, o
+    líneas de detalle sin la línea CABECERA) se descartan con un aviso:
+    pandas completaría las filas cortas con vacíos y desplazaría los valores
+    a otras columnas sin dar ningún error.
+    """
+    lineas = [linea for linea in datos_tsv.splitlines() if linea.strip()]
+    compacta = bool(lineas) and lineas[0].startswith(MARCA_CABECERA + '\t')
+    validas = [linea for linea in lineas[compacta:] if linea_bien_formada(linea, compacta)]
+    if len(validas) < len(lineas) - compacta:
+        descartadas = len(lineas) - compacta - len(validas)
+        columnas = len(COLUMNAS_DETALLE) if compacta else len(COLUMNAS_TSV)
+        print(f"⚠️ {descartadas} línea(s) de la respuesta sin las {columnas} columnas esperadas descartadas.")
+    if not compacta:
+        return datos_tsv if len(validas) == len(lineas) else '\n'.join(validas)
+    cabecera = lineas[0].split('\t')[1:]
+    cabecera = (cabecera + ['null'] * len(COLUMNAS_CABECERA))[:len(COLUMNAS_CABECERA)]
+    valores_cabecera = dict(zip(COLUMNAS_CABECERA, cabecera))
+    filas = []
+    for linea in validas:
+        valores = dict(valores_cabecera)
+        valores.update(zip(COLUMNAS_DETALLE, linea.split('\t')))
+        filas.append('\t'.join(valores[columna] for columna in COLUMNAS_TSV))
+    return '\n'.join(filas)
+
+def linea_bien_formada(linea: str, compacta: bool) -> bool:
+    """La línea tiene las columnas del formato completo o, en el compacto, las del detalle"""
+    campos = next(csv.reader([linea], delimiter='\t'), [])
+    return len(campos) == (len(COLUMNAS_DETALLE) if compacta else len(COLUMNAS_TSV))
+
+def respuesta_bien_formada(datos_tsv: str) -> bool:
+    """
+    Comprueba que todas las líneas de la respuesta se leerán como filas del TSV
+    sin columnas de más ni de menos. Solo las respuestas bien formadas se
+    guardan en la caché: una mal formada se volvería a servir en cada ejecución.
+    """
+    lineas = [linea for linea in datos_tsv.splitlines() if linea.strip()]
+    compacta = bool(lineas) and lineas[0].startswith(MARCA_CABECERA + '\t')
+    return bool(lineas) and all(linea_bien_formada(linea, compacta) for linea in lineas[compacta:])
+
+# Caché de respuestas compartida por todos los hilos; se configura en main()
+_cache_respuestas = None
+
+def configurar_cache_respuestas(cache) -> None:
+    """Activa (o desactiva con None) la caché de respuestas del modelo"""
+    global _cache_respuestas
+    _cache_respuestas = cache
+
+def crear_cache_respuestas():
+    """
+    Crea la caché de respuestas a partir de las variables de entorno:
+    CACHE_RESPUESTAS (0 para desactivarla), CACHE_RESPUESTAS_DIR,
+    CACHE_MAX_MB (por defecto 200) y CACHE_MAX_DIAS (por defecto 30).
+    """
+    if os.getenv("CACHE_RESPUESTAS", "1").strip().lower() in ("0", "false", "no"):
+        return None
+    directorio = os.getenv("CACHE_RESPUESTAS_DIR") or os.path.join(
+        os.path.expanduser("~"), ".extractor_remesas", "cache_respuestas")
     try:
-        respuesta = model.generate_content(prompt)
-        
-        # Limpieza básica para eliminar bloques de código de Markdown si el modelo los añade
-        texto_limpio = re.sub(r'```[a-zA-Z]*\n', '', respuesta.text)
-        texto_limpio = texto_limpio.replace('```', '').strip()
+        max_mb = float(os.getenv("CACHE_MAX_MB", "200"))
+        max_dias = float(os.getenv("CACHE_MAX_DIAS", "30"))
+        cache = CacheRespuestas(directorio, int(max_mb * 1024 * 1024), max_dias * 24 * 3600)
+    except (ValueError, OSError) as e:
+        print(f"⚠️ No se pudo inicializar la caché de respuestas: {e}")
+        return None
+    eliminadas = cache.purgar()
+    if eliminadas:
+        print(f"🧹 Caché de respuestas: {eliminadas} entrada(s) antiguas eliminadas.")
+    return cache
+
+# Un único backend del modelo para todo el proceso (y todos los hilos); se configura en main()
+_backend = None
+_lock_backend = threading.Lock()
+
+def configurar_backend(backend) -> None:
+    """Usa el backend indicado para todas las peticiones (None: Gemini por defecto)"""
+    global _backend
+    _backend = backend
+
+def obtener_backend():
+    """Retorna el backend compartido; si no se configuró ninguno, Gemini con MODELO_GEMINI"""
+    global _backend
+    with _lock_backend:
+        if _backend is None:
+            _backend = BackendGemini(MODELO_GEMINI)
+        return _backend
+
+def crear_backend_llm(nombre: str = None, modelo: str = None, api_key: str = None):
+    """
+    Crea el backend a partir de los argumentos o, si no se indican, de
+    BACKEND_LLM ('gemini' por defecto u 'openai' para un servidor local
+    compatible con OpenAI) y MODELO_LLM del .env. El servidor local se toma
+    de URL_LLM (por defecto URL_LLM_LOCAL), con LLM_API_KEY si lo exige y
+    LLM_MAX_TOKENS como límite de tokens de salida. ValueError si el backend
+    o la URL no son válidos.
+    """
+    nombre = (nombre or os.getenv("BACKEND_LLM") or "gemini").strip().lower()
+    modelo = modelo or os.getenv("MODELO_LLM") or (MODELO_GEMINI if nombre == 'gemini' else 'local')
+    if nombre == 'gemini':
+        return crear_backend(nombre, modelo=modelo, api_key=api_key)
+    return crear_backend(nombre, modelo=modelo, url=os.getenv("URL_LLM") or URL_LLM_LOCAL,
+                         api_key=os.getenv("LLM_API_KEY") or None,
+                         timeout=_leer_numero_env("LLM_TIMEOUT", 600),
+                         max_tokens=int(_leer_numero_env("LLM_MAX_TOKENS", 0)) or None)
+
+# Limitador de peticiones compartido por todos los hilos; se configura en main()
+_limitador = None
+
+def configurar_limitador(limitador) -> None:
+    """Activa (o desactiva con None) el limitador de peticiones a Gemini"""
+    global _limitador
+    _limitador = limitador
+
+def _leer_numero_env(nombre: str, defecto: float) -> float:
+    valor = os.getenv(nombre, "")
+    if not valor.strip():
+        return defecto
+    try:
+        return float(valor)
+    except ValueError:
+        print(f"⚠️ {nombre} no válido ('{valor}'), se usa {defecto:g}.")
+        return defecto
+
+def crear_limitador():
+    """
+    Crea el limitador a partir de GEMINI_RPM (peticiones por minuto, por
+    defecto 60) y GEMINI_TPM (tokens por minuto, por defecto 1.000.000) del
+    .env. Deben ajustarse a la cuota de la cuenta; 0 desactiva ese límite.
+    Con un servidor propio no hay cuota: por defecto ambos límites están
+    desactivados y solo se conserva la espera ante respuestas 429/503.
+    """
+    if obtener_backend().nombre != 'gemini':
+        return LimitadorPeticiones(_leer_numero_env("GEMINI_RPM", 0), _leer_numero_env("GEMINI_TPM", 0))
+    return LimitadorPeticiones(_leer_numero_env("GEMINI_RPM", 60), _leer_numero_env("GEMINI_TPM", 1000000))
+
+# Informe de la ejecución (tiempos por etapa, tokens, caché...); se configura en main()
+_informe = None
+
+def configurar_informe(informe) -> None:
+    """Activa (o desactiva con None) la instrumentación de la ejecución"""
+    global _informe
+    _informe = informe
+
+def crear_informe(directorio_salida: str):
+    """
+    Crea el informe de ejecución en directorio_salida a partir de
+    INFORME_EJECUCION (0 para desactivarlo) y PERFILAR_MAS_LENTOS (número de
+    archivos más lentos de los que guardar un perfil de cProfile; por defecto 0).
+    """
+    if os.getenv("INFORME_EJECUCION", "1").strip().lower() in ("0", "false", "no"):
+        return None
+    return InformeEjecucion(directorio_salida, int(_leer_numero_env("PERFILAR_MAS_LENTOS", 0)))
+
+def perfilado_activo() -> bool:
+    """PERFILAR_MAS_LENTOS > 0 con el informe activo: los archivos se procesan de uno en uno"""
+    return _informe is not None and _informe.perfilar_mas_lentos > 0
+
+def medir(etapa: str):
+    """Contexto que suma el tiempo de la etapa al archivo en curso (si hay informe)"""
+    return _informe.etapa(etapa) if _informe is not None else contextlib.nullcontext()
+
+def anotar(**valores) -> None:
+    if _informe is not None:
+        _informe.anotar(**valores)
+
+# Tope de peticiones simultáneas al modelo; se configura en main(). Con la
+# agrupación activa hay más hilos que peticiones (varios esperan en el mismo lote)
+_peticiones_en_curso = None
+
+def configurar_peticiones_en_curso(maximo) -> None:
+    """Limita a `maximo` las llamadas simultáneas a generate_content (None: sin límite)"""
+    global _peticiones_en_curso
+    _peticiones_en_curso = threading.BoundedSemaphore(maximo) if maximo else None
+
+def llamar_modelo(prompt: str, generation_config: dict = None):
+    """
+    Envía el prompt al backend compartido respetando el limitador.
+    generation_config, si se indica, se pasa tal cual (p. ej. el esquema JSON).
+    Las respuestas de cuota superada (429) se reintentan, tras la pausa que
+    marque el limitador, hasta MAX_REINTENTOS_CUOTA veces (por defecto 8);
+    cualquier otro error se propaga.
+    """
+    backend = obtener_backend()
+    tokens_estimados = estimar_tokens(prompt)
+    max_reintentos = int(_leer_numero_env("MAX_REINTENTOS_CUOTA", 8))
+    intento = 0
+    while True:
+        if _limitador is not None:
+            _limitador.adquirir(tokens_estimados)
+        try:
+            if _peticiones_en_curso is not None:
+                with _peticiones_en_curso:
+                    respuesta = backend.generar(prompt, generation_config)
+            else:
+                respuesta = backend.generar(prompt, generation_config)
+        except Exception as e:
+            if _limitador is None or intento >= max_reintentos or not es_error_de_cuota(e):
+                raise
+            intento += 1
+            anotar(reintentos=1)
+            espera = _limitador.notificar_limite(espera_sugerida(e))
+            print(f"⏳ Cuota de Gemini superada, reintento {intento}/{max_reintentos} en {espera:.0f}s.")
+            continue
+        uso = getattr(respuesta, 'usage_metadata', None)
+        anotar(peticiones=1, tokens_prompt=getattr(uso, 'prompt_token_count', 0) or 0,
+               tokens_respuesta=getattr(uso, 'candidates_token_count', 0) or 0)
+        if _limitador is not None:
+            _limitador.notificar_exito()
+            _limitador.registrar_uso_real(tokens_estimados, getattr(uso, 'total_token_count', 0) or 0)
+        return respuesta
+
+def llamar_modelo_streaming(prompt: str):
+    """
+    Como llamar_modelo, pero produce el texto de la respuesta a trozos según
+    lo genera el modelo. La petición ocupa su plaza de concurrencia hasta que
+    se consume entera. Solo se reintenta una cuota superada si todavía no se
+    había recibido nada; los tokens se anotan al terminar.
+    """
+    backend = obtener_backend()
+    tokens_estimados = estimar_tokens(prompt)
+    max_reintentos = int(_leer_numero_env("MAX_REINTENTOS_CUOTA", 8))
+    intento = 0
+    while True:
+        if _limitador is not None:
+            _limitador.adquirir(tokens_estimados)
+        recibido = False
+        with _peticiones_en_curso if _peticiones_en_curso is not None else contextlib.nullcontext():
+            flujo = backend.generar_streaming(prompt)
+            try:
+                for trozo in flujo:
+                    recibido = True
+                    yield trozo
+            except Exception as e:
+                if recibido or _limitador is None or intento >= max_reintentos or not es_error_de_cuota(e):
+                    raise
+                intento += 1
+                anotar(reintentos=1)
+                espera = _limitador.notificar_limite(espera_sugerida(e))
+                print(f"⏳ Cuota de Gemini superada, reintento {intento}/{max_reintentos} en {espera:.0f}s.")
+                continue
+        uso = flujo.usage_metadata
+        anotar(peticiones=1, tokens_prompt=getattr(uso, 'prompt_token_count', 0) or 0,
+               tokens_respuesta=getattr(uso, 'candidates_token_count', 0) or 0)
+        if _limitador is not None:
+            _limitador.notificar_exito()
+            _limitador.registrar_uso_real(tokens_estimados, getattr(uso, 'total_token_count', 0) or 0)
+        return
+
+def limpiar_respuesta(texto: str) -> str:
+    """Limpieza básica para eliminar bloques de código de Markdown si el modelo los añade"""
+    texto_limpio = re.sub(r'```[a-zA-Z]*\n', '', texto)
+    return texto_limpio.replace('```', '').strip()
+
+def estructurar_informacion_con_gemini(texto_pdf: str) -> str:
+    """
+    Envía el texto extraído a Gemini y le pide que estructure los datos
+    en formato TSV (Tab-Separated Values), completo o compacto según
+    FORMATO_RESPUESTA; expandir_respuesta_compacta lo lleva al formato completo.
+    Si la caché de respuestas está activa, un texto ya procesado con el mismo
+    prompt y modelo se resuelve sin llamar a la API.
+    """
+    plantilla = plantilla_prompt_activa()
+    clave_cache = None
+    if _cache_respuestas is not None:
+        clave_cache = _cache_respuestas.calcular_clave(texto_pdf, plantilla, obtener_backend().identificador)
+        respuesta_cache = _cache_respuestas.obtener(clave_cache)
+        if respuesta_cache:
+            print("♻️ Respuesta obtenida de la caché.")
+            anotar(aciertos_cache=1)
+            return respuesta_cache
+
+    prompt = plantilla.format(texto_pdf=texto_pdf)
+
+    try:
+        if plantilla is PLANTILLA_PROMPT_JSON:
+            texto_limpio = estructurar_con_esquema_json(prompt)
+        else:
+            respuesta = llamar_modelo(prompt)
+            texto_limpio = limpiar_respuesta(respuesta.text)
         
         if not texto_limpio:
             print("❌ Error: Respuesta vacía del modelo de Gemini.")
             return None
+
+        if clave_cache is not None and respuesta_bien_formada(texto_limpio):
+            _cache_respuestas.guardar(clave_cache, texto_limpio)
             
         return texto_limpio
         
@@ -94,48 +592,442 @@ Texto del documento a procesar:
         print(f"❌ Error al procesar con Gemini: {e}")
         return None
 
+def respuesta_streaming_activa() -> bool:
+    """RESPUESTA_STREAMING=1 en el .env escribe las filas según llegan de la respuesta del modelo"""
+    return os.getenv("RESPUESTA_STREAMING", "0").strip().lower() in ("1", "true", "si", "sí")
+
+def estructurar_en_streaming(texto_pdf: str):
+    """
+    Versión en streaming de estructurar_informacion_con_gemini: produce, por
+    cada trozo de la respuesta, la lista de líneas que ha completado. Con la
+    caché activa, un acierto se devuelve de una vez y una respuesta nueva se
+    va guardando a medida que llega (solo queda en la caché si se completa).
+    """
+    plantilla = plantilla_prompt_activa()
+    clave_cache = None
+    if _cache_respuestas is not None:
+        clave_cache = _cache_respuestas.calcular_clave(texto_pdf, plantilla, obtener_backend().identificador)
+        respuesta_cache = _cache_respuestas.obtener(clave_cache)
+        if respuesta_cache:
+            print("♻️ Respuesta obtenida de la caché.")
+            anotar(aciertos_cache=1)
+            yield from lineas_completas([respuesta_cache])
+            return
+
+    bien_formada = True
+    compacta = None
+    with contextlib.ExitStack() as pila:
+        cache = None
+        if clave_cache is not None:
+            try:
+                cache = pila.enter_context(_cache_respuestas.escritor(clave_cache))
+            except OSError as e:
+                print(f"⚠️ No se pudo guardar en la caché: {e}")
+        for lineas in lineas_completas(llamar_modelo_streaming(plantilla.format(texto_pdf=texto_pdf))):
+            for linea in lineas:
+                if compacta is None:
+                    compacta = linea.startswith(MARCA_CABECERA + '\t')
+                    if compacta:
+                        continue
+                bien_formada = bien_formada and linea_bien_formada(linea, compacta)
+            if cache is not None and lineas:
+                cache.write('\n'.join(lineas) + '\n')
+            yield lineas
+    if cache is not None and not bien_formada:
+        # La entrada se confirma al cerrar el escritor: una respuesta mal formada no se conserva
+        _cache_respuestas.eliminar(clave_cache)
+
+def configuracion_json() -> dict:
+    return {'response_mime_type': 'application/json', 'response_schema': esquema_respuesta()}
+
+def reparar_filas_json(objetos: list, errores: list) -> list:
+    """
+    Pide al modelo que corrija solo las filas no válidas, en una petición
+    pequeña que no incluye el documento. Retorna el resultado de validar_fila
+    para cada fila; si la respuesta no trae tantas filas como se enviaron, se
+    mantienen las originales con sus errores.
+    """
+    filas = json.dumps([{'fila': objeto, 'errores': errores_fila} for objeto, errores_fila in zip(objetos, errores)],
+                       ensure_ascii=False, indent=1)
+    prompt = PLANTILLA_REPARACION_JSON.format(num_filas=len(objetos), filas=filas)
+    try:
+        corregidos, _ = extraer_objetos(limpiar_respuesta(llamar_modelo(prompt, configuracion_json()).text))
+    except Exception as e:
+        print(f"⚠️ Falló la petición de corrección de filas: {e}")
+        corregidos = []
+    if len(corregidos) != len(objetos):
+        return [(None, errores_fila) for errores_fila in errores]
+    return [validar_fila(objeto) for objeto in corregidos]
+
+def estructurar_con_esquema_json(prompt: str) -> str:
+    """
+    Pide al modelo la salida estructurada con el esquema JSON y la convierte al
+    TSV completo. Cada fila se valida por separado: las no válidas se piden de
+    nuevo (solo ellas) y las que siguen sin ser válidas se conservan con un
+    aviso, para que la validación del combinado las marque, en lugar de
+    perderlas o dar por fallido todo el documento.
+    """
+    respuesta = llamar_modelo(prompt, configuracion_json())
+    objetos, completa = extraer_objetos(limpiar_respuesta(respuesta.text))
+    if not completa:
+        print(f"⚠️ Respuesta JSON incompleta: se recuperaron {len(objetos)} fila(s) completas.")
+    filas = [validar_fila(objeto) for objeto in objetos]
+
+    no_validas = [i for i, (_, errores) in enumerate(filas) if errores]
+    if no_validas:
+        print(f"🔧 {len(no_validas)} fila(s) no válidas, se piden corregidas.")
+        reparadas = reparar_filas_json([objetos[i] for i in no_validas], [filas[i][1] for i in no_validas])
+        for i, (campos, errores) in zip(no_validas, reparadas):
+            # Si la corrección no trajo la fila, se mantienen sus valores originales
+            filas[i] = (campos if campos is not None else filas[i][0], errores)
+
+    lineas = []
+    for objeto, (campos, errores) in zip(objetos, filas):
+        if campos is None:
+            print(f"⚠️ Fila descartada ({'; '.join(errores)}): {objeto}")
+            continue
+        if errores:
+            print(f"⚠️ Fila conservada con errores ({'; '.join(errores)}): {fila_a_tsv(campos)}")
+        lineas.append(fila_a_tsv(campos))
+    return '\n'.join(lineas)
+
+def estructurar_lote_con_gemini(textos: list) -> list:
+    """
+    Envía varios documentos pequeños en una sola petición y separa la respuesta
+    por documento. Retorna una lista con el TSV de cada texto, o None en los
+    que no se pudo separar (el agrupador los reenvía por separado). Los textos
+    que ya están en la caché de respuestas no se envían.
+    """
+    resultados = [None] * len(textos)
+    claves = [None] * len(textos)
+    if _cache_respuestas is not None:
+        for i, texto in enumerate(textos):
+            claves[i] = _cache_respuestas.calcular_clave(texto, PLANTILLA_PROMPT_LOTE, obtener_backend().identificador)
+            resultados[i] = _cache_respuestas.obtener(claves[i])
+    pendientes = [i for i, resultado in enumerate(resultados) if not resultado]
+    if len(pendientes) < len(textos):
+        print(f"♻️ {len(textos) - len(pendientes)} documento(s) del lote obtenidos de la caché.")
+        anotar(aciertos_cache=len(textos) - len(pendientes))
+    if not pendientes:
+        return resultados
+
+    prompt = PLANTILLA_PROMPT_LOTE.format(num_documentos=len(pendientes),
+                                          documentos=componer_documentos([textos[i] for i in pendientes]))
+    respuesta = limpiar_respuesta(llamar_modelo(prompt).text)
+    partes = dividir_respuesta_lote(respuesta, len(pendientes), len(COLUMNAS_TSV))
+    for i, parte in zip(pendientes, partes):
+        resultados[i] = parte
+        if parte and claves[i] is not None and respuesta_bien_formada(parte):
+            _cache_respuestas.guardar(claves[i], parte)
+    print(f"📦 {len(pendientes)} documentos estructurados en una sola petición "
+          f"({partes.count(None)} sin separar).")
+    return resultados
+
+# Agrupador de documentos pequeños compartido por todos los hilos; se configura en main()
+_agrupador = None
+
+def configurar_agrupador(agrupador) -> None:
+    """Activa (o desactiva con None) la agrupación de documentos pequeños"""
+    global _agrupador
+    _agrupador = agrupador
+
+def crear_agrupador():
+    """
+    Crea el agrupador a partir de MAX_DOCUMENTOS_POR_PETICION (por defecto 1,
+    sin agrupar) y ESPERA_AGRUPACION (segundos que un documento espera a que
+    se complete su lote, por defecto 0.5). El tamaño de cada lote tampoco
+    supera MAX_TOKENS_FRAGMENTO.
+    """
+    max_documentos = int(_leer_numero_env("MAX_DOCUMENTOS_POR_PETICION", 1))
+    if max_documentos <= 1:
+        return None
+    return AgrupadorDocumentos(
+        estructurar_lote_con_gemini,
+        # Se resuelve en cada llamada para usar siempre la función actual del módulo
+        lambda texto: estructurar_informacion_con_gemini(texto),
+        max_documentos=max_documentos,
+        max_tokens=obtener_max_tokens_fragmento() or 4000,
+        espera_maxima=_leer_numero_env("ESPERA_AGRUPACION", 0.5),
+        estimar_tokens=estimar_tokens,
+    )
+
+def documento_agrupable(texto: str) -> bool:
+    """
+    Un documento se agrupa con otros si su texto no supera UMBRAL_TOKENS_AGRUPACION
+    (por defecto 1500). Solo con el formato completo: el prompt de los lotes pide
+    el TSV completo, así que con los formatos compacto y json cada documento va solo.
+    """
+    return (_agrupador is not None and plantilla_prompt_activa() is PLANTILLA_PROMPT_TSV
+            and estimar_tokens(texto) <= _leer_numero_env("UMBRAL_TOKENS_AGRUPACION", 1500))
+
+def estimar_tokens(texto: str) -> int:
+    """Estimación aproximada de tokens (unos 4 caracteres por token)"""
+    return len(texto) // 4 + 1
+
+def obtener_max_tokens_fragmento() -> int:
+    """
+    Lee MAX_TOKENS_FRAGMENTO del entorno (.env): tokens de entrada estimados por
+    petición a partir de los cuales un documento se divide en ventanas de páginas.
+    Por defecto 4000; 0 desactiva la división.
+    """
+    valor = os.getenv("MAX_TOKENS_FRAGMENTO", "4000")
+    try:
+        return max(0, int(valor))
+    except ValueError:
+        print(f"⚠️ MAX_TOKENS_FRAGMENTO no válido ('{valor}'), no se dividirán los documentos.")
+        return 0
+
+def dividir_en_ventanas(paginas: list, max_tokens: int) -> list:
+    """
+    Agrupa páginas consecutivas en ventanas cuyo tamaño estimado no supere
+    max_tokens. Retorna una lista de listas de índices de página, en orden.
+    Una página que por sí sola supera el límite forma su propia ventana.
+    """
+    if max_tokens <= 0:
+        return [list(range(len(paginas)))]
+    ventanas = []
+    actual = []
+    tokens_actual = 0
+    for indice, pagina in enumerate(paginas):
+        tokens = estimar_tokens(pagina)
+        if actual and tokens_actual + tokens > max_tokens:
+            ventanas.append(actual)
+            actual = []
+            tokens_actual = 0
+        actual.append(indice)
+        tokens_actual += tokens
+    if actual:
+        ventanas.append(actual)
+    return ventanas
+
+def propagar_cabecera(lineas_tsv: list) -> list:
+    """
+    Unifica las columnas de encabezado en todas las filas de un documento
+    procesado por fragmentos: los fragmentos que no contienen el encabezado
+    devuelven 'null' en esos campos, así que se rellenan con el valor más
+    frecuente entre las filas que sí lo tienen.
+    """
+    indices = [COLUMNAS_TSV.index(columna) for columna in COLUMNAS_CABECERA]
+    filas = [linea.split('\t') for linea in lineas_tsv]
+    valores = {}
+    for indice in indices:
+        conteo = {}
+        for campos in filas:
+            if len(campos) == len(COLUMNAS_TSV) and campos[indice] not in ('', 'null'):
+                conteo[campos[indice]] = conteo.get(campos[indice], 0) + 1
+        if conteo:
+            valores[indice] = max(conteo, key=conteo.get)
+    resultado = []
+    for campos in filas:
+        if len(campos) == len(COLUMNAS_TSV):
+            for indice, valor in valores.items():
+                campos[indice] = valor
+        resultado.append('\t'.join(campos))
+    return resultado
+
+def obtener_max_fragmentos_concurrentes() -> int:
+    """MAX_FRAGMENTOS_CONCURRENTES en el .env: ventanas de un mismo documento en paralelo (por defecto 4)"""
+    valor = os.getenv("MAX_FRAGMENTOS_CONCURRENTES", "4")
+    try:
+        return max(1, int(valor))
+    except ValueError:
+        return 1
+
+def estructurar_por_fragmentos(paginas: list, ventanas: list) -> str:
+    """
+    Envía cada ventana de páginas a Gemini en paralelo y une las filas
+    resultantes en el orden de las páginas, propagando los campos de
+    encabezado a todas ellas. Si algún fragmento falla, retorna None.
+    """
+    textos = [unir_paginas([paginas[i] for i in ventana]) for ventana in ventanas]
+    # Una ventana puede quedar vacía si solo contenía encabezados repetidos
+    ventanas, textos = zip(*[(v, t) for v, t in zip(ventanas, textos) if t]) if any(textos) else ((), ())
+    print(f"✂️ Documento dividido en {len(ventanas)} fragmentos de páginas.")
+    with ThreadPoolExecutor(max_workers=obtener_max_fragmentos_concurrentes()) as executor:
+        estructurar = estructurar_informacion_con_gemini
+        if _informe is not None:
+            # Las peticiones de los fragmentos cuentan para el archivo de este hilo
+            estructurar = _informe.propagar(estructurar)
+        respuestas = list(executor.map(estructurar, textos))
+
+    lineas = []
+    for ventana, respuesta in zip(ventanas, respuestas):
+        if not respuesta:
+            print(f"❌ Falló el fragmento de las páginas {ventana[0] + 1}-{ventana[-1] + 1}.")
+            return None
+        respuesta = expandir_respuesta_compacta(respuesta)
+        lineas.extend(linea for linea in respuesta.splitlines() if linea.strip())
+    return '\n'.join(propagar_cabecera(lineas))
+
+def verificacion_filas_activa() -> bool:
+    """VERIFICAR_FILAS=0 en el .env desactiva la comprobación local del número de filas"""
+    return os.getenv("VERIFICAR_FILAS", "1").strip().lower() not in ("0", "false", "no")
+
+def completar_filas_faltantes(paginas: list, datos_tsv: str) -> str:
+    """
+    Comprueba localmente que la respuesta del modelo no se ha saltado líneas:
+    cuenta en cada página las líneas de detalle (IBAN válidos junto a un
+    importe) y las compara con los IBAN de las filas devueltas. Si faltan,
+    vuelve a pedir solo las páginas donde aparecen los IBAN que faltan y
+    añade las filas recuperadas en su sitio. Retorna el TSV (completo o no).
+    """
+    por_pagina = ibans_por_pagina(paginas)
+    if not any(por_pagina):
+        return datos_tsv
+    lineas = [linea for linea in expandir_respuesta_compacta(datos_tsv).splitlines() if linea.strip()]
+    indice_iban = COLUMNAS_TSV.index('IBAN')
+    filas = [linea.split('\t') for linea in lineas]
+    nuevas = recuperar_filas_faltantes(paginas, por_pagina, [c[indice_iban] for c in filas if len(c) == len(COLUMNAS_TSV)],
+                                       len(lineas))
+    if not nuevas:
+        return datos_tsv
+    paginas_filas = [pagina_de_iban(por_pagina, c[indice_iban]) if len(c) == len(COLUMNAS_TSV) else None for c in filas]
+    paginas_nuevas = [pagina_de_iban(por_pagina, linea.split('\t')[indice_iban]) for linea in nuevas]
+    return '\n'.join(propagar_cabecera(intercalar_por_pagina(lineas, paginas_filas, nuevas, paginas_nuevas)))
+
+def recuperar_filas_faltantes(paginas: list, por_pagina: list, ibans_devueltos: list, filas_devueltas: int) -> list:
+    """
+    Vuelve a pedir las páginas donde aparecen los IBAN que no están entre los
+    devueltos. Retorna las líneas TSV recuperadas ([] si no faltaba ninguna o
+    no se pudieron recuperar).
+    """
+    faltantes = ibans_faltantes(por_pagina, ibans_devueltos)
+    if not faltantes:
+        return []
+
+    indice_iban = COLUMNAS_TSV.index('IBAN')
+    paginas_a_pedir = [i for i, conteo in enumerate(por_pagina) if any(iban in conteo for iban in faltantes)]
+    esperadas = sum(sum(conteo.values()) for conteo in por_pagina)
+    print(f"🔎 {filas_devueltas} fila(s) devueltas para {esperadas} línea(s) con IBAN: se vuelven a pedir "
+          f"las páginas {', '.join(str(i + 1) for i in paginas_a_pedir)}.")
+    seleccion = [paginas[i] for i in paginas_a_pedir]
+    ventanas = dividir_en_ventanas(seleccion, obtener_max_tokens_fragmento())
+    if len(ventanas) > 1:
+        respuesta = estructurar_por_fragmentos(seleccion, ventanas)
+    else:
+        respuesta = estructurar_informacion_con_gemini(unir_paginas(seleccion))
+
+    # Solo se añaden las filas de los IBAN que faltaban, y no más veces de las que faltaban
+    pendientes = Counter(faltantes)
+    nuevas = []
+    for linea in expandir_respuesta_compacta(respuesta or '').splitlines():
+        campos = linea.split('\t')
+        if len(campos) == len(COLUMNAS_TSV) and pendientes[normalizar_iban(campos[indice_iban])] > 0:
+            pendientes[normalizar_iban(campos[indice_iban])] -= 1
+            nuevas.append(linea)
+    if not nuevas:
+        print("⚠️ No se pudieron recuperar las filas que faltan.")
+        return []
+    print(f"✅ Recuperadas {len(nuevas)} fila(s) que faltaban.")
+    return nuevas
+
+def minimizacion_activa() -> bool:
+    """MINIMIZAR_TEXTO=0 en el .env envía al modelo el texto extraído sin reducir"""
+    return os.getenv("MINIMIZAR_TEXTO", "1").strip().lower() not in ("0", "false", "no")
+
+def parsers_locales_activos() -> bool:
+    """PARSERS_LOCALES=0 en el .env fuerza a enviar todos los documentos a Gemini"""
+    return os.getenv("PARSERS_LOCALES", "1").strip().lower() not in ("0", "false", "no")
+
 def procesar_pdf(ruta_pdf: str, directorio_salida: str) -> bool:
     """
-    Procesa un archivo PDF: extrae texto, lo estructura con Gemini y genera un archivo TSV.
+    Procesa un archivo PDF: extrae texto, lo estructura (con un parser local si
+    reconoce el formato, o con Gemini) y genera un archivo TSV.
     Retorna True si el proceso fue exitoso, False en caso contrario.
     """
     print(f"\n=== Procesando: {os.path.basename(ruta_pdf)} ===")
     
     # 1. Extraer texto del PDF (simulando Ctrl+A)
-    texto = extraer_texto_pdf(ruta_pdf)
+    inicio_extraccion = time.perf_counter()
+    with medir('extraccion'):
+        paginas = extraer_paginas_pdf(ruta_pdf)
+        texto = unir_paginas(paginas)
     if not texto:
         return False
-    print(f"✅ Texto extraído ({len(texto)} caracteres).")
+    print(f"✅ Texto extraído ({len(texto)} caracteres, {len(paginas)} páginas, {time.perf_counter() - inicio_extraccion:.2f}s).")
+
+    # 2. Una remesa ya incorporada (reenviada con otro nombre de archivo) no se vuelve a procesar
+    indice = obtener_indice_remesas(directorio_salida)
+    if indice is not None:
+        with bloqueo_compartido(NOMBRE_INDICE) as compartido:
+            if compartido:
+                indice.recargar()
+            original = indice.reclamar(ruta_pdf, texto)
+        if original:
+            return escribir_tsv_duplicado(ruta_pdf, directorio_salida, original)
     
-    # 2. Procesar con Gemini para obtener el TSV
-    datos_tsv = estructurar_informacion_con_gemini(texto)
-    if not datos_tsv:
-        return False
-    print("✅ Datos estructurados por Gemini.")
+    # 3. Probar primero los parsers locales de formatos conocidos y, si ninguno
+    #    reconoce el documento, procesar con Gemini para obtener el TSV
+    with medir('parsers_locales'):
+        resultado_local = extraer_con_parsers_locales(texto) if parsers_locales_activos() else None
+    if resultado_local:
+        nombre_parser, datos_tsv = resultado_local
+        print(f"✅ Datos estructurados localmente (parser '{nombre_parser}').")
+    else:
+        # Quitar encabezados y pies repetidos y el relleno de alineación:
+        # son tokens de entrada que no aportan nada al modelo
+        paginas_prompt, texto_prompt = paginas, texto
+        if minimizacion_activa():
+            with medir('minimizacion'):
+                paginas_prompt = minimizar_paginas(paginas)
+                texto_prompt = unir_paginas(paginas_prompt)
+            print(f"🗜️ Texto minimizado: {len(texto)} → {len(texto_prompt)} caracteres "
+                  f"(~{estimar_tokens(texto)} → ~{estimar_tokens(texto_prompt)} tokens).")
+
+        # Los documentos grandes se dividen en ventanas de páginas para no
+        # superar el límite de tokens de salida del modelo
+        ventanas = dividir_en_ventanas(paginas_prompt, obtener_max_tokens_fragmento())
+        if streaming_aplicable(ventanas, texto_prompt):
+            # Las filas se escriben según llegan, sin esperar a la respuesta completa
+            with medir('modelo'):
+                return escribir_tsv_en_streaming(ruta_pdf, directorio_salida, paginas_prompt, ventanas)
+        with medir('modelo'):
+            if len(ventanas) > 1:
+                datos_tsv = estructurar_por_fragmentos(paginas_prompt, ventanas)
+            elif documento_agrupable(texto_prompt):
+                # Los documentos pequeños comparten petición con otros del lote
+                datos_tsv = _agrupador.estructurar(texto_prompt)
+            else:
+                datos_tsv = estructurar_informacion_con_gemini(texto_prompt)
+        if not datos_tsv:
+            return False
+        print("✅ Datos estructurados por Gemini.")
+        if verificacion_filas_activa():
+            with medir('verificacion_filas'):
+                datos_tsv = completar_filas_faltantes(paginas_prompt, datos_tsv)
     
-    # 3. Crear DataFrame y guardar el archivo TSV
-    try:
-        columnas = [
-            'Referencia Única', 'Nombre del Librado', 'IBAN', 'Importe', 
-            'Vencimiento', 'Emisor', 'Identificación del Emisor', 
-            'Referencia del Fichero', 'Fecha de Recepción', 'Fecha del Documento', 
-            'Referencia Única del Documento'
-        ]
-        
-        # Usamos StringIO para leer la cadena de texto TSV como si fuera un archivo
-        df = pd.read_csv(StringIO(datos_tsv), sep='\t', header=None, names=columnas)
-        
-        # Agregar la columna con el nombre del archivo origen
-        nombre_archivo = os.path.basename(ruta_pdf)
-        df['Archivo_Origen'] = nombre_archivo
-        
-        # Asegurarse de que el directorio de salida existe
-        os.makedirs(directorio_salida, exist_ok=True)
-        
-        nombre_base = os.path.splitext(os.path.basename(ruta_pdf))[0]
-        ruta_salida = os.path.join(directorio_salida, f"{nombre_base}.tsv")
-        
-        df.to_csv(ruta_salida, sep='\t', index=False, encoding='utf-8')
+    # 4. Crear DataFrame y guardar el archivo TSV
+    try:
+        with medir('tsv'):
+            # Si el modelo respondió en formato compacto, repetir el encabezado en cada fila
+            datos_tsv = expandir_respuesta_compacta(datos_tsv)
+
+            import pandas as pd
+
+            # Usamos StringIO para leer la cadena de texto TSV como si fuera un archivo.
+            # Todo como texto para no perder ceros a la izquierda ni reformatear importes
+            df = pd.read_csv(StringIO(datos_tsv), sep='\t', header=None, names=COLUMNAS_TSV, dtype=str)
+            
+            # Agregar la columna con el nombre del archivo origen
+            nombre_archivo = os.path.basename(ruta_pdf)
+            df['Archivo_Origen'] = nombre_archivo
+            
+            # Asegurarse de que el directorio de salida existe
+            os.makedirs(directorio_salida, exist_ok=True)
+            
+            ruta_salida = ruta_tsv_salida(ruta_pdf, directorio_salida)
+            
+            # Temporal + renombrado: nadie (otro hilo, otro trabajador) ve un TSV a medias
+            ruta_tmp = f"{ruta_salida}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                df.to_csv(ruta_tmp, sep='\t', index=False, encoding='utf-8')
+                if not concesion_vigente(ruta_pdf):
+                    return False
+                os.replace(ruta_tmp, ruta_salida)
+            finally:
+                if os.path.exists(ruta_tmp):
+                    os.remove(ruta_tmp)
+        anotar(filas=len(df))
         
         print(f"✅ TSV creado exitosamente en: {ruta_salida}")
         return True
@@ -147,94 +1039,947 @@ def procesar_pdf(ruta_pdf: str, directorio_salida: str) -> bool:
         print("---------------------------------")
         return False
 
+# Combinado en construcción, al que los documentos en streaming añaden sus
+# filas según llegan; lo configuran procesar_carpeta y vigilar_carpeta
+_combinador = None
+
+def configurar_combinador(combinador) -> None:
+    global _combinador
+    _combinador = combinador
+
+def streaming_aplicable(ventanas: list, texto_prompt: str) -> bool:
+    """
+    El streaming se usa con los documentos en formato TSV que no se agrupan
+    con otros: los agrupados comparten respuesta y el JSON se valida completo.
+    Los documentos divididos en ventanas también van en streaming.
+    """
+    return (respuesta_streaming_activa() and (len(ventanas) > 1 or not documento_agrupable(texto_prompt))
+            and plantilla_prompt_activa() is not PLANTILLA_PROMPT_JSON)
+
+def lineas_por_ventana(paginas: list, ventanas: list):
+    """
+    Pide en streaming cada ventana de páginas, en paralelo, y produce sus
+    líneas en el orden de las páginas: (número de ventana, líneas completadas).
+    Las de la primera ventana salen según llegan; las de las siguientes
+    esperan en memoria a que terminen las anteriores. Si un fragmento falla o
+    responde vacío se lanza la excepción y se dejan de leer los demás.
+    """
+    pares = [(v, t) for v, t in ((v, unir_paginas([paginas[i] for i in v])) for v in ventanas) if t]
+    if len(pares) <= 1:
+        for lineas in estructurar_en_streaming(pares[0][1] if pares else unir_paginas(paginas)):
+            yield 0, lineas
+        return
+
+    print(f"✂️ Documento dividido en {len(pares)} fragmentos de páginas.")
+    colas = [queue.Queue() for _ in pares]
+    cancelado = threading.Event()
+    fin = object()
+
+    def recibir(indice: int) -> None:
+        if cancelado.is_set():
+            return
+        try:
+            with contextlib.closing(estructurar_en_streaming(pares[indice][1])) as flujo:
+                for lineas in flujo:
+                    if cancelado.is_set():
+                        return
+                    colas[indice].put(lineas)
+            colas[indice].put(fin)
+        except Exception as e:
+            colas[indice].put(e)
+
+    if _informe is not None:
+        # Las peticiones de los fragmentos cuentan para el archivo de este hilo
+        recibir = _informe.propagar(recibir)
+    with ThreadPoolExecutor(max_workers=obtener_max_fragmentos_concurrentes()) as executor:
+        for indice in range(len(pares)):
+            executor.submit(recibir, indice)
+        try:
+            for indice, (ventana, _) in enumerate(pares):
+                recibidas = 0
+                while True:
+                    lineas = colas[indice].get()
+                    if lineas is fin:
+                        break
+                    if isinstance(lineas, Exception):
+                        raise lineas
+                    recibidas += len(lineas)
+                    yield indice, lineas
+                if not recibidas:
+                    raise ValueError(f"respuesta vacía del fragmento de las páginas {ventana[0] + 1}-{ventana[-1] + 1}")
+        finally:
+            cancelado.set()
+
+def escribir_tsv_en_streaming(ruta_pdf: str, directorio_salida: str, paginas: list, ventanas: list = None) -> bool:
+    """
+    Pide el documento al modelo en streaming y escribe cada fila completa en
+    el TSV (en su archivo parcial hasta que termina) y, si el documento es
+    el siguiente en el orden del combinado, también en este, sin esperar a la
+    respuesta completa ni tenerla en memoria. Un documento dividido en
+    ventanas se escribe en el orden de las páginas; los campos de encabezado
+    vacíos de las ventanas siguientes se rellenan con los de las anteriores.
+    Las filas que falten según la comprobación local se recuperan al final y
+    se añaden detrás de las demás.
+    """
+    nombre_archivo = os.path.basename(ruta_pdf)
+    os.makedirs(directorio_salida, exist_ok=True)
+    combinador = _combinador
+    filas_tsv = FilasTSV(COLUMNAS_TSV, COLUMNAS_CABECERA, MARCA_CABECERA)
+    al_escribir = None
+    if combinador is not None:
+        al_escribir = lambda texto: combinador.anexar_en_curso(nombre_archivo, escritor.ruta_parcial, texto)
+    escritor = EscritorTSVIncremental(ruta_tsv_salida(ruta_pdf, directorio_salida), COLUMNAS_TSV + ['Archivo_Origen'],
+                                      al_escribir)
+    inicio = time.perf_counter()
+    ventana_actual = 0
+    try:
+        for indice, lineas in lineas_por_ventana(paginas, ventanas or [list(range(len(paginas)))]):
+            if indice != ventana_actual:
+                ventana_actual = indice
+                filas_tsv.nueva_respuesta()
+            filas = [campos for campos in map(filas_tsv.fila, lineas) if campos is not None]
+            if indice:
+                filas = [filas_tsv.completar_cabecera(campos) for campos in filas]
+            filas = [campos + [nombre_archivo] for campos in filas]
+            if filas and not escritor.filas:
+                segundos = time.perf_counter() - inicio
+                anotar(segundos_primera_fila=round(segundos, 4))
+                print(f"⚡ Primeras filas escritas a los {segundos:.2f}s.")
+            escritor.escribir(filas)
+        if not escritor.filas:
+            print("❌ Error: Respuesta vacía del modelo de Gemini.")
+            escritor.descartar()
+            return False
+        print(f"✅ Datos estructurados por Gemini ({escritor.filas} filas en streaming).")
+        if filas_tsv.descartadas:
+            print(f"⚠️ {filas_tsv.descartadas} línea(s) de la respuesta sin las columnas esperadas descartadas.")
+        if verificacion_filas_activa():
+            with medir('verificacion_filas'):
+                por_pagina = ibans_por_pagina(paginas)
+                nuevas = recuperar_filas_faltantes(paginas, por_pagina, filas_tsv.ibans, escritor.filas) if any(por_pagina) else []
+                escritor.escribir([filas_tsv.completar_cabecera(campos) + [nombre_archivo]
+                                   for campos in map(filas_tsv.fila, nuevas) if campos is not None])
+        if not concesion_vigente(ruta_pdf):
+            escritor.descartar()
+            return False
+        ruta_salida = escritor.confirmar()
+    except Exception as e:
+        print(f"❌ Error al procesar con Gemini en streaming: {e}")
+        escritor.descartar()
+        return False
+    anotar(filas=escritor.filas)
+    print(f"✅ TSV creado exitosamente en: {ruta_salida}")
+    return True
+
+def deteccion_duplicados_activa() -> bool:
+    """DETECTAR_DUPLICADOS=0 en el .env desactiva el índice de remesas y la supresión de filas duplicadas"""
+    return os.getenv("DETECTAR_DUPLICADOS", "1").strip().lower() not in ("0", "false", "no")
+
+# Un índice de remesas por directorio de salida, compartido por todos los hilos
+_indices_remesas = {}
+_lock_indices = threading.Lock()
+
+def obtener_indice_remesas(directorio_salida: str):
+    """Índice de remesas ya incorporadas del directorio de salida (None si la detección está desactivada)"""
+    if not deteccion_duplicados_activa():
+        return None
+    clave = os.path.abspath(directorio_salida)
+    with _lock_indices:
+        if clave not in _indices_remesas:
+            os.makedirs(directorio_salida, exist_ok=True)
+            _indices_remesas[clave] = IndiceRemesas(directorio_salida)
+        return _indices_remesas[clave]
+
+# Cola compartida con otros procesos o máquinas (solo en modo trabajador)
+_cola = None
+
+def configurar_cola(cola) -> None:
+    global _cola
+    _cola = cola
+
+@contextlib.contextmanager
+def bloqueo_compartido(nombre: str):
+    """
+    Sección exclusiva entre todos los trabajadores de la cola compartida para
+    modificar un archivo común (índice, manifiesto). Produce True si hay cola
+    (y por tanto el archivo hay que releerlo dentro); sin cola no bloquea nada.
+    """
+    if _cola is None:
+        yield False
+        return
+    with _cola.exclusivo(nombre):
+        yield True
+
+def concesion_vigente(ruta_pdf: str) -> bool:
+    """
+    En modo trabajador, comprueba antes de sustituir el TSV de un PDF que la
+    concesión sigue siendo de este trabajador: si caducó, otro puede estar
+    escribiendo ya el mismo archivo. Sin cola siempre es True.
+    """
+    if _cola is None or _cola.es_propia(os.path.basename(ruta_pdf)):
+        return True
+    print(f"⚠️ {os.path.basename(ruta_pdf)}: la concesión caducó durante el proceso; no se escribe su TSV.")
+    return False
+
+def escribir_tsv_duplicado(ruta_pdf: str, directorio_salida: str, original: str) -> bool:
+    """
+    Un duplicado cuenta como procesado pero su TSV solo tiene la cabecera:
+    sus filas ya están en el combinado a través del original
+    """
+    print(f"♻️ Remesa ya incorporada como '{original}': no se envía al modelo.")
+    ruta_salida = ruta_tsv_salida(ruta_pdf, directorio_salida)
+    ruta_tmp = f"{ruta_salida}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(ruta_tmp, 'w', encoding='utf-8', newline='') as f:
+        f.write('\t'.join(COLUMNAS_TSV + ['Archivo_Origen']) + os.linesep)
+    if not concesion_vigente(ruta_pdf):
+        os.remove(ruta_tmp)
+        return False
+    os.replace(ruta_tmp, ruta_salida)
+    anotar(duplicado=1)
+    return True
+
+def ruta_tsv_salida(ruta_pdf: str, directorio_salida: str) -> str:
+    """Ruta del TSV individual que procesar_pdf genera para un PDF"""
+    nombre_base = os.path.splitext(os.path.basename(ruta_pdf))[0]
+    return os.path.join(directorio_salida, f"{nombre_base}.tsv")
+
+def _procesar_pdf_seguro(ruta_pdf: str, directorio_salida: str, al_terminar=None) -> bool:
+    """
+    Envuelve procesar_pdf para que una excepción inesperada en un hilo
+    cuente como fallo del archivo en lugar de abortar todo el lote.
+    Si se indica, al_terminar(ruta_pdf, ok) se llama en cuanto termina el archivo.
+    """
+    contexto = _informe.archivo(os.path.basename(ruta_pdf)) if _informe is not None else contextlib.nullcontext({})
+    with contexto as registro:
+        try:
+            ok = procesar_pdf(ruta_pdf, directorio_salida)
+        except Exception as e:
+            print(f"❌ Error inesperado procesando {os.path.basename(ruta_pdf)}: {e}")
+            registro['error'] = str(e)
+            ok = False
+        registro['ok'] = ok
+    indice = obtener_indice_remesas(directorio_salida)
+    if not ok and indice is not None:
+        with bloqueo_compartido(NOMBRE_INDICE) as compartido:
+            if compartido:
+                indice.recargar()
+            indice.liberar(ruta_pdf)
+    if al_terminar is not None:
+        try:
+            al_terminar(ruta_pdf, ok)
+        except Exception as e:
+            print(f"⚠️ Error registrando el resultado de {os.path.basename(ruta_pdf)}: {e}")
+    return ok
+
+def procesar_lote(rutas_pdf: list, directorio_salida: str, max_concurrencia: int = 1, al_terminar=None) -> list:
+    """
+    Procesa una lista de PDFs y devuelve una lista de booleanos con el resultado
+    de cada archivo, en el mismo orden que rutas_pdf.
+    Con max_concurrencia > 1 se usan varios hilos para solapar la espera de red
+    de las llamadas a Gemini; como mucho habrá max_concurrencia peticiones en curso.
+    Con la agrupación activa cada petición lleva varios documentos, así que se
+    usan tantos hilos como documentos caben en max_concurrencia peticiones.
+    """
+    hilos = max_concurrencia
+    if _agrupador is not None:
+        hilos = max(1, max_concurrencia) * _agrupador.max_documentos
+    if perfilado_activo():
+        # cProfile solo perfila el hilo que lo activa y, en Python 3.12+, uno a la vez
+        hilos = 1
+    if hilos <= 1 or len(rutas_pdf) <= 1:
+        return [_procesar_pdf_seguro(ruta, directorio_salida, al_terminar) for ruta in rutas_pdf]
+
+    with ThreadPoolExecutor(max_workers=hilos) as executor:
+        # executor.map conserva el orden de entrada aunque terminen en otro orden
+        return list(executor.map(lambda ruta: _procesar_pdf_seguro(ruta, directorio_salida, al_terminar), rutas_pdf))
+
+class CombinadorTSV:
+    """
+    Construye todos_los_documentos.tsv por anexado a medida que terminan los
+    archivos, en lugar de releer y concatenar todos los TSV al final.
+    Las filas se escriben en el orden de archivos_ordenados: si un archivo
+    termina antes que los anteriores espera (solo su nombre, no sus datos) a
+    que estos terminen. Cada bloque se vuelca a disco al escribirse, de modo
+    que el archivo combinado es utilizable aunque se interrumpa la ejecución.
+    Con anexar=True se añaden filas al combinado existente en lugar de
+    reconstruirlo (modo vigilancia).
+    Con suprimir_duplicados=True no se escribe una fila idéntica (en las
+    columnas de datos) a otra ya escrita desde un archivo distinto; las filas
+    repetidas dentro de un mismo archivo se conservan. Para no guardar las
+    filas, se recuerda solo un hash de cada una.
+    """
+
+    def __init__(self, archivos_ordenados: list, directorio_salida: str, anexar: bool = False,
+                 suprimir_duplicados: bool = False):
+        self.directorio_salida = directorio_salida
+        self.ruta = os.path.join(directorio_salida, NOMBRE_COMBINADO)
+        self.total_registros = 0
+        self.filas_duplicadas = 0
+        self._orden = list(archivos_ordenados)
+        self._terminados = {}
+        self._siguiente = 0
+        self._archivo = None
+        self._en_curso = {}  # archivo en streaming -> lo añadido al combinado (para retirarlo si falla)
+        self._vistas = {} if suprimir_duplicados else None  # hash de la fila -> archivo que la aportó
+        self._lock = threading.Lock()
+        self._anexar_a_existente = anexar and os.path.exists(self.ruta)
+        # Eliminar el combinado de una ejecución anterior para no mezclar resultados
+        if not anexar and os.path.exists(self.ruta):
+            os.remove(self.ruta)
+        if self._anexar_a_existente and self._vistas is not None:
+            self._cargar_vistas()
+
+    def _cargar_vistas(self) -> None:
+        """Recuerda las filas que ya tiene el combinado al que se va a anexar"""
+        indice_origen = len(COLUMNAS_TSV)
+        with open(self.ruta, 'r', encoding='utf-8', newline='') as f:
+            f.readline()
+            for linea in f:
+                campos = linea.rstrip('\r\n').split('\t')
+                origen = campos[indice_origen] if len(campos) > indice_origen else ''
+                self._vistas.setdefault(hash('\t'.join(campos[:indice_origen])), origen)
+
+    def _escribir_fila(self, linea: str, nombre: str, en_curso: dict = None) -> bool:
+        """Escribe la fila salvo que duplique una de otro archivo. Retorna si se escribió"""
+        if self._vistas is not None:
+            clave = hash('\t'.join(linea.rstrip('\r\n').split('\t')[:len(COLUMNAS_TSV)]))
+            origen = self._vistas.get(clave)
+            if origen is None:
+                self._vistas[clave] = nombre
+                if en_curso is not None:
+                    en_curso['claves'].append(clave)
+            elif origen != nombre:
+                self.filas_duplicadas += 1
+                if en_curso is not None:
+                    en_curso['duplicadas'] += 1
+                return False
+        self._archivo.write(linea)
+        self.total_registros += 1
+        if en_curso is not None:
+            en_curso['escritas'] += 1
+        return True
+
+    def marcar_terminado(self, archivo: str, ok: bool) -> None:
+        with medir('combinado'):
+            self._marcar_terminado(archivo, ok)
+
+    def _marcar_terminado(self, archivo: str, ok: bool) -> None:
+        """Registra el resultado de un archivo y anexa todo lo que ya esté en orden"""
+        with self._lock:
+            self._terminados[os.path.basename(archivo)] = ok
+            while self._siguiente < len(self._orden) and self._orden[self._siguiente] in self._terminados:
+                nombre = self._orden[self._siguiente]
+                ok = self._terminados.pop(nombre)
+                en_curso = self._en_curso.pop(nombre, None)
+                if en_curso is not None and not ok:
+                    self._retirar(nombre, en_curso)
+                elif ok:
+                    # Si ya se añadieron filas en streaming, solo faltan las posteriores
+                    self._anexar(nombre, saltar=en_curso['leidas'] if en_curso else 0)
+                self._siguiente += 1
+            if self._archivo is not None:
+                self._archivo.flush()
+
+    def _abrir(self, cabecera: str) -> None:
+        if self._archivo is None:
+            if self._anexar_a_existente:
+                self._archivo = open(self.ruta, 'a', encoding='utf-8', newline='')
+            else:
+                self._archivo = open(self.ruta, 'w', encoding='utf-8', newline='')
+                self._archivo.write(cabecera)
+
+    def _anexar(self, nombre: str, saltar: int = 0) -> None:
+        ruta_tsv = ruta_tsv_salida(nombre, self.directorio_salida)
+        try:
+            # Copia línea a línea sin pasar por pandas: memoria constante
+            with open(ruta_tsv, 'r', encoding='utf-8', newline='') as origen:
+                self._abrir(origen.readline())
+                duplicadas = 0
+                for numero, linea in enumerate(origen):
+                    if numero >= saltar and not self._escribir_fila(linea, nombre):
+                        duplicadas += 1
+            print(f"✓ Añadido al combinado: {nombre}" + (f" ({duplicadas} fila(s) duplicadas omitidas)" if duplicadas else ""))
+        except Exception as e:
+            print(f"❌ Error al leer {nombre}: {e}")
+
+    def anexar_en_curso(self, archivo: str, ruta_parcial: str, texto: str) -> None:
+        """
+        Recibe las filas que un archivo en streaming acaba de escribir en su
+        TSV parcial. Si es el siguiente en el orden se añaden ya al combinado
+        (la primera vez, junto con las que tuviera antes su parcial); si no,
+        esperan en el parcial y se añaden al terminar, como las de los demás.
+        """
+        nombre = os.path.basename(archivo)
+        with self._lock:
+            if self._siguiente >= len(self._orden) or self._orden[self._siguiente] != nombre:
+                return
+            en_curso = self._en_curso.get(nombre)
+            if en_curso is not None:
+                # Mismo corte en líneas que al leer el TSV del archivo
+                for linea in StringIO(texto, newline=''):
+                    self._escribir_fila(linea, nombre, en_curso)
+                    en_curso['leidas'] += 1
+            else:
+                with open(ruta_parcial, 'r', encoding='utf-8', newline='') as origen:
+                    self._abrir(origen.readline())
+                    en_curso = self._en_curso[nombre] = {
+                        'posicion': self._archivo.tell(), 'leidas': 0, 'escritas': 0, 'duplicadas': 0, 'claves': []}
+                    for linea in origen:
+                        self._escribir_fila(linea, nombre, en_curso)
+                        en_curso['leidas'] += 1
+            self._archivo.flush()
+
+    def _retirar(self, nombre: str, en_curso: dict) -> None:
+        """Quita del combinado las filas añadidas en streaming de un archivo que ha fallado"""
+        self._archivo.truncate(en_curso['posicion'])
+        self._archivo.seek(en_curso['posicion'])
+        self.total_registros -= en_curso['escritas']
+        self.filas_duplicadas -= en_curso['duplicadas']
+        for clave in en_curso['claves']:
+            del self._vistas[clave]
+        print(f"↩️ Retiradas del combinado las {en_curso['escritas']} fila(s) de {nombre}.")
+
+    def cerrar(self) -> str:
+        """Cierra el archivo combinado. Retorna su ruta o None si no se escribió nada"""
+        with self._lock:
+            if self._archivo is None:
+                return None
+            self._archivo.close()
+            self._archivo = None
+        return self.ruta
+
+def combinar_archivos_tsv(archivos_procesados: list, directorio_salida: str) -> str:
+    """
+    Combina los TSV individuales de los archivos procesados en todos_los_documentos.tsv,
+    respetando el orden de archivos_procesados. Retorna la ruta del archivo combinado
+    o None si no había nada que combinar.
+    """
+    print("\n=== Combinando archivos TSV ===")
+    combinador = CombinadorTSV(archivos_procesados, directorio_salida, suprimir_duplicados=deteccion_duplicados_activa())
+    for archivo in archivos_procesados:
+        combinador.marcar_terminado(archivo, True)
+    ruta_combinado = combinador.cerrar()
+    if ruta_combinado:
+        print(f"\n✅ Archivo combinado creado en: {ruta_combinado}")
+        print(f"   Total de registros: {combinador.total_registros}")
+        if combinador.filas_duplicadas:
+            print(f"🧹 {combinador.filas_duplicadas} fila(s) duplicadas de otros archivos omitidas.")
+    return ruta_combinado
+
+def generar_salida_columnar(ruta_combinado: str, desde: int = None) -> str:
+    """
+    Si SALIDA_COLUMNAR está activa, genera la copia Parquet/Arrow del combinado;
+    con `desde`, solo añade las filas anexadas a partir de esa posición
+    """
+    formato = formato_columnar_activo()
+    if not formato or not ruta_combinado or not os.path.exists(ruta_combinado):
+        return None
+    with medir('salida_columnar'):
+        return escribir_salida_columnar(ruta_combinado, os.path.dirname(ruta_combinado), formato, desde)
+
+def actualizar_base_datos(directorio_salida: str, archivos_procesados: list) -> None:
+    """
+    Si BASE_DATOS_SQLITE está activa, lleva a la base de datos las filas de
+    los TSV nuevos o modificados y quita las de los archivos que ya no están
+    en el combinado. Los TSV sin cambios no se vuelven a leer.
+    """
+    ruta = ruta_base_datos_activa(directorio_salida)
+    if not ruta:
+        return
+    try:
+        with medir('base_datos'):
+            base_datos = BaseDatosRemesas(ruta, COLUMNAS_TSV + ['Archivo_Origen'])
+            try:
+                actualizados, filas, eliminados = base_datos.sincronizar(
+                    {archivo: ruta_tsv_salida(archivo, directorio_salida) for archivo in archivos_procesados})
+                total = base_datos.total_filas()
+            finally:
+                base_datos.cerrar()
+    except Exception as e:
+        print(f"❌ Error al actualizar la base de datos: {e}")
+        return
+    print(f"🗄️ Base de datos actualizada: {actualizados} archivo(s) nuevos o modificados ({filas} filas)"
+          + (f", {eliminados} eliminado(s)" if eliminados else "") + f"; {total} filas en {ruta}")
+
+def validacion_activa() -> bool:
+    """VALIDAR_DATOS=0 en el .env desactiva la validación del archivo combinado"""
+    return os.getenv("VALIDAR_DATOS", "1").strip().lower() not in ("0", "false", "no")
+
+def reprocesar_marcados_activo() -> bool:
+    """REPROCESAR_MARCADOS=1 en el .env vuelve a enviar (sin leer la caché) los documentos con filas marcadas"""
+    return os.getenv("REPROCESAR_MARCADOS", "0").strip().lower() in ("1", "true", "si", "sí")
+
+def combinado_validado(ruta_combinado: str) -> bool:
+    """Si el combinado ya tiene la columna Validacion (todas sus filas están validadas)"""
+    try:
+        with open(ruta_combinado, 'r', encoding='utf-8', newline='') as f:
+            return COLUMNA_VALIDACION in f.readline().rstrip('\r\n').split('\t')
+    except OSError:
+        return False
+
+def validar_combinado(ruta_combinado: str, desde: int = None) -> list:
+    """
+    Valida el archivo combinado (IBAN, importes, fechas y referencias), añade
+    la columna Validacion y escribe informe_validacion.tsv con las filas
+    marcadas. Con `desde` (posición del final del combinado antes de anexarle
+    filas) y un combinado ya validado, solo se validan las filas anexadas.
+    Retorna los nombres de los archivos con alguna fila marcada.
+    """
+    if not validacion_activa() or not ruta_combinado or not os.path.exists(ruta_combinado):
+        return []
+    solo_anexadas = desde is not None and combinado_validado(ruta_combinado)
+    inicio = time.perf_counter()
+    try:
+        with medir('validacion'):
+            if solo_anexadas:
+                total, marcadas, archivos_marcados = validar_filas_anexadas(ruta_combinado, desde)
+            else:
+                total, marcadas, archivos_marcados = validar_archivo_combinado(ruta_combinado)
+    except Exception as e:
+        print(f"⚠️ No se pudo validar el archivo combinado: {e}")
+        return []
+    duracion = time.perf_counter() - inicio
+    filas = "filas nuevas" if solo_anexadas else "filas"
+    if marcadas:
+        print(f"⚠️ Validación: {marcadas} de {total} {filas} marcadas en {len(archivos_marcados)} archivo(s) "
+              f"({duracion:.2f}s). Detalle en {NOMBRE_INFORME}.")
+    else:
+        print(f"✅ Validación: las {total} {filas} son correctas ({duracion:.2f}s).")
+    return archivos_marcados
+
+def reprocesar_marcados(directorio_pdfs: str, marcados: list, archivos_procesados: list,
+                        max_concurrencia: int, manifiesto) -> str:
+    """
+    Vuelve a procesar solo los documentos marcados por la validación sin leer
+    la caché de respuestas (que devolvería la misma respuesta); la respuesta
+    nueva reemplaza a la guardada. Reconstruye y revalida el archivo
+    combinado. Retorna la ruta del combinado.
+    """
+    directorio_salida = os.path.join(directorio_pdfs, 'output')
+    print(f"\n🔁 Reprocesando {len(marcados)} documento(s) marcados por la validación...")
+
+    def al_terminar(ruta_pdf, ok):
+        if ok:
+            manifiesto.registrar(ruta_pdf, ruta_tsv_salida(ruta_pdf, directorio_salida))
+
+    rutas = [os.path.join(directorio_pdfs, a) for a in marcados]
+    if _cache_respuestas is None:
+        procesar_lote(rutas, directorio_salida, max_concurrencia, al_terminar)
+    else:
+        with _cache_respuestas.refrescando():
+            procesar_lote(rutas, directorio_salida, max_concurrencia, al_terminar)
+    ruta_combinado = combinar_archivos_tsv(archivos_procesados, directorio_salida)
+    validar_combinado(ruta_combinado)
+    return ruta_combinado
+
+def obtener_max_concurrencia() -> int:
+    """
+    Lee MAX_PETICIONES_CONCURRENTES del entorno (.env). Por defecto 4.
+    Un valor de 1 reproduce el procesamiento secuencial de siempre.
+    """
+    valor = os.getenv("MAX_PETICIONES_CONCURRENTES", "4")
+    try:
+        return max(1, int(valor))
+    except ValueError:
+        print(f"⚠️ MAX_PETICIONES_CONCURRENTES no válido ('{valor}'), se usa 1.")
+        return 1
+
+def procesamiento_incremental_activo() -> bool:
+    """PROCESAMIENTO_INCREMENTAL=0 en el .env fuerza a reprocesar todos los PDFs"""
+    return os.getenv("PROCESAMIENTO_INCREMENTAL", "1").strip().lower() not in ("0", "false", "no")
+
 def seleccionar_carpeta():
     """
     Muestra un diálogo para seleccionar una carpeta y retorna la ruta seleccionada.
     """
+    import tkinter as tk
+    from tkinter import filedialog
+
     root = tk.Tk()
     root.withdraw()  # Ocultar la ventana principal
     carpeta = filedialog.askdirectory(title="Selecciona la carpeta con los archivos PDF")
     return carpeta if carpeta else None
 
-def main():
+def listar_pdfs(directorio_pdfs: str) -> list:
+    """PDFs de la carpeta en orden alfabético, para que el combinado sea determinista"""
+    return sorted(f for f in os.listdir(directorio_pdfs) if f.lower().endswith('.pdf'))
+
+def procesar_carpeta(directorio_pdfs: str, max_concurrencia: int = 1) -> list:
     """
-    Función principal que procesa todos los PDFs en el directorio seleccionado.
+    Procesa todos los PDFs de directorio_pdfs, genera los TSV en su subcarpeta
+    output y los combina. Retorna la lista de archivos procesados con éxito.
     """
-    # Cargar .env desde la ubicación correcta cuando se ejecuta como .exe
-    env_path = resource_path('.env')
-    load_dotenv(env_path)
-    api_key = os.getenv("GOOGLE_API_KEY")
-    
-    if not api_key:
-        error_msg = "No se encontró la API Key de Google.\n\nAsegúrate de que el archivo .env existe y contiene la variable GOOGLE_API_KEY."
-        mostrar_error(error_msg)
-        return
-    genai.configure(api_key=api_key)
-    print("✓ API Key de Google configurada.")
-    
-    # Mostrar diálogo para seleccionar carpeta
-    directorio_pdfs = seleccionar_carpeta()
-    if not directorio_pdfs:
-        print("❌ Error: No se seleccionó ninguna carpeta.")
-        return
-    
     if not os.path.exists(directorio_pdfs):
         print(f"❌ Error: El directorio '{directorio_pdfs}' no existe.")
-        return
+        return []
         
-    archivos_pdf = [f for f in os.listdir(directorio_pdfs) if f.lower().endswith('.pdf')]
+    archivos_pdf = listar_pdfs(directorio_pdfs)
     if not archivos_pdf:
         print(f"ℹ️ No se encontraron archivos PDF en el directorio '{directorio_pdfs}'.")
-        return
+        return []
         
-    print(f"📁 Encontrados {len(archivos_pdf)} PDF(s) para procesar.")
+    print(f"📁 Encontrados {len(archivos_pdf)} PDF(s) para procesar (hasta {max_concurrencia} en paralelo).")
     
     # Procesar cada PDF y mantener un registro de los archivos procesados exitosamente
     # Crear el directorio de salida dentro de la carpeta seleccionada
     directorio_salida = os.path.join(directorio_pdfs, 'output')
     os.makedirs(directorio_salida, exist_ok=True)
 
-    archivos_procesados = []
+    # El manifiesto permite saltar los PDFs que no han cambiado desde la última
+    # ejecución y reanudar una ejecución interrumpida
+    manifiesto = Manifiesto(directorio_salida)
+    manifiesto.conservar_solo(archivos_pdf)
+    incremental = procesamiento_incremental_activo()
+    archivos_sin_cambios = set()
+    if incremental:
+        archivos_sin_cambios = {a for a in archivos_pdf if manifiesto.sin_cambios(os.path.join(directorio_pdfs, a))}
+        # Un duplicado cuyo original ya no está en la carpeta se procesa: sus filas no están en otro TSV
+        indice = obtener_indice_remesas(directorio_salida)
+        if indice is not None:
+            archivos_sin_cambios = {a for a in archivos_sin_cambios
+                                    if not indice.original_de(a) or indice.original_de(a) in archivos_pdf}
+        if archivos_sin_cambios:
+            print(f"♻️ {len(archivos_sin_cambios)} PDF(s) sin cambios, se reutiliza su TSV.")
+
+    # El archivo combinado se va construyendo a medida que termina cada PDF
+    combinador = CombinadorTSV(archivos_pdf, directorio_salida, suprimir_duplicados=deteccion_duplicados_activa())
     for archivo in archivos_pdf:
-        ruta_completa = os.path.join(directorio_pdfs, archivo)
-        if procesar_pdf(ruta_completa, directorio_salida):
-            archivos_procesados.append(archivo)
+        if archivo in archivos_sin_cambios:
+            combinador.marcar_terminado(archivo, True)
+
+    def al_terminar(ruta_pdf, ok):
+        if ok:
+            manifiesto.registrar(ruta_pdf, ruta_tsv_salida(ruta_pdf, directorio_salida))
+        combinador.marcar_terminado(ruta_pdf, ok)
+
+    pendientes = [a for a in archivos_pdf if a not in archivos_sin_cambios]
+    rutas_pdf = [os.path.join(directorio_pdfs, archivo) for archivo in pendientes]
+    configurar_combinador(combinador)
+    try:
+        resultados = procesar_lote(rutas_pdf, directorio_salida, max_concurrencia, al_terminar)
+    finally:
+        configurar_combinador(None)
+        ruta_combinado = combinador.cerrar()
+    exitosos = {archivo for archivo, ok in zip(pendientes, resultados) if ok}
+    archivos_procesados = [a for a in archivos_pdf if a in exitosos or a in archivos_sin_cambios]
     
-    # Combinar todos los TSV procesados en un solo archivo
-    if archivos_procesados:
-        print("\n=== Combinando archivos TSV ===")
-        dfs = []
-        for archivo in archivos_procesados:
-            nombre_base = os.path.splitext(archivo)[0]
-            ruta_tsv = os.path.join(directorio_salida, f"{nombre_base}.tsv")
-            try:
-                # Leer el TSV sin encabezados y agregar la columna con el nombre del PDF
-                columnas = [
-                    'Referencia Única', 'Nombre del Librado', 'IBAN', 'Importe', 
-                    'Vencimiento', 'Emisor', 'Identificación del Emisor', 
-                    'Referencia del Fichero', 'Fecha de Recepción', 'Fecha del Documento', 
-                    'Referencia Única del Documento', 'Archivo_Origen'
-                ]
-                df = pd.read_csv(ruta_tsv, sep='\t', names=columnas, skiprows=1)  # Saltamos la primera fila (encabezados)
-                dfs.append(df)
-                print(f"✓ Leído: {archivo}")
-            except Exception as e:
-                print(f"❌ Error al leer {archivo}: {e}")
-        
-        if dfs:
-            # Combinar todos los DataFrames
-            df_combinado = pd.concat(dfs, ignore_index=True)
-            
-            # Guardar el archivo combinado
-            ruta_combinado = os.path.join(directorio_salida, "todos_los_documentos.tsv")
-            df_combinado.to_csv(ruta_combinado, sep='\t', index=False, encoding='utf-8')
-            print(f"\n✅ Archivo combinado creado en: {ruta_combinado}")
-            print(f"   Total de registros: {len(df_combinado)}")
+    if ruta_combinado:
+        print(f"\n✅ Archivo combinado creado en: {ruta_combinado}")
+        print(f"   Total de registros: {combinador.total_registros}")
+        if combinador.filas_duplicadas:
+            print(f"🧹 {combinador.filas_duplicadas} fila(s) duplicadas de otros archivos omitidas.")
+        marcados = validar_combinado(ruta_combinado)
+        # Solo los procesados en esta ejecución: los reutilizados sin cambios ya se
+        # reprocesaron cuando se procesaron, y una carpeta sin cambios no debe costar peticiones
+        marcados = [a for a in marcados if a not in archivos_sin_cambios]
+        if marcados and reprocesar_marcados_activo():
+            ruta_combinado = reprocesar_marcados(directorio_pdfs, marcados, archivos_procesados,
+                                                 max_concurrencia, manifiesto)
+        generar_salida_columnar(ruta_combinado)
+    actualizar_base_datos(directorio_salida, archivos_procesados)
     
     print("\n=== Resumen del Procesamiento ===")
     print(f"Total de archivos: {len(archivos_pdf)}")
     print(f"✅ Procesados exitosamente: {len(archivos_procesados)}")
+    if archivos_sin_cambios:
+        print(f"♻️ Reutilizados sin cambios: {len(archivos_sin_cambios)}")
+    indice = obtener_indice_remesas(directorio_salida)
+    duplicados = [a for a in archivos_procesados if indice is not None and indice.original_de(a)]
+    if duplicados:
+        print(f"♻️ Remesas duplicadas (ya incorporadas con otro nombre): {len(duplicados)}")
     print(f"❌ Fallidos: {len(archivos_pdf) - len(archivos_procesados)}")
+    if _cache_respuestas is not None:
+        print(f"♻️ Caché de respuestas: {_cache_respuestas.resumen()}")
+    if _almacen_texto is not None:
+        print(f"♻️ Almacén de textos: {_almacen_texto.resumen()}")
+    if _limitador is not None:
+        print(f"⏳ Limitador de peticiones: {_limitador.resumen()}")
+    if _agrupador is not None:
+        print(f"📦 Agrupación de documentos: {_agrupador.resumen()}")
+    return archivos_procesados
+
+def vigilar_carpeta(directorio_pdfs: str, max_concurrencia: int = 1, intervalo: float = 5.0, ciclos: int = None) -> None:
+    """
+    Modo vigilancia: procesa la carpeta una vez y después la revisa cada
+    `intervalo` segundos, procesando los PDFs nuevos o modificados en cuanto
+    llegan y añadiendo sus filas a todos_los_documentos.tsv. Un PDF no se
+    procesa hasta que su tamaño no cambia entre dos revisiones (copia
+    terminada), y uno que falla no se reintenta hasta que se modifica.
+    Con `ciclos` se limita el número de revisiones (útil para pruebas).
+    """
+    procesar_carpeta(directorio_pdfs, max_concurrencia)
+    directorio_salida = os.path.join(directorio_pdfs, 'output')
+    os.makedirs(directorio_salida, exist_ok=True)
+    manifiesto = Manifiesto(directorio_salida)
+    tamanos_anteriores = {}
+    fallidos = {}
+    print(f"\n👀 Vigilando '{directorio_pdfs}' cada {intervalo:g}s (Ctrl+C para terminar)...")
+
+    ciclo = 0
+    try:
+        while ciclos is None or ciclo < ciclos:
+            ciclo += 1
+            time.sleep(intervalo)
+            candidatos = {}
+            for archivo in listar_pdfs(directorio_pdfs):
+                ruta = os.path.join(directorio_pdfs, archivo)
+                try:
+                    estado = os.stat(ruta)
+                    if fallidos.get(archivo) == (estado.st_size, estado.st_mtime) or manifiesto.sin_cambios(ruta):
+                        continue
+                except OSError:
+                    continue  # Borrado o aún bloqueado por la copia
+                candidatos[archivo] = estado.st_size
+            estables = [a for a, tamano in candidatos.items() if tamanos_anteriores.get(a) == tamano]
+            tamanos_anteriores = candidatos
+            if not estables:
+                continue
+
+            print(f"\n📥 {len(estables)} PDF(s) nuevos o modificados.")
+            # Un PDF modificado ya tenía filas en el combinado: hay que reconstruirlo
+            reconstruir = any(a in manifiesto.entradas for a in estables)
+            # Si no, las filas se anexan y solo ellas se validan y pasan a la salida columnar
+            ruta_combinado = os.path.join(directorio_salida, NOMBRE_COMBINADO)
+            desde = None
+            if not reconstruir and os.path.exists(ruta_combinado) and (not validacion_activa() or combinado_validado(ruta_combinado)):
+                desde = os.path.getsize(ruta_combinado)
+            combinador = None if reconstruir else CombinadorTSV(estables, directorio_salida, anexar=True,
+                                                                suprimir_duplicados=deteccion_duplicados_activa())
+
+            def al_terminar(ruta_pdf, ok):
+                if ok:
+                    manifiesto.registrar(ruta_pdf, ruta_tsv_salida(ruta_pdf, directorio_salida))
+                    fallidos.pop(os.path.basename(ruta_pdf), None)
+                else:
+                    estado = os.stat(ruta_pdf)
+                    fallidos[os.path.basename(ruta_pdf)] = (estado.st_size, estado.st_mtime)
+                if combinador is not None:
+                    combinador.marcar_terminado(ruta_pdf, ok)
+
+            rutas = [os.path.join(directorio_pdfs, a) for a in estables]
+            configurar_combinador(combinador)
+            try:
+                resultados = procesar_lote(rutas, directorio_salida, max_concurrencia, al_terminar)
+            finally:
+                configurar_combinador(None)
+                if combinador is not None:
+                    combinador.cerrar()
+            if reconstruir:
+                combinar_archivos_tsv([a for a in listar_pdfs(directorio_pdfs) if a in manifiesto.entradas], directorio_salida)
+            if any(resultados):
+                validar_combinado(ruta_combinado, desde)
+                generar_salida_columnar(ruta_combinado, desde)
+                actualizar_base_datos(directorio_salida, [a for a in listar_pdfs(directorio_pdfs) if a in manifiesto.entradas])
+            for archivo in estables:
+                tamanos_anteriores.pop(archivo, None)
+            print(f"✅ {sum(resultados)} procesado(s), ❌ {len(resultados) - sum(resultados)} fallido(s).")
+    except KeyboardInterrupt:
+        print("\n⏹️ Vigilancia detenida.")
+
+def procesar_como_trabajador(directorio_pdfs: str, max_concurrencia: int = 1, espera: float = 2.0) -> list:
+    """
+    Modo trabajador: varios procesos, en esta u otras máquinas, procesan a la
+    vez la misma carpeta (por ejemplo, en una unidad de red). Cada trabajador
+    reclama unos pocos PDFs pendientes en la cola compartida, los procesa y
+    confirma su TSV y su entrada del manifiesto solo si la concesión sigue
+    siendo suya; los PDFs de un trabajador caído se recuperan al caducar su
+    concesión. Cuando no quedan pendientes, el combinado se reconstruye (por
+    un trabajador cada vez) si algún otro ha confirmado archivos desde la
+    última vez. Retorna los archivos procesados por este trabajador.
+    """
+    if not os.path.exists(directorio_pdfs):
+        print(f"❌ Error: El directorio '{directorio_pdfs}' no existe.")
+        return []
+    directorio_salida = os.path.join(directorio_pdfs, 'output')
+    os.makedirs(directorio_salida, exist_ok=True)
+    cola = ColaCompartida(directorio_salida, duracion_concesion=_leer_numero_env("DURACION_CONCESION", 120))
+    configurar_cola(cola)
+    print(f"👷 Trabajador {cola.trabajador} en '{directorio_pdfs}' (hasta {max_concurrencia} en paralelo).")
+
+    procesados = []
+    fallidos = set()  # no se reintentan en esta ejecución (otro trabajador sí puede intentarlo)
+
+    def pendientes_segun_manifiesto(archivos: list) -> list:
+        with cola.exclusivo(NOMBRE_MANIFIESTO):
+            manifiesto = Manifiesto(directorio_salida)
+            return [a for a in archivos if not manifiesto.sin_cambios(os.path.join(directorio_pdfs, a))]
+
+    def al_terminar(ruta_pdf, ok):
+        archivo = os.path.basename(ruta_pdf)
+        if not ok:
+            fallidos.add(archivo)
+        elif cola.es_propia(archivo):
+            with cola.exclusivo(NOMBRE_MANIFIESTO):
+                Manifiesto(directorio_salida).registrar(ruta_pdf, ruta_tsv_salida(ruta_pdf, directorio_salida))
+            procesados.append(archivo)
+        else:
+            print(f"⚠️ {archivo}: la concesión caducó durante el proceso; lo confirma otro trabajador.")
+        cola.liberar(archivo)
+
+    try:
+        while True:
+            pendientes = pendientes_segun_manifiesto([a for a in listar_pdfs(directorio_pdfs) if a not in fallidos])
+            if not pendientes:
+                break
+            # Pocos a la vez, para repartir la carpeta entre todos los trabajadores
+            reclamados = []
+            for archivo in pendientes:
+                if len(reclamados) >= max_concurrencia:
+                    break
+                if cola.reclamar(archivo):
+                    reclamados.append(archivo)
+            # Otro trabajador pudo confirmarlo entre la lectura del manifiesto y la reclamación
+            vigentes = pendientes_segun_manifiesto(reclamados)
+            for archivo in set(reclamados) - set(vigentes):
+                cola.liberar(archivo)
+            if not vigentes:
+                # Lo pendiente está en manos de otros: esperar por si alguno cae
+                time.sleep(espera)
+                continue
+            procesar_lote([os.path.join(directorio_pdfs, a) for a in vigentes], directorio_salida,
+                          max_concurrencia, al_terminar)
+
+        with cola.exclusivo(NOMBRE_COMBINADO):
+            archivos_pdf = listar_pdfs(directorio_pdfs)
+            with cola.exclusivo(NOMBRE_MANIFIESTO):
+                manifiesto = Manifiesto(directorio_salida)
+                manifiesto.conservar_solo(archivos_pdf)
+            completados = [a for a in archivos_pdf if a in manifiesto.entradas]
+            ruta_combinado = os.path.join(directorio_salida, NOMBRE_COMBINADO)
+            if completados and (not os.path.exists(ruta_combinado)
+                                or os.path.getmtime(manifiesto.ruta) > os.path.getmtime(ruta_combinado)):
+                ruta_combinado = combinar_archivos_tsv(completados, directorio_salida)
+                validar_combinado(ruta_combinado)
+                generar_salida_columnar(ruta_combinado)
+                actualizar_base_datos(directorio_salida, completados)
+    finally:
+        configurar_cola(None)
+        cola.cerrar()
+
+    print(f"\n=== Resumen del Trabajador {cola.trabajador} ===")
+    print(f"✅ Procesados por este trabajador: {len(procesados)}")
+    print(f"❌ Fallidos: {len(fallidos)}")
+    if cola.recuperadas:
+        print(f"⏰ Concesiones caducadas recuperadas: {cola.recuperadas}")
+    return procesados
+
+def imprimir_resumen_informe(resumen: dict) -> None:
+    """Resumen final del informe de ejecución"""
+    print("\n=== Informe de la Ejecución ===")
+    etapas = dict(resumen['etapas'], **resumen['etapas_ejecucion'])
+    if etapas:
+        print("⏱️ Tiempo por etapa: " + ", ".join(f"{etapa} {segundos:.2f}s" for etapa, segundos in etapas.items()))
+    print(f"🔢 {resumen['peticiones']} petición(es) a Gemini: {resumen['tokens_prompt']} tokens de entrada, "
+          f"{resumen['tokens_respuesta']} de salida, {resumen['reintentos']} reintento(s).")
+    print(f"♻️ {resumen['aciertos_cache']} acierto(s) de caché; {resumen['filas']} fila(s) generadas.")
+    if resumen['mas_lentos']:
+        print("🐢 Más lentos: " + ", ".join(f"{r['archivo']} ({r['segundos']:.2f}s)" for r in resumen['mas_lentos']))
+
+def parsear_argumentos(argv=None):
+    """
+    Argumentos de línea de comandos. Sin argumentos el comportamiento es el de
+    siempre: diálogo para elegir la carpeta y un único procesamiento.
+    """
+    parser = argparse.ArgumentParser(description="Extrae los datos de las remesas PDF de una carpeta a TSV usando Gemini.")
+    parser.add_argument('carpeta', nargs='?',
+                        help="Carpeta con los PDFs. Si se indica no se muestra el diálogo de selección.")
+    parser.add_argument('--vigilar', action='store_true',
+                        help="Mantenerse en ejecución procesando los PDFs que vayan llegando a la carpeta.")
+    parser.add_argument('--intervalo', type=float, default=5.0,
+                        help="Segundos entre revisiones de la carpeta en modo vigilancia (por defecto 5).")
+    parser.add_argument('--concurrencia', type=int, default=None,
+                        help="Peticiones simultáneas al modelo (por defecto MAX_PETICIONES_CONCURRENTES).")
+    parser.add_argument('--backend', choices=backends_disponibles(), default=None,
+                        help="Backend del modelo: gemini u openai (servidor local compatible; por defecto BACKEND_LLM o gemini).")
+    parser.add_argument('--modelo', default=None,
+                        help="Modelo a usar con el backend (por defecto MODELO_LLM).")
+    parser.add_argument('--trabajador', action='store_true',
+                        help="Procesar la carpeta junto con otros procesos o máquinas que trabajan en la misma carpeta compartida.")
+    parser.add_argument('--medir-arranque', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.trabajador and args.vigilar:
+        parser.error("--trabajador y --vigilar no se pueden combinar")
+    return args
+
+def main(argv=None):
+    """
+    Función principal que procesa todos los PDFs en el directorio seleccionado.
+    """
+    args = parsear_argumentos(argv)
+    # Sin carpeta en la línea de comandos se trabaja en modo gráfico (diálogos)
+    modo_grafico = not args.carpeta
+
+    # Cargar .env desde la ubicación correcta cuando se ejecuta como .exe
+    env_path = resource_path('.env')
+    load_dotenv(env_path)
+    api_key = os.getenv("GOOGLE_API_KEY")
+    try:
+        backend = crear_backend_llm(args.backend, args.modelo, api_key)
+    except ValueError as e:
+        if modo_grafico:
+            mostrar_error(str(e))
+        else:
+            print(f"❌ {e}")
+        return 1
+
+    if backend.nombre == 'gemini' and not api_key:
+        error_msg = "No se encontró la API Key de Google.\n\nAsegúrate de que el archivo .env existe y contiene la variable GOOGLE_API_KEY."
+        if modo_grafico:
+            mostrar_error(error_msg)
+        else:
+            print(f"❌ {error_msg}")
+        return 1
+
+    if args.medir_arranque:
+        # Punto en el que se mostraría el diálogo; lo usa benchmark_arranque.py
+        import tkinter  # noqa: F401
+        return 0
+    
+    # Mostrar diálogo para seleccionar carpeta si no se indicó en la línea de comandos.
+    # Se muestra antes de importar Gemini (se importa en la primera petición) para que aparezca lo antes posible.
+    directorio_pdfs = args.carpeta or seleccionar_carpeta()
+    if not directorio_pdfs:
+        print("❌ Error: No se seleccionó ninguna carpeta.")
+        return 1
+
+    configurar_backend(backend)
+    if backend.nombre == 'gemini':
+        print("✓ API Key de Google configurada.")
+    else:
+        print(f"✓ Modelo '{backend.modelo}' en {backend.url}.")
+    configurar_cache_respuestas(crear_cache_respuestas())
+    configurar_almacen_texto(crear_almacen_texto())
+    configurar_limitador(crear_limitador())
+    
+    max_concurrencia = args.concurrencia if args.concurrencia else obtener_max_concurrencia()
+    if os.path.isdir(directorio_pdfs):
+        configurar_informe(crear_informe(os.path.join(directorio_pdfs, 'output')))
+    if perfilado_activo() and max_concurrencia > 1:
+        print(f"⚠️ PERFILAR_MAS_LENTOS activo: los PDFs se procesan de uno en uno (no {max_concurrencia} en paralelo) "
+              "para poder perfilar cada archivo.")
+        max_concurrencia = 1
+    configurar_peticiones_en_curso(max_concurrencia)
+    configurar_agrupador(crear_agrupador())
+    pool = crear_pool_extraccion(obtener_procesos_extraccion())
+    configurar_pool_extraccion(pool)
+    try:
+        if args.vigilar:
+            vigilar_carpeta(directorio_pdfs, max_concurrencia, args.intervalo)
+        elif args.trabajador:
+            procesar_como_trabajador(directorio_pdfs, max_concurrencia)
+        else:
+            procesar_carpeta(directorio_pdfs, max_concurrencia)
+    finally:
+        configurar_pool_extraccion(None)
+        if pool is not None:
+            pool.shutdown()
+        if _informe is not None:
+            imprimir_resumen_informe(_informe.cerrar())
+            print(f"📄 Informe detallado en: {_informe.ruta}")
+            configurar_informe(None)
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Necesario para el pool de procesos en el ejecutable de PyInstaller
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import os
+import json
+import hashlib
+import threading
+
+NOMBRE_MANIFIESTO = 'manifiesto.json'
+
+def calcular_hash_archivo(ruta: str) -> str:
+    """Calcula el SHA-256 del contenido de un archivo leyéndolo por bloques"""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+class Manifiesto:
+    """
+    Registro persistente, guardado en el directorio de salida, de los PDFs ya
+    procesados: tamaño, fecha de modificación, hash del contenido y TSV generado.
+    Cada archivo se confirma en disco en cuanto termina, de modo que una
+    ejecución interrumpida puede continuar sin repetir lo ya confirmado.
+    """
+
+    def __init__(self, directorio_salida: str):
+        self.directorio_salida = directorio_salida
+        self.ruta = os.path.join(directorio_salida, NOMBRE_MANIFIESTO)
+        self._lock = threading.Lock()
+        self.entradas = {}
+        if os.path.exists(self.ruta):
+            try:
+                with open(self.ruta, 'r', encoding='utf-8') as f:
+                    self.entradas = json.load(f).get('archivos', {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Manifiesto ilegible, se reprocesará todo: {e}")
+                self.entradas = {}
+
+    def sin_cambios(self, ruta_pdf: str) -> bool:
+        """
+        Indica si el PDF ya se procesó y no ha cambiado desde entonces.
+        Si tamaño y fecha coinciden se da por bueno sin leer el archivo; si solo
+        cambió la fecha se compara el hash del contenido.
+        """
+        nombre = os.path.basename(ruta_pdf)
+        entrada = self.entradas.get(nombre)
+        if not entrada:
+            return False
+        if not os.path.exists(os.path.join(self.directorio_salida, entrada['tsv'])):
+            return False
+        estado = os.stat(ruta_pdf)
+        if estado.st_size != entrada['tamano']:
+            return False
+        if estado.st_mtime == entrada['mtime']:
+            return True
+        if calcular_hash_archivo(ruta_pdf) != entrada['hash']:
+            return False
+        # Mismo contenido con otra fecha (p. ej. copiado de nuevo): actualizar la fecha
+        with self._lock:
+            entrada['mtime'] = estado.st_mtime
+            self._guardar()
+        return True
+
+    def registrar(self, ruta_pdf: str, ruta_tsv: str) -> None:
+        """Confirma en disco que ruta_pdf se procesó correctamente y generó ruta_tsv"""
+        estado = os.stat(ruta_pdf)
+        entrada = {
+            'tamano': estado.st_size,
+            'mtime': estado.st_mtime,
+            'hash': calcular_hash_archivo(ruta_pdf),
+            'tsv': os.path.basename(ruta_tsv),
+        }
+        with self._lock:
+            self.entradas[os.path.basename(ruta_pdf)] = entrada
+            self._guardar()
+
+    def conservar_solo(self, nombres_pdf: list) -> None:
+        """Elimina del manifiesto los PDFs que ya no están en la carpeta"""
+        nombres = set(nombres_pdf)
+        with self._lock:
+            sobrantes = [n for n in self.entradas if n not in nombres]
+            if sobrantes:
+                for nombre in sobrantes:
+                    del self.entradas[nombre]
+                self._guardar()
+
+    def _guardar(self) -> None:
+        # Escritura atómica: un corte a mitad nunca deja un manifiesto corrupto
+        # (el temporal es propio de cada proceso, por si hay varios trabajadores)
+        ruta_tmp = f"{self.ruta}.{os.getpid()}.tmp"
+        with open(ruta_tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'archivos': self.entradas}, f, ensure_ascii=False, indent=1)
+        os.replace(ruta_tmp, self.ruta)
@@ -0,0 +1,67 @@
+"""
+Reducción del texto extraído antes de enviarlo al modelo.
+
+Cada página de una remesa repite el membrete del banco, el bloque de
+encabezado y el pie, y get_text(sort=True) rellena con espacios para alinear
+las columnas. Todo ello son tokens de entrada que no aportan información.
+minimizar_paginas elimina las líneas que se repiten en la zona de encabezado
+o pie de varias páginas (conservando su primera aparición, que es la que
+contiene los datos del emisor), los números de página y el espaciado de
+alineación. Las líneas de detalle (IBAN válido junto a un importe) nunca se
+eliminan: dos cargos idénticos en páginas distintas son dos filas.
+"""
+
+import re
+from conteo_filas import ibans_de_linea
+
+# Líneas desde el principio y desde el final de cada página consideradas
+# zona de encabezado y de pie
+LINEAS_ZONA_CABECERA = 15
+LINEAS_ZONA_PIE = 5
+
+_PATRON_NUMERO_PAGINA = re.compile(r'^(p[aá]gina|p[aá]g\.?|page)\s*\d+(\s*(de|of|/)\s*\d+)?$', re.IGNORECASE)
+_PATRON_ESPACIOS = re.compile(r'[ \t]{3,}')
+
+def _lineas_zona(lineas: list) -> set:
+    """Líneas (no vacías) de la zona de encabezado y pie de una página"""
+    zona = lineas[:LINEAS_ZONA_CABECERA] + lineas[-LINEAS_ZONA_PIE:]
+    return {linea for linea in zona if linea}
+
+def _normalizar_linea(linea: str) -> str:
+    # Las columnas siguen separadas por dos espacios, pero sin el relleno
+    return _PATRON_ESPACIOS.sub('  ', linea.strip())
+
+def minimizar_paginas(paginas: list) -> list:
+    """
+    Retorna el texto de las páginas sin repeticiones de encabezado y pie,
+    sin números de página, sin líneas vacías y sin relleno de alineación.
+    Una línea se considera repetitiva si aparece en la zona de encabezado o
+    pie de al menos dos páginas y de la mitad de ellas, salvo que sea una
+    línea de detalle.
+    """
+    paginas_lineas = [[_normalizar_linea(linea) for linea in pagina.splitlines()] for pagina in paginas]
+
+    repetidas = set()
+    if len(paginas_lineas) >= 2:
+        apariciones = {}
+        for lineas in paginas_lineas:
+            for linea in _lineas_zona(lineas):
+                apariciones[linea] = apariciones.get(linea, 0) + 1
+        minimo = max(2, (len(paginas_lineas) + 1) // 2)
+        repetidas = {linea for linea, veces in apariciones.items() if veces >= minimo and not ibans_de_linea(linea)}
+
+    vistas = set()
+    resultado = []
+    for lineas in paginas_lineas:
+        zona = _lineas_zona(lineas)
+        conservadas = []
+        for linea in lineas:
+            if not linea or _PATRON_NUMERO_PAGINA.match(linea):
+                continue
+            if linea in repetidas and linea in zona:
+                if linea in vistas:
+                    continue
+                vistas.add(linea)
+            conservadas.append(linea)
+        resultado.append('\n'.join(conservadas))
+    return resultado
@@ -0,0 +1,185 @@
+"""
+Registro de parsers locales para remesas con un formato conocido.
+
+Antes de enviar un documento a Gemini, procesar_pdf pregunta a cada parser
+registrado si reconoce el texto extraído. El resultado del primero que lo
+reconozca solo se acepta si tiene una fila por cada línea de detalle que
+cuenta conteo_filas en el texto (mismos IBAN, mismas veces): entonces se
+devuelve el TSV con las mismas 11 columnas que produce el modelo, sin
+ninguna llamada a la API. Si no, o si ninguno lo reconoce, se usa Gemini
+como hasta ahora, para no perder en silencio las líneas que el parser no
+entiende.
+
+Para añadir un banco basta con crear una subclase de ParserRemesa (o de
+ParserRegex si el formato se describe bien con expresiones regulares) y
+decorarla con @registrar_parser.
+"""
+
+import re
+from collections import Counter
+from conteo_filas import ibans_por_pagina, normalizar_iban
+
+# Nombres de grupo válidos en una expresión regular para cada columna del TSV
+GRUPOS_DETALLE = {
+    'Referencia Única': 'ref',
+    'Nombre del Librado': 'nombre',
+    'IBAN': 'iban',
+    'Importe': 'importe',
+    'Vencimiento': 'vencimiento',
+    'Referencia Única del Documento': 'ref_doc',
+}
+
+COLUMNAS = [
+    'Referencia Única', 'Nombre del Librado', 'IBAN', 'Importe',
+    'Vencimiento', 'Emisor', 'Identificación del Emisor',
+    'Referencia del Fichero', 'Fecha de Recepción', 'Fecha del Documento',
+    'Referencia Única del Documento'
+]
+
+_PARSERS = []
+
+def registrar_parser(clase):
+    """Decorador que registra una instancia del parser en el orden de declaración"""
+    _PARSERS.append(clase())
+    return clase
+
+def parsers_registrados() -> list:
+    return list(_PARSERS)
+
+def normalizar_importe(importe: str) -> str:
+    """
+    Convierte un importe con formato español o inglés ('1.234,56', '1,234.56',
+    '1234,56', '-12.5 €') al formato del TSV: punto decimal y sin miles.
+    """
+    valor = re.sub(r'[^\d,.\-]', '', importe)
+    if ',' in valor and '.' in valor:
+        # El separador que aparece más a la derecha es el decimal
+        if valor.rfind(',') > valor.rfind('.'):
+            valor = valor.replace('.', '').replace(',', '.')
+        else:
+            valor = valor.replace(',', '')
+    elif ',' in valor:
+        valor = valor.replace(',', '.')
+    return valor or 'null'
+
+def _limpiar_campo(valor) -> str:
+    if valor is None:
+        return 'null'
+    # Un tabulador o salto de línea dentro de un campo rompería el TSV
+    valor = re.sub(r'\s+', ' ', str(valor)).strip()
+    return valor or 'null'
+
+class ParserRemesa:
+    """Interfaz de un parser local. Las subclases implementan reconoce y extraer_filas"""
+
+    nombre = 'base'
+
+    def reconoce(self, texto: str) -> bool:
+        raise NotImplementedError
+
+    def extraer_filas(self, texto: str) -> list:
+        """Devuelve una lista de diccionarios cuyas claves son nombres de COLUMNAS"""
+        raise NotImplementedError
+
+class ParserRegex(ParserRemesa):
+    """
+    Parser declarativo: patron_reconocimiento identifica el formato,
+    patrones_cabecera extraen los campos de encabezado (grupo 1 de cada
+    expresión) y patron_detalle extrae cada línea con los grupos con nombre
+    de GRUPOS_DETALLE.
+    """
+
+    patron_reconocimiento = None
+    patrones_cabecera = {}
+    patron_detalle = None
+
+    def reconoce(self, texto: str) -> bool:
+        return bool(self.patron_reconocimiento and re.search(self.patron_reconocimiento, texto, re.MULTILINE))
+
+    def extraer_cabecera(self, texto: str) -> dict:
+        cabecera = {}
+        for columna, patron in self.patrones_cabecera.items():
+            coincidencia = re.search(patron, texto)
+            cabecera[columna] = coincidencia.group(1) if coincidencia else None
+        return cabecera
+
+    def extraer_filas(self, texto: str) -> list:
+        cabecera = self.extraer_cabecera(texto)
+        filas = []
+        for coincidencia in re.finditer(self.patron_detalle, texto):
+            fila = dict(cabecera)
+            grupos = coincidencia.groupdict()
+            for columna, grupo in GRUPOS_DETALLE.items():
+                if grupo in grupos:
+                    fila[columna] = grupos[grupo]
+            if fila.get('Importe'):
+                fila['Importe'] = normalizar_importe(fila['Importe'])
+            if fila.get('IBAN'):
+                fila['IBAN'] = fila['IBAN'].replace(' ', '')
+            filas.append(fila)
+        return filas
+
+_FECHA = r'(\d{2}/\d{2}/\d{4})'
+_IBAN = r'[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){4,7}(?: ?[A-Z0-9]{1,3})?'
+
+@registrar_parser
+class ParserRemesaEtiquetada(ParserRegex):
+    """
+    Remesas de adeudos SEPA con el encabezado etiquetado completo: las cinco
+    etiquetas 'Emisor:', 'Identificación del Emisor:', 'Referencia del
+    Fichero:', 'Fecha de Recepción:' y 'Fecha del Documento:', las tres
+    primeras al principio de su línea. Sus líneas de detalle siguen el orden
+    referencia, librado, IBAN, importe, vencimiento y referencia del
+    documento. Tener solo alguna de las etiquetas no basta para reconocerla.
+    """
+
+    nombre = 'remesa_etiquetada'
+    patron_reconocimiento = (r'(?s)\A(?=.*^\s*Emisor\s*:)(?=.*^\s*Identificaci[oó]n del Emisor\s*:)'
+                             r'(?=.*^\s*Referencia del Fichero\s*:)(?=.*Fecha de Recepci[oó]n\s*:\s*\d{2}/\d{2}/\d{4})'
+                             r'(?=.*Fecha del Documento\s*:\s*\d{2}/\d{2}/\d{4})')
+    patrones_cabecera = {
+        'Emisor': r'(?m)^\s*Emisor\s*:\s*(.+?)(?=\s{2,}|\s*$)',
+        'Identificación del Emisor': r'(?m)Identificaci[oó]n del Emisor\s*:\s*(\S+)',
+        'Referencia del Fichero': r'(?m)Referencia del Fichero\s*:\s*(\S+)',
+        'Fecha de Recepción': r'Fecha de Recepci[oó]n\s*:\s*' + _FECHA,
+        'Fecha del Documento': r'Fecha del Documento\s*:\s*' + _FECHA,
+    }
+    patron_detalle = (
+        r'(?m)^\s*(?P<ref>\S+)\s+(?P<nombre>\S.*?)\s+(?P<iban>' + _IBAN + r')\s+'
+        r'(?P<importe>-?[\d.,]+)\s*(?:€|EUR)?\s+(?P<vencimiento>\d{2}/\d{2}/\d{4})\s+(?P<ref_doc>\S+)\s*$'
+    )
+
+def filas_a_tsv(filas: list) -> str:
+    """Serializa las filas con el mismo formato TSV sin cabecera que devuelve el modelo"""
+    return '\n'.join('\t'.join(_limpiar_campo(fila.get(columna)) for columna in COLUMNAS) for fila in filas)
+
+def filas_completas(filas: list, texto: str) -> bool:
+    """
+    Comprueba que las filas son todas las líneas de detalle del texto: los
+    mismos IBAN, cada uno tantas veces como líneas con IBAN e importe cuenta
+    conteo_filas. Sin líneas contables no se puede comprobar y no se acepta.
+    """
+    esperadas = sum(ibans_por_pagina([texto]), Counter())
+    return bool(esperadas) and esperadas == Counter(normalizar_iban(fila.get('IBAN') or '') for fila in filas)
+
+def extraer_con_parsers_locales(texto: str):
+    """
+    Prueba los parsers registrados en orden. Retorna (nombre_parser, tsv) con el
+    primero que reconozca el documento y obtenga todas sus líneas de detalle,
+    o None si ninguno lo hace.
+    """
+    for parser in _PARSERS:
+        try:
+            if not parser.reconoce(texto):
+                continue
+            filas = parser.extraer_filas(texto)
+        except Exception as e:
+            print(f"⚠️ El parser local '{parser.nombre}' falló: {e}")
+            continue
+        if filas and filas_completas(filas, texto):
+            return parser.nombre, filas_a_tsv(filas)
+        if filas:
+            lineas = sum(sum(ibans_por_pagina([texto]), Counter()).values())
+            print(f"⚠️ El parser local '{parser.nombre}' obtuvo {len(filas)} fila(s) de {lineas} línea(s) de "
+                  f"detalle; se usa el modelo.")
+    return None
@@ -0,0 +1,96 @@
+import re
+import json
+from plugins_bancos import normalizar_importe
+
+# Claves de cada fila en la respuesta JSON, en el orden de las columnas del TSV
+CAMPOS = [
+    'referencia_unica', 'nombre_librado', 'iban', 'importe', 'vencimiento',
+    'emisor', 'identificacion_emisor', 'referencia_fichero', 'fecha_recepcion',
+    'fecha_documento', 'referencia_unica_documento'
+]
+CAMPOS_FECHA = ['vencimiento', 'fecha_recepcion', 'fecha_documento']
+
+_PATRON_IMPORTE = re.compile(r'-?\d+(\.\d+)?')
+_PATRON_FECHA = re.compile(r'\d{2}/\d{2}/\d{4}')
+
+def esquema_respuesta() -> dict:
+    """Esquema de respuesta para el modelo: una lista de filas con los 11 campos como texto"""
+    return {
+        'type': 'array',
+        'items': {
+            'type': 'object',
+            'properties': {campo: {'type': 'string'} for campo in CAMPOS},
+            'required': list(CAMPOS),
+        },
+    }
+
+def extraer_objetos(texto: str):
+    """
+    Lee la lista de filas de una respuesta JSON. Si la respuesta está cortada
+    (por ejemplo, por el límite de tokens de salida) se recuperan los objetos
+    completos anteriores al corte. Retorna (objetos, completa).
+    """
+    try:
+        datos = json.loads(texto)
+    except ValueError:
+        datos = None
+    if isinstance(datos, list):
+        return datos, True
+    if isinstance(datos, dict):
+        return [datos], True
+
+    objetos = []
+    inicio = texto.find('[')
+    if inicio < 0:
+        return objetos, False
+    decodificador = json.JSONDecoder()
+    posicion = inicio + 1
+    while True:
+        while posicion < len(texto) and texto[posicion] in ' \t\r\n,':
+            posicion += 1
+        if posicion >= len(texto) or texto[posicion] == ']':
+            break
+        try:
+            objeto, posicion = decodificador.raw_decode(texto, posicion)
+        except ValueError:
+            break
+        objetos.append(objeto)
+    return objetos, False
+
+def validar_fila(objeto):
+    """
+    Comprueba una fila de la respuesta. Retorna (campos, errores): los 11
+    valores como texto listos para el TSV, y la lista de problemas
+    encontrados (vacía si la fila es válida).
+    """
+    if not isinstance(objeto, dict):
+        return None, ['no es un objeto']
+    errores = []
+    campos = []
+    for campo in CAMPOS:
+        valor = objeto.get(campo)
+        if valor is None:
+            if campo not in objeto:
+                errores.append(f"falta '{campo}'")
+            valor = 'null'
+        elif not isinstance(valor, (str, int, float)):
+            errores.append(f"'{campo}' no es texto")
+            valor = 'null'
+        # Un tabulador o salto de línea dentro de un campo rompería el TSV
+        valor = re.sub(r'\s+', ' ', str(valor)).strip() or 'null'
+        campos.append(valor)
+    valores = dict(zip(CAMPOS, campos))
+    if valores['importe'] != 'null' and not _PATRON_IMPORTE.fullmatch(valores['importe']):
+        # Un importe con coma decimal o con la moneda ('100,50 EUR') se corrige sin preguntar al modelo
+        normalizado = normalizar_importe(valores['importe'])
+        if _PATRON_IMPORTE.fullmatch(normalizado):
+            campos[CAMPOS.index('importe')] = normalizado
+        else:
+            errores.append(f"importe '{valores['importe']}' no es un número con punto decimal")
+    for campo in CAMPOS_FECHA:
+        if valores[campo] != 'null' and not _PATRON_FECHA.fullmatch(valores[campo]):
+            errores.append(f"{campo} '{valores[campo]}' no tiene formato DD/MM/YYYY")
+    return campos, errores
+
+def fila_a_tsv(campos: list) -> str:
+    return '\t'.join(campos)
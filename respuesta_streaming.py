@@ -0,0 +1,136 @@
+import io
+import os
+import csv
+import threading
+from collections import Counter
+
+# Valores que pandas.read_csv interpreta como vacíos por defecto: el TSV
+# escrito en streaming debe quedar igual que el que genera pandas
+VALORES_NULOS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+def lineas_completas(trozos):
+    """
+    Agrupa los trozos de texto de una respuesta en streaming en líneas
+    completas. Por cada trozo recibido produce la lista (quizá vacía) de
+    líneas que ha completado, sin las líneas vacías ni las marcas de bloque
+    de código de Markdown (```).
+    """
+    pendiente = ''
+    for trozo in trozos:
+        pendiente += trozo
+        *lineas, pendiente = pendiente.split('\n')
+        yield [linea.rstrip('\r') for linea in lineas if linea.strip() and not linea.lstrip().startswith('```')]
+    if pendiente.strip() and not pendiente.lstrip().startswith('```'):
+        yield [pendiente.rstrip('\r')]
+
+class FilasTSV:
+    """
+    Convierte las líneas de la respuesta del modelo en filas con las columnas
+    del TSV a medida que llegan. Si la primera línea es la de encabezado del
+    formato compacto (marca + campos de encabezado), sus valores se repiten en
+    cada fila de detalle. Las líneas que no tienen exactamente las columnas
+    esperadas (o las de detalle sin la línea de encabezado) se descartan y se
+    cuentan: completarlas desplazaría los valores a otras columnas. Guarda solo
+    lo necesario para la comprobación posterior: los IBAN devueltos y los
+    valores de encabezado vistos.
+    """
+
+    def __init__(self, columnas: list, columnas_cabecera: list, marca_cabecera: str, columna_iban: str = 'IBAN'):
+        self.columnas = columnas
+        self.columnas_cabecera = columnas_cabecera
+        self.columnas_detalle = [c for c in columnas if c not in columnas_cabecera]
+        self.marca_cabecera = marca_cabecera
+        self.indice_iban = columnas.index(columna_iban)
+        self.ibans = []
+        self.descartadas = 0
+        self._cabecera = None
+        self._primera = True
+        self._valores_cabecera = {columna: Counter() for columna in columnas_cabecera}
+
+    def fila(self, linea: str):
+        """Fila (lista de valores) de la línea, o None si no es una fila de datos"""
+        campos = next(csv.reader([linea], delimiter='\t'), [])
+        primera, self._primera = self._primera, False
+        if primera and campos and campos[0] == self.marca_cabecera:
+            valores = (campos[1:] + ['null'] * len(self.columnas_cabecera))[:len(self.columnas_cabecera)]
+            self._cabecera = dict(zip(self.columnas_cabecera, valores))
+            return None
+        if self._cabecera is not None and len(campos) == len(self.columnas_detalle):
+            valores = dict(self._cabecera)
+            valores.update(zip(self.columnas_detalle, campos))
+            campos = [valores[columna] for columna in self.columnas]
+        if len(campos) != len(self.columnas):
+            self.descartadas += 1
+            return None
+        campos = [('' if valor in VALORES_NULOS else valor) for valor in campos]
+        self.ibans.append(campos[self.indice_iban])
+        for columna in self.columnas_cabecera:
+            valor = campos[self.columnas.index(columna)]
+            if valor:
+                self._valores_cabecera[columna][valor] += 1
+        return campos
+
+    def nueva_respuesta(self) -> None:
+        """
+        Las líneas siguientes son de otra respuesta del mismo documento (la de
+        la ventana de páginas siguiente), que puede traer su propia línea de
+        encabezado; los IBAN y los valores de encabezado vistos se conservan.
+        """
+        self._cabecera = None
+        self._primera = True
+
+    def completar_cabecera(self, campos: list) -> list:
+        """Rellena los campos de encabezado vacíos con el valor más frecuente de las filas ya vistas"""
+        for columna, conteo in self._valores_cabecera.items():
+            indice = self.columnas.index(columna)
+            if not campos[indice] and conteo:
+                campos[indice] = conteo.most_common(1)[0][0]
+        return campos
+
+class EscritorTSVIncremental:
+    """
+    Escribe el TSV de un documento a medida que llegan sus filas, en
+    '<ruta>.<pid>.<hilo>.parcial' (propio de este proceso, aunque otro
+    trabajador escriba el mismo documento a la vez), con el mismo formato que DataFrame.to_csv. Cada bloque
+    se vuelca a disco al escribirse; si se indica, al_escribir(lineas) recibe
+    el texto de las filas de cada bloque (para el archivo combinado).
+    confirmar() renombra el parcial a la ruta final; descartar() lo elimina.
+    """
+
+    def __init__(self, ruta: str, columnas: list, al_escribir=None):
+        self.ruta = ruta
+        self.ruta_parcial = f"{ruta}.{os.getpid()}.{threading.get_ident()}.parcial"
+        self.filas = 0
+        self._al_escribir = al_escribir
+        self._archivo = open(self.ruta_parcial, 'w', encoding='utf-8', newline='')
+        self._archivo.write(self._formatear([columnas]))
+        self._archivo.flush()
+
+    @staticmethod
+    def _formatear(filas: list) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer, delimiter='\t', lineterminator=os.linesep).writerows(filas)
+        return buffer.getvalue()
+
+    def escribir(self, filas: list) -> None:
+        if not filas:
+            return
+        texto = self._formatear(filas)
+        self._archivo.write(texto)
+        self._archivo.flush()
+        self.filas += len(filas)
+        if self._al_escribir is not None:
+            self._al_escribir(texto)
+
+    def confirmar(self) -> str:
+        self._archivo.close()
+        os.replace(self.ruta_parcial, self.ruta)
+        return self.ruta
+
+    def descartar(self) -> None:
+        self._archivo.close()
+        if os.path.exists(self.ruta_parcial):
+            os.remove(self.ruta_parcial)
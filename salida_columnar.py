@@ -0,0 +1,145 @@
+import os
+import time
+import shutil
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from plugins_bancos import normalizar_importe
+
+# Tipos de las columnas en la salida columnar; el resto de columnas son texto
+# (las referencias e IBAN conservan los ceros a la izquierda)
+COLUMNAS_IMPORTE = ['Importe']
+COLUMNAS_FECHA = ['Vencimiento', 'Fecha de Recepción', 'Fecha del Documento']
+COLUMNAS_PARTICION = ['Emisor', 'Fecha del Documento']
+PRECISION_IMPORTE = 18
+ESCALA_IMPORTE = 2
+
+# Formato de SALIDA_COLUMNAR -> formato de pyarrow.dataset
+FORMATOS = {'parquet': 'parquet', 'arrow': 'ipc'}
+
+def formato_columnar_activo():
+    """
+    SALIDA_COLUMNAR en el .env: 'parquet' o 'arrow' para generar, además del
+    TSV combinado, una copia tipada y particionada. Vacío (por defecto) la desactiva.
+    """
+    formato = os.getenv("SALIDA_COLUMNAR", "").strip().lower()
+    if not formato or formato in ("0", "no", "false"):
+        return None
+    if formato not in FORMATOS:
+        print(f"⚠️ SALIDA_COLUMNAR no válido ('{formato}'); opciones: {', '.join(FORMATOS)}.")
+        return None
+    return formato
+
+def _a_decimal(valor):
+    if valor is None or valor in ('', 'null'):
+        return None
+    try:
+        numero = Decimal(normalizar_importe(valor))
+    except InvalidOperation:
+        return None
+    redondeado = numero.quantize(Decimal(1).scaleb(-ESCALA_IMPORTE))
+    # Un importe con más decimales de los que admite la columna no se redondea en silencio
+    return redondeado if redondeado == numero else None
+
+def _a_fecha(valor):
+    if valor is None or valor in ('', 'null'):
+        return None
+    try:
+        return datetime.strptime(valor.strip(), '%d/%m/%Y').date()
+    except ValueError:
+        return None
+
+def tabla_tipada(df):
+    """
+    Convierte un DataFrame leído como texto (dtype=str) en una tabla de Arrow:
+    importes decimales, fechas DD/MM/YYYY como fechas y el resto como texto.
+    Retorna (tabla, valores_no_convertidos); un valor que no se puede
+    convertir queda como nulo.
+    """
+    import pyarrow as pa
+
+    columnas = {}
+    no_convertidos = 0
+    for nombre in df.columns:
+        valores = [None if isinstance(v, float) else v for v in df[nombre].tolist()]  # NaN -> None
+        if nombre in COLUMNAS_IMPORTE:
+            convertidos = [_a_decimal(v) for v in valores]
+            tipo = pa.decimal128(PRECISION_IMPORTE, ESCALA_IMPORTE)
+        elif nombre in COLUMNAS_FECHA:
+            convertidos = [_a_fecha(v) for v in valores]
+            tipo = pa.date32()
+        else:
+            convertidos = valores
+            tipo = pa.string()
+        no_convertidos += sum(1 for v, c in zip(valores, convertidos)
+                              if c is None and v not in (None, '', 'null'))
+        columnas[nombre] = pa.array(convertidos, type=tipo)
+    return pa.table(columnas), no_convertidos
+
+def escribir_salida_columnar(ruta_tsv: str, directorio_salida: str, formato: str, desde: int = None) -> str:
+    """
+    Genera a partir del TSV combinado un dataset tipado en formato Parquet o
+    Arrow IPC, particionado (estilo Hive) por Emisor y Fecha del Documento.
+    El dataset se reconstruye completo en una carpeta temporal y después
+    sustituye al anterior. Con `desde` (posición del final del TSV antes de
+    anexarle filas) y un dataset ya generado, solo se añaden las filas nuevas,
+    en archivos nuevos de sus particiones. Retorna la carpeta del dataset, o
+    None si no se pudo generar (por ejemplo, si pyarrow no está instalado).
+    """
+    try:
+        import pandas as pd
+        import pyarrow.dataset as ds
+    except ImportError:
+        print("⚠️ La salida columnar requiere pyarrow (pip install pyarrow); se omite.")
+        return None
+
+    nombre_base = os.path.splitext(os.path.basename(ruta_tsv))[0]
+    destino = os.path.join(directorio_salida, f"{nombre_base}_{formato}")
+    if desde is not None and os.path.isdir(destino):
+        return _anexar_salida_columnar(ruta_tsv, destino, formato, desde)
+    destino_tmp = f"{destino}.{os.getpid()}.tmp"
+    try:
+        # Todo como texto: pd.read_csv inferiría los tipos y perdería los ceros a la izquierda
+        df = pd.read_csv(ruta_tsv, sep='\t', dtype=str)
+        tabla, no_convertidos = tabla_tipada(df)
+        shutil.rmtree(destino_tmp, ignore_errors=True)
+        ds.write_dataset(tabla, destino_tmp, format=FORMATOS[formato],
+                         partitioning=COLUMNAS_PARTICION, partitioning_flavor='hive')
+        shutil.rmtree(destino, ignore_errors=True)
+        os.replace(destino_tmp, destino)
+    except Exception as e:
+        print(f"❌ Error al generar la salida {formato}: {e}")
+        shutil.rmtree(destino_tmp, ignore_errors=True)
+        return None
+
+    print(f"✅ Salida {formato} creada en: {destino} ({tabla.num_rows} registros)")
+    if no_convertidos:
+        print(f"⚠️ {no_convertidos} valor(es) de importe o fecha no válidos quedaron como nulos.")
+    return destino
+
+def _anexar_salida_columnar(ruta_tsv: str, destino: str, formato: str, desde: int) -> str:
+    """Añade al dataset existente las filas del TSV a partir del byte `desde`"""
+    import pandas as pd
+    import pyarrow.dataset as ds
+
+    try:
+        with open(ruta_tsv, 'r', encoding='utf-8', newline='') as f:
+            columnas = f.readline().rstrip('\r\n').split('\t')
+            f.seek(desde)
+            df = pd.read_csv(f, sep='\t', dtype=str, header=None, names=columnas)
+        if df.empty:
+            return destino
+        tabla, no_convertidos = tabla_tipada(df)
+        # Nombres únicos por tanda para no sobrescribir los archivos que ya tienen las particiones
+        extension = 'arrow' if formato == 'arrow' else 'parquet'
+        ds.write_dataset(tabla, destino, format=FORMATOS[formato],
+                         partitioning=COLUMNAS_PARTICION, partitioning_flavor='hive',
+                         basename_template=f"anexo-{time.time_ns()}-{os.getpid()}-{{i}}.{extension}",
+                         existing_data_behavior='overwrite_or_ignore')
+    except Exception as e:
+        print(f"❌ Error al añadir a la salida {formato}: {e}")
+        return None
+
+    print(f"✅ Salida {formato} actualizada en: {destino} (+{tabla.num_rows} registros)")
+    if no_convertidos:
+        print(f"⚠️ {no_convertidos} valor(es) de importe o fecha no válidos quedaron como nulos.")
+    return destino
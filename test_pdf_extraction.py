@@ -1,9 +1,13 @@
 import os
-import fitz  # PyMuPDF
+from extraccion_pdf import extraer_paginas, crear_pool_extraccion, procesos_extraccion_por_defecto
+from almacen_texto import AlmacenTexto
 
-def probar_extraccion_pdf(ruta_pdf: str) -> str:
+def probar_extraccion_pdf(ruta_pdf: str, pool=None, almacen=None) -> str:
     """
     Prueba la extracción de texto de un PDF y muestra información detallada.
+    Usa la misma etapa de extracción que main.py; con un pool de procesos,
+    las páginas de los documentos grandes se extraen en paralelo, y con un
+    almacén de textos no se vuelve a analizar un PDF ya extraído.
     """
     print(f"\n=== Prueba de Extracción de PDF ===")
     print(f"Archivo: {os.path.basename(ruta_pdf)}")
@@ -16,16 +20,16 @@ def probar_extraccion_pdf(ruta_pdf: str) -> str:
             print(f"❌ Error: El archivo no existe en {ruta_pdf}")
             return None
             
-        # Intentar abrir el PDF
-        documento = fitz.open(ruta_pdf)
+        # Extraer el texto de todas las páginas
+        paginas, segundos = extraer_paginas(ruta_pdf, pool, ordenar=False, almacen=almacen)
         print(f"\n📄 Información del PDF:")
-        print(f"Número de páginas: {len(documento)}")
+        print(f"Número de páginas: {len(paginas)}")
         print(f"Tamaño del archivo: {os.path.getsize(ruta_pdf) / 1024:.2f} KB")
+        print(f"Tiempo de extracción: {segundos:.3f}s")
         
-        texto_completo = ""
-        for num_pagina, pagina in enumerate(documento, 1):
+        textos_con_contenido = []
+        for num_pagina, texto_pagina in enumerate(paginas, 1):
             print(f"\nProcesando página {num_pagina}:")
-            texto_pagina = pagina.get_text()
             
             # Información sobre la página
             palabras = len(texto_pagina.split())
@@ -36,11 +40,11 @@ def probar_extraccion_pdf(ruta_pdf: str) -> str:
                 # Mostrar una vista previa del texto
                 preview = texto_pagina.strip()[:150]
                 print(f"Vista previa: {preview}...")
-                texto_completo += texto_pagina
+                textos_con_contenido.append(texto_pagina)
             else:
                 print(f"⚠️  No se encontró texto en esta página")
         
-        documento.close()
+        texto_completo = "".join(textos_con_contenido)
         
         # Resumen final
         total_palabras = len(texto_completo.split())
@@ -96,16 +100,22 @@ def main_prueba():
     print(f"📁 Se encontraron {len(archivos_pdf)} archivos PDF")
     
     # Procesar cada PDF
-    for archivo in archivos_pdf:
-        ruta_completa = os.path.join(directorio_pdfs, archivo)
-        texto = probar_extraccion_pdf(ruta_completa)
-        
-        if texto:
-            print(f"\n✅ Extracción exitosa para {archivo}")
-        else:
-            print(f"\n❌ Falló la extracción para {archivo}")
+    pool = crear_pool_extraccion(procesos_extraccion_por_defecto())
+    almacen = AlmacenTexto()
+    try:
+        for archivo in archivos_pdf:
+            ruta_completa = os.path.join(directorio_pdfs, archivo)
+            texto = probar_extraccion_pdf(ruta_completa, pool, almacen)
             
-        input("\nPresiona Enter para continuar con el siguiente archivo...")
+            if texto:
+                print(f"\n✅ Extracción exitosa para {archivo}")
+            else:
+                print(f"\n❌ Falló la extracción para {archivo}")
+                
+            input("\nPresiona Enter para continuar con el siguiente archivo...")
+    finally:
+        if pool is not None:
+            pool.shutdown()
 
 if __name__ == "__main__":
     main_prueba()
\ No newline at end of file
@@ -1,11 +1,12 @@
 import os
 import json
-import fitz
 import pandas as pd
 import google.generativeai as genai
 from dotenv import load_dotenv
 import tkinter as tk
 from tkinter import filedialog
+from extraccion_pdf import extraer_paginas
+from almacen_texto import AlmacenTexto
 
 def test_procesamiento_completo(ruta_pdf: str) -> None:
     """
@@ -19,11 +20,9 @@ def test_procesamiento_completo(ruta_pdf: str) -> None:
     # 1. Extracción de texto
     print("\n1️⃣ Extrayendo texto del PDF...")
     try:
-        documento = fitz.open(ruta_pdf)
-        texto = ""
-        for pagina in documento:
-            texto += pagina.get_text()
-        documento.close()
+        # Se lee a través del almacén de textos compartido con main.py
+        paginas, _ = extraer_paginas(ruta_pdf, ordenar=False, almacen=AlmacenTexto())
+        texto = "".join(paginas)
         
         if not texto.strip():
             print("❌ Error: No se pudo extraer texto del PDF")
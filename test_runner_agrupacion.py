@@ -0,0 +1,76 @@
+import os
+import re
+import tempfile
+import threading
+from types import SimpleNamespace
+import pandas as pd
+
+# Import functions from main.py
+import main
+from test_runner_concurrencia import crear_pdfs_sinteticos
+
+DOCUMENTO_MAL_FORMADO = '3'  # su parte de la respuesta agrupada tendrá columnas de menos
+
+def fila(numero):
+    return f"REF{numero}\tLibrado {numero}\tES00\t{numero}.50\t01/01/2025\tEmisorX\tID123\tFileRef\t10/10/2025\t09/10/2025\tDoc{numero}"
+
+def run_batching_test():
+    peticiones = []
+    lock = threading.Lock()
+
+    def llamar_modelo_stub(prompt):
+        # Responde como el modelo: una sección por documento en las peticiones agrupadas
+        documentos = re.findall(r'=== DOCUMENTO (\d+) ===\n.*?Remesa de prueba (\d+)', prompt, re.DOTALL)
+        with lock:
+            peticiones.append(len(documentos) or 1)
+        if not documentos:
+            return SimpleNamespace(text=fila(re.search(r'Remesa de prueba (\d+)', prompt).group(1)))
+        secciones = []
+        for indice, numero in documentos:
+            linea = fila(numero)
+            if numero == DOCUMENTO_MAL_FORMADO:
+                linea = linea.rsplit('\t', 2)[0]
+            secciones.append(f"### DOCUMENTO {indice}\n{linea}")
+        return SimpleNamespace(text="```tsv\n" + "\n".join(secciones) + "\n```")
+
+    main.llamar_modelo = llamar_modelo_stub
+    os.environ['MAX_DOCUMENTOS_POR_PETICION'] = '4'
+    main.configurar_agrupador(main.crear_agrupador())
+
+    with tempfile.TemporaryDirectory() as pdf_dir:
+        crear_pdfs_sinteticos(pdf_dir, 10)
+        procesados = main.procesar_carpeta(pdf_dir, 2)
+        df = pd.read_csv(os.path.join(pdf_dir, 'output', main.NOMBRE_COMBINADO), sep='\t')
+
+    # Con el formato compacto o json los documentos no se agrupan: el prompt de los lotes es el del TSV completo
+    agrupables = {}
+    for formato in ('compacto', 'json'):
+        os.environ['FORMATO_RESPUESTA'] = formato
+        agrupables[formato] = main.documento_agrupable('Remesa de prueba 1')
+    os.environ.pop('FORMATO_RESPUESTA', None)
+
+    print(f'\nPeticiones: {len(peticiones)} (documentos por petición: {peticiones})')
+    if len(procesados) != 10 or len(df) != 10:
+        print(f'❌ Se esperaban 10 archivos y 10 filas: {len(procesados)} archivos, {len(df)} filas')
+        return 1
+    # Cada fila debe haber acabado en el archivo del que procede
+    esperado = df['Archivo_Origen'].str.extract(r'remesa_(\d+)')[0].astype(int) + 0.5
+    if not (df['Importe'] == esperado).all():
+        print('❌ Alguna fila quedó asignada a otro archivo')
+        print(df[['Importe', 'Archivo_Origen']])
+        return 1
+    if len(peticiones) >= 10 or max(peticiones) < 2:
+        print('❌ Los documentos no se agruparon')
+        return 1
+    if main._agrupador.reenvios_individuales != 1:
+        print(f'❌ Se esperaba 1 reenvío individual, hubo {main._agrupador.reenvios_individuales}')
+        return 1
+    if any(agrupables.values()) or not main.documento_agrupable('Remesa de prueba 1'):
+        print(f'❌ Solo debían agruparse los documentos con el formato completo: {agrupables}')
+        return 1
+
+    print('✅ Prueba de la agrupación de documentos correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_batching_test())
@@ -0,0 +1,100 @@
+import os
+import glob
+import gzip
+import json
+import time
+import shutil
+import tempfile
+import fitz
+
+import extraccion_pdf
+from almacen_texto import AlmacenTexto
+
+def crear_pdf(ruta: str, texto: str) -> None:
+    documento = fitz.open()
+    for pagina in texto.split('|'):
+        documento.new_page().insert_text((72, 72), pagina)
+    documento.save(ruta)
+    documento.close()
+
+def run_text_store_test():
+    analizados = []
+    original = extraccion_pdf._extraer_rango
+
+    def extraer_rango_contado(ruta_pdf, inicio, fin, ordenar):
+        analizados.append(os.path.basename(ruta_pdf))
+        return original(ruta_pdf, inicio, fin, ordenar)
+
+    extraccion_pdf._extraer_rango = extraer_rango_contado
+    try:
+        with tempfile.TemporaryDirectory() as directorio, tempfile.TemporaryDirectory() as dir_almacen:
+            almacen = AlmacenTexto(dir_almacen)
+            ruta = os.path.join(directorio, 'remesa.pdf')
+            crear_pdf(ruta, 'Remesa 1|Página 2')
+
+            # 1. Lectura a través del almacén: la segunda vez, y con el PDF copiado con otro nombre, no se analiza
+            primera, _ = extraccion_pdf.extraer_paginas(ruta, almacen=almacen)
+            segunda, _ = extraccion_pdf.extraer_paginas(ruta, almacen=almacen)
+            copia = os.path.join(directorio, 'copia.pdf')
+            shutil.copy(ruta, copia)
+            de_la_copia, _ = extraccion_pdf.extraer_paginas(copia, almacen=almacen)
+            lectura = (list(analizados), almacen.resumen())
+
+            # 2. Si cambia el contenido del PDF (su hash), se vuelve a extraer
+            crear_pdf(ruta, 'Remesa 1 corregida|Página 2')
+            cambiada, _ = extraccion_pdf.extraer_paginas(ruta, almacen=almacen)
+            tras_cambio = list(analizados)
+
+            # 3. Una entrada dañada se descarta y se sustituye por la nueva extracción
+            entrada = glob.glob(os.path.join(dir_almacen, f"{almacen.hash_pdf(copia)}-*.json.gz"))[0]
+            with open(entrada, 'rb') as f:
+                comprimida = f.read()
+            danadas = []
+            for contenido in (comprimida[:len(comprimida) // 2], b'no es gzip',
+                              gzip.compress(json.dumps({'paginas': 'texto'}).encode('utf-8'))):
+                with open(entrada, 'wb') as f:
+                    f.write(contenido)
+                antes = len(analizados)
+                paginas, _ = extraccion_pdf.extraer_paginas(copia, almacen=almacen)
+                danadas.append((paginas == primera, len(analizados) - antes))
+            reparada = almacen.obtener(almacen.hash_pdf(copia), True) == primera
+
+            # 4. Purga: primero las entradas antiguas y después, por tamaño, las menos usadas
+            entradas = sorted(glob.glob(os.path.join(dir_almacen, '*.json.gz')))
+            tamano = max(os.path.getsize(e) for e in entradas)
+            antigua, usada = entradas
+            os.utime(antigua, (time.time() - 3600, time.time() - 3600))
+            por_edad = AlmacenTexto(dir_almacen, max_edad_segundos=1800).purgar()
+            restantes_edad = len(glob.glob(os.path.join(dir_almacen, '*.json.gz')))
+            crear_pdf(os.path.join(directorio, 'otra.pdf'), 'Otra remesa')
+            extraccion_pdf.extraer_paginas(os.path.join(directorio, 'otra.pdf'), almacen=almacen)
+            os.utime(usada, (time.time() - 60, time.time() - 60))
+            por_tamano = AlmacenTexto(dir_almacen, max_bytes=tamano + 10).purgar()
+            restantes_tamano = [os.path.basename(e) for e in glob.glob(os.path.join(dir_almacen, '*'))]
+            hash_otra = almacen.hash_pdf(os.path.join(directorio, 'otra.pdf'))
+    finally:
+        extraccion_pdf._extraer_rango = original
+
+    print(f"\nAnálisis de PDFs: {lectura[0]} ({lectura[1]}) - Tras cambiar el PDF: {tras_cambio} - "
+          f"Entradas dañadas (texto correcto, análisis): {danadas} - Purgadas: {por_edad} por edad, {por_tamano} por tamaño")
+    if lectura[0] != ['remesa.pdf'] or segunda != primera or de_la_copia != primera or primera != ['Remesa 1', 'Página 2']:
+        print('❌ El texto ya extraído debía leerse del almacén, también con el PDF copiado con otro nombre')
+        return 1
+    if tras_cambio != ['remesa.pdf', 'remesa.pdf'] or cambiada[0] != 'Remesa 1 corregida':
+        print('❌ Al cambiar el contenido del PDF debía volver a extraerse')
+        return 1
+    if danadas != [(True, 1)] * 3 or not reparada:
+        print('❌ Las entradas dañadas debían descartarse y sustituirse por una nueva extracción')
+        return 1
+    if por_edad != 1 or restantes_edad != 1:
+        print('❌ La purga debía eliminar solo la entrada antigua')
+        return 1
+    if por_tamano != 1 or len(restantes_tamano) != 1 or not restantes_tamano[0].startswith(hash_otra):
+        print(f'❌ Por encima del tamaño máximo debían eliminarse las entradas menos usadas: {restantes_tamano}')
+        return 1
+
+    print('✅ Prueba del almacén de textos correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_text_store_test())
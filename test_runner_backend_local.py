@@ -0,0 +1,134 @@
+import os
+import re
+import json
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pandas as pd
+
+# Import functions from main.py
+import main
+from test_runner_concurrencia import crear_pdfs_sinteticos
+
+class ServidorLocal(BaseHTTPRequestHandler):
+    """Sustituto de un servidor compatible con OpenAI (llama.cpp, vLLM) para las pruebas"""
+
+    protocol_version = 'HTTP/1.1'  # conexiones persistentes, como los servidores reales
+    peticiones = []
+    conexiones = set()
+    en_curso = 0
+    max_en_curso = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        cuerpo = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        cls = type(self)
+        with cls.lock:
+            cls.peticiones.append(cuerpo)
+            cls.conexiones.add(self.client_address)
+            primera = len(cls.peticiones) == 1
+            cls.en_curso += 1
+            cls.max_en_curso = max(cls.max_en_curso, cls.en_curso)
+        try:
+            if self.path != '/v1/chat/completions':
+                self._responder(404, {'error': 'not found'})
+            elif primera:
+                # La primera petición se rechaza como haría un servidor saturado
+                self._responder(429, {'error': 'busy'}, {'Retry-After': '0'})
+            elif cuerpo.get('stream'):
+                self._responder_eventos(self._completar(cuerpo))
+            else:
+                self._responder(200, self._completar(cuerpo))
+        finally:
+            with cls.lock:
+                cls.en_curso -= 1
+
+    def _completar(self, cuerpo: dict) -> dict:
+        prompt = cuerpo['messages'][0]['content']
+        filas = [f"REF{n}\tLibrado {n}\t{iban}\t{n}.50\t01/01/2025\tEmisorX\tID123\tFileRef\t10/10/2025\t09/10/2025\tDoc{n}"
+                 for n, iban in re.findall(r'REF(\d+)\s+Librado \d+\s+(ES\d{22})', prompt)]
+        return {
+            'choices': [{'message': {'role': 'assistant', 'content': '\n'.join(filas)}}],
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': 20, 'total_tokens': len(prompt) // 4 + 20},
+        }
+
+    def _responder(self, estado: int, datos: dict, cabeceras: dict = None):
+        cuerpo = json.dumps(datos).encode('utf-8')
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        for clave, valor in (cabeceras or {}).items():
+            self.send_header(clave, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _responder_eventos(self, completa: dict):
+        """Respuesta en streaming (server-sent events): el texto en trozos de 10 caracteres y el uso al final"""
+        texto = completa['choices'][0]['message']['content']
+        eventos = [{'choices': [{'delta': {'content': texto[i:i + 10]}}]} for i in range(0, len(texto), 10)]
+        eventos.append({'choices': [], 'usage': completa['usage']})
+        cuerpo = ''.join(f"data: {json.dumps(evento)}\n\n" for evento in eventos) + "data: [DONE]\n\n"
+        cuerpo = cuerpo.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+def run_local_backend_test():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), ServidorLocal)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    os.environ.update({
+        'URL_LLM': f"http://127.0.0.1:{servidor.server_address[1]}/v1",
+        'CACHE_RESPUESTAS': '0', 'ALMACEN_TEXTO': '0', 'INFORME_EJECUCION': '0',
+    })
+
+    try:
+        with tempfile.TemporaryDirectory() as pdf_dir:
+            crear_pdfs_sinteticos(pdf_dir, 8)
+            codigo = main.main([pdf_dir, '--backend', 'openai', '--modelo', 'modelo-local', '--concurrencia', '2'])
+            df = pd.read_csv(os.path.join(pdf_dir, 'output', main.NOMBRE_COMBINADO), sep='\t', dtype=str)
+
+        # Modo JSON: el esquema de Gemini se envía como response_format
+        main.obtener_backend().generar('REF9  Librado 9  ES00' + '9' * 20, main.configuracion_json())
+        formato = ServidorLocal.peticiones[-1].get('response_format', {})
+
+        # Streaming: el texto llega a trozos y el uso de tokens en el último evento
+        flujo = main.obtener_backend().generar_streaming('REF7  Librado 7  ES00' + '7' * 20)
+        trozos = list(flujo)
+        streaming = ServidorLocal.peticiones[-1].get('stream')
+    finally:
+        servidor.shutdown()
+        main.configurar_backend(None)
+
+    peticiones = ServidorLocal.peticiones
+    print(f"\nPeticiones: {len(peticiones)} - Simultáneas: {ServidorLocal.max_en_curso} - "
+          f"Conexiones: {len(ServidorLocal.conexiones)} - Filas: {len(df)}")
+    if codigo != 0 or sorted(df['Referencia Única']) != sorted(f'REF{i}' for i in range(8)):
+        print('❌ No se procesaron todos los documentos con el servidor local')
+        return 1
+    if len(peticiones) != 11 or any(p['model'] != 'modelo-local' for p in peticiones):
+        print('❌ Cada documento debía enviarse una vez (más el reintento del 429) con el modelo indicado')
+        return 1
+    if ServidorLocal.max_en_curso > 2:
+        print('❌ Se superó la concurrencia indicada')
+        return 1
+    if len(ServidorLocal.conexiones) > 4:
+        print('❌ Las conexiones al servidor debían reutilizarse')
+        return 1
+    if not streaming or len(trozos) < 2 or not ''.join(trozos).startswith('REF7\tLibrado 7') \
+            or flujo.usage_metadata.candidates_token_count != 20:
+        print(f'❌ La respuesta en streaming no se leyó correctamente: {trozos}')
+        return 1
+    if formato.get('type') != 'json_schema' or formato['json_schema']['schema']['type'] != 'array':
+        print(f'❌ El esquema JSON no se tradujo a response_format: {formato}')
+        return 1
+
+    print('✅ Prueba del backend local compatible con OpenAI correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_local_backend_test())
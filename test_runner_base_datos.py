@@ -0,0 +1,106 @@
+import os
+import re
+import sqlite3
+import tempfile
+from io import StringIO
+import fitz
+import pandas as pd
+
+# Import functions from main.py
+import main
+import base_datos
+from base_datos import BaseDatosRemesas
+
+def crear_pdf(directorio: str, nombre: str, emisor: str, fecha: str, filas: list) -> None:
+    """filas: (referencia, iban, importe, referencia del documento)"""
+    texto = f"Emisor {emisor} Fecha {fecha}\n" + "\n".join(
+        f"{referencia}  Librado  {iban}  {importe}  {documento}" for referencia, iban, importe, documento in filas)
+    documento = fitz.open()
+    documento.new_page().insert_text((72, 72), texto)
+    documento.save(os.path.join(directorio, nombre))
+    documento.close()
+
+def modelo_stub(texto):
+    emisor, fecha = re.search(r'Emisor (\w+) Fecha (\S+)', texto).groups()
+    return '\n'.join(f"{referencia}\tLibrado\t{iban}\t{importe}\t01/11/2025\t{emisor}\tID1\tFICH\t10/10/2025\t{fecha}\t{documento}"
+                     for referencia, iban, importe, documento in re.findall(r'(REF\w+)\s+Librado\s+(ES\d{22})\s+(\S+)\s+(DOC\w+)', texto))
+
+def exportado(ruta: str, **filtros) -> pd.DataFrame:
+    base = BaseDatosRemesas(ruta)
+    try:
+        salida = StringIO()
+        base.exportar_tsv(salida, **filtros)
+    finally:
+        base.cerrar()
+    return pd.read_csv(StringIO(salida.getvalue()), sep='\t', dtype=str)
+
+def combinado(pdf_dir: str) -> pd.DataFrame:
+    df = pd.read_csv(os.path.join(pdf_dir, 'output', main.NOMBRE_COMBINADO), sep='\t', dtype=str)
+    return df.drop(columns=['Validacion'], errors='ignore')
+
+def versiones(ruta: str) -> dict:
+    with sqlite3.connect(ruta) as conexion:
+        return dict(conexion.execute("SELECT archivo, version FROM documentos"))
+
+def run_database_test():
+    iban = lambda n: f"ES00{n:020d}"
+    original = main.estructurar_informacion_con_gemini
+    main.estructurar_informacion_con_gemini = modelo_stub
+    os.environ.update({'BASE_DATOS_SQLITE': '1', 'PARSERS_LOCALES': '0', 'CACHE_RESPUESTAS': '0',
+                       'ALMACEN_TEXTO': '0', 'INFORME_EJECUCION': '0'})
+    try:
+        with tempfile.TemporaryDirectory() as pdf_dir:
+            ruta = os.path.join(pdf_dir, 'output', base_datos.NOMBRE_BASE_DATOS)
+            crear_pdf(pdf_dir, 'a.pdf', 'E1', '15/09/2025', [('REF1', iban(1), '1.50', 'DOC1'), ('REF2', iban(2), '2.50', 'DOC2')])
+            # Dos filas con la misma referencia del documento: ninguna debe perderse
+            crear_pdf(pdf_dir, 'b.pdf', 'E2', '20/09/2025', [('REF3', iban(1), '3.50', 'DOC3'), ('REF4', iban(4), '4.50', 'DOC3')])
+            crear_pdf(pdf_dir, 'c.pdf', 'E1', '05/10/2025', [('REF5', iban(5), '5.50', 'DOC5')])
+
+            # 1. La base de datos tiene las mismas filas, en el mismo orden, que el combinado
+            main.procesar_carpeta(pdf_dir, 2)
+            igual_1 = exportado(ruta).equals(combinado(pdf_dir))
+            por_iban = list(exportado(ruta, iban='es00 ' + '0' * 19 + '1')['Referencia Única'])
+            por_emisor = list(exportado(ruta, emisor='E1', desde='01/09/2025', hasta='2025-09-30')['Referencia Única'])
+            versiones_1 = versiones(ruta)
+
+            # 2. Otra ejecución: un PDF nuevo, uno modificado (con una fila menos) y uno eliminado
+            crear_pdf(pdf_dir, 'd.pdf', 'E3', '01/10/2025', [('REF6', iban(6), '6.50', 'DOC6')])
+            crear_pdf(pdf_dir, 'b.pdf', 'E2', '20/09/2025', [('REF3', iban(1), '3.75', 'DOC3')])
+            os.remove(os.path.join(pdf_dir, 'c.pdf'))
+            main.procesar_carpeta(pdf_dir, 1)
+            igual_2 = exportado(ruta).equals(combinado(pdf_dir))
+            versiones_2 = versiones(ruta)
+            importes_b = list(exportado(ruta, archivo='b.pdf')['Importe'])
+
+            # 3. Exportación desde la línea de comandos
+            destino = os.path.join(pdf_dir, 'iban1.tsv')
+            codigo = base_datos.main([ruta, '--iban', iban(1), '-o', destino])
+            exportadas = len(pd.read_csv(destino, sep='\t', dtype=str))
+    finally:
+        main.estructurar_informacion_con_gemini = original
+        for variable in ('BASE_DATOS_SQLITE', 'PARSERS_LOCALES', 'CACHE_RESPUESTAS', 'ALMACEN_TEXTO', 'INFORME_EJECUCION'):
+            os.environ.pop(variable, None)
+
+    print(f"\nVersiones: {versiones_1} → {versiones_2} - IBAN 1: {por_iban} - E1 en septiembre: {por_emisor}")
+    if not igual_1 or not igual_2:
+        print('❌ Las filas de la base de datos no coinciden con las del combinado')
+        return 1
+    if por_iban != ['REF1', 'REF3'] or por_emisor != ['REF1', 'REF2']:
+        print('❌ Las consultas por IBAN o por emisor y fecha no devolvieron las filas esperadas')
+        return 1
+    # Solo se vuelven a leer los TSV nuevos o modificados
+    if versiones_1 != {'a.pdf': 1, 'b.pdf': 1, 'c.pdf': 1} or versiones_2 != {'a.pdf': 1, 'b.pdf': 2, 'd.pdf': 1}:
+        print('❌ La base de datos debía actualizar solo los archivos nuevos o modificados')
+        return 1
+    if importes_b != ['3.75']:
+        print(f'❌ Las filas del archivo modificado no se actualizaron: {importes_b}')
+        return 1
+    if codigo != 0 or exportadas != 2:
+        print('❌ La exportación desde la línea de comandos falló')
+        return 1
+
+    print('✅ Prueba de la base de datos SQLite correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_database_test())
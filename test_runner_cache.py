@@ -0,0 +1,122 @@
+import os
+import time
+import tempfile
+from types import SimpleNamespace
+
+# Import functions from main.py
+import main
+from cache_llm import CacheRespuestas
+from backends_llm import BackendLLM
+
+def envejecer(cache: CacheRespuestas, clave: str, segundos: float) -> None:
+    """Retrasa la fecha de la entrada como si se hubiera usado por última vez hace 'segundos'"""
+    ruta = os.path.join(cache.directorio, f"{clave}.txt")
+    os.utime(ruta, (time.time() - segundos, time.time() - segundos))
+
+def run_cache_test():
+    with tempfile.TemporaryDirectory() as directorio:
+        # 1. La clave cambia con el texto, la plantilla o el modelo
+        clave = CacheRespuestas.calcular_clave('texto', 'plantilla', 'modelo')
+        claves_distintas = len({clave,
+                                CacheRespuestas.calcular_clave('texto2', 'plantilla', 'modelo'),
+                                CacheRespuestas.calcular_clave('texto', 'plantilla 2', 'modelo'),
+                                CacheRespuestas.calcular_clave('texto', 'plantilla', 'modelo-2'),
+                                # Sin el prefijo de longitud estas dos colisionarían
+                                CacheRespuestas.calcular_clave('ab', 'c', 'modelo'),
+                                CacheRespuestas.calcular_clave('a', 'bc', 'modelo')})
+        estable = clave == CacheRespuestas.calcular_clave('texto', 'plantilla', 'modelo')
+
+        # 2. Una entrada más antigua que max_edad_segundos no se devuelve y se elimina
+        cache = CacheRespuestas(os.path.join(directorio, 'edad'), max_bytes=10_000, max_edad_segundos=60)
+        cache.guardar('vieja', 'respuesta vieja')
+        cache.guardar('nueva', 'respuesta nueva')
+        envejecer(cache, 'vieja', 120)
+        caducada = cache.obtener('vieja')
+        vigente = cache.obtener('nueva')
+        cache.guardar('vieja_2', 'respuesta vieja')
+        envejecer(cache, 'vieja_2', 120)
+        eliminadas_edad = cache.purgar()
+        restantes_edad = sorted(os.listdir(cache.directorio))
+
+        # 3. Por encima de max_bytes se eliminan las menos usadas recientemente
+        cache = CacheRespuestas(os.path.join(directorio, 'tamano'), max_bytes=250, max_edad_segundos=3600)
+        for i, nombre in enumerate(('a', 'b', 'c', 'd')):
+            cache.guardar(nombre, 'x' * 100)
+            envejecer(cache, nombre, 40 - i * 10)
+        cache.obtener('a')  # la más antigua vuelve a ser la más reciente
+        eliminadas_tamano = cache.purgar()
+        restantes_tamano = sorted(os.listdir(cache.directorio))
+
+        # 4. Cambiar el prompt (aquí, el formato de respuesta) invalida la caché
+        llamadas = []
+
+        def llamar_modelo_stub(prompt):
+            llamadas.append(prompt)
+            return SimpleNamespace(text="REF1\tLibrado\tES00\t1.50\t01/01/2025\tEmisorX\tID123\tFileRef\t10/10/2025\t09/10/2025\tDoc1")
+
+        original = main.llamar_modelo
+        main.llamar_modelo = llamar_modelo_stub
+        main.configurar_cache_respuestas(CacheRespuestas(os.path.join(directorio, 'prompt')))
+        try:
+            respuestas = [main.estructurar_informacion_con_gemini('Remesa 1') for _ in range(2)]
+            os.environ['FORMATO_RESPUESTA'] = 'compacto'
+            respuestas.append(main.estructurar_informacion_con_gemini('Remesa 1'))
+        finally:
+            main.llamar_modelo = original
+            main.configurar_cache_respuestas(None)
+            os.environ.pop('FORMATO_RESPUESTA', None)
+
+    # 5. Una respuesta mal formada (columnas de más) no se guarda: la siguiente ejecución vuelve a pedirla
+    buena = "REF1\tLibrado\tES00\t1.50\t01/01/2025\tEmisorX\tID123\tFileRef\t10/10/2025\t09/10/2025\tDoc1"
+    mala = buena + "\tsobra\tsobra\tsobra"
+    respuestas_modelo = []
+
+    class BackendSecuencia(BackendLLM):
+        nombre = 'prueba'
+
+        def generar(self, prompt: str, generation_config: dict = None):
+            return SimpleNamespace(text=respuestas_modelo.pop(0), usage_metadata=None)
+
+    reintentadas = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        main.configurar_backend(BackendSecuencia('prueba'))
+        main.configurar_cache_respuestas(CacheRespuestas(directorio))
+        try:
+            for modo in ('normal', 'streaming'):
+                texto = f'Remesa {modo}'
+                respuestas_modelo[:] = [mala, buena]
+                if modo == 'normal':
+                    obtener = lambda: main.estructurar_informacion_con_gemini(texto)
+                else:
+                    obtener = lambda: '\n'.join(l for lineas in main.estructurar_en_streaming(texto) for l in lineas)
+                # La primera llega mal formada, la segunda se pide de nuevo y la tercera sale de la caché
+                reintentadas[modo] = ([obtener() for _ in range(3)], len(respuestas_modelo))
+        finally:
+            main.configurar_backend(None)
+            main.configurar_cache_respuestas(None)
+
+    print(f"\nClaves distintas: {claves_distintas}/6 - Restantes por edad: {restantes_edad} - "
+          f"Restantes por tamaño: {restantes_tamano} - Llamadas al modelo: {len(llamadas)}")
+    if claves_distintas != 6 or not estable:
+        print('❌ La clave debía depender del texto, la plantilla y el modelo, y ser estable')
+        return 1
+    if caducada is not None or vigente != 'respuesta nueva' or eliminadas_edad != 1 or restantes_edad != ['nueva.txt']:
+        print('❌ Las entradas caducadas debían ignorarse y eliminarse')
+        return 1
+    if eliminadas_tamano != 2 or restantes_tamano != ['a.txt', 'd.txt']:
+        print('❌ Al superar el tamaño máximo debían eliminarse las entradas menos usadas')
+        return 1
+    if len(llamadas) != 2 or None in respuestas or respuestas[0] != respuestas[1]:
+        print('❌ La misma petición debía salir de la caché y un prompt distinto llamar al modelo')
+        return 1
+
+    for modo, (obtenidas, sin_pedir) in reintentadas.items():
+        if obtenidas != [mala, buena, buena] or sin_pedir != 0:
+            print(f'❌ Una respuesta mal formada no debía servirse desde la caché ({modo}): {obtenidas}')
+            return 1
+
+    print('✅ Prueba de la caché de respuestas correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_cache_test())
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import threading
+import time
+import fitz
+import pandas as pd
+
+# Import functions from main.py
+import main
+
+LATENCIA_STUB = 0.3  # segundos simulados por llamada al modelo
+
+def crear_pdfs_sinteticos(directorio: str, cantidad: int) -> list:
+    """Crea PDFs de una página con un texto distinto cada uno"""
+    archivos = []
+    for i in range(cantidad):
+        nombre = f"remesa_{i:03d}.pdf"
+        documento = fitz.open()
+        pagina = documento.new_page()
+        pagina.insert_text((72, 72), f"Remesa de prueba {i}\nREF{i}  Librado {i}  ES00{i:020d}  {i}.50")
+        documento.save(os.path.join(directorio, nombre))
+        documento.close()
+        archivos.append(nombre)
+    return archivos
+
+def run_concurrency_test():
+    en_curso = 0
+    max_en_curso = 0
+    lock = threading.Lock()
+
+    def modelo_stub(texto):
+        # Simula la latencia de red de Gemini y mide cuántas llamadas se solapan
+        nonlocal en_curso, max_en_curso
+        with lock:
+            en_curso += 1
+            max_en_curso = max(max_en_curso, en_curso)
+        time.sleep(LATENCIA_STUB)
+        with lock:
+            en_curso -= 1
+        numero = texto.split()[3]
+        if numero == '5':
+            return None  # Un fallo controlado para comprobar el recuento
+        return f"REF{numero}\tLibrado {numero}\tES00\t{numero}.50\t01/01/2025\tEmisorX\tID123\tFileRef\t10/10/2025\t09/10/2025\tDoc{numero}"
+
+    main.estructurar_informacion_con_gemini = modelo_stub
+
+    with tempfile.TemporaryDirectory() as pdf_dir:
+        archivos = crear_pdfs_sinteticos(pdf_dir, 12)
+        directorio_salida = os.path.join(pdf_dir, 'output')
+        os.makedirs(directorio_salida, exist_ok=True)
+        rutas = [os.path.join(pdf_dir, a) for a in archivos]
+
+        inicio = time.time()
+        secuencial = main.procesar_lote(rutas, directorio_salida, 1)
+        t_secuencial = time.time() - inicio
+
+        max_en_curso = 0
+        inicio = time.time()
+        paralelo = main.procesar_lote(rutas, directorio_salida, 4)
+        t_paralelo = time.time() - inicio
+
+        print(f'\nSecuencial: {t_secuencial:.2f}s - Paralelo (4): {t_paralelo:.2f}s')
+        print(f'Máximo de peticiones simultáneas observado: {max_en_curso}')
+
+        if secuencial != paralelo:
+            print('❌ Los resultados por archivo difieren entre modo secuencial y paralelo')
+            return 1
+        if paralelo.count(False) != 1:
+            print(f'❌ Se esperaba exactamente 1 fallo, hubo {paralelo.count(False)}')
+            return 1
+        if max_en_curso > 4:
+            print('❌ Se superó el límite de peticiones simultáneas')
+            return 1
+        if t_paralelo >= t_secuencial:
+            print('❌ El modo paralelo no fue más rápido')
+            return 1
+
+        procesados = [a for a, ok in zip(archivos, paralelo) if ok]
+        ruta_combinado = main.combinar_archivos_tsv(procesados, directorio_salida)
+        df = pd.read_csv(ruta_combinado, sep='\t')
+        if df['Archivo_Origen'].tolist() != procesados:
+            print('❌ El orden del archivo combinado no es determinista')
+            return 1
+
+    print('✅ Prueba de concurrencia correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_concurrency_test())
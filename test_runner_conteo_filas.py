@@ -0,0 +1,69 @@
+import os
+import re
+import tempfile
+import fitz
+import pandas as pd
+
+# Import functions from main.py
+import main
+
+LINEAS_POR_PAGINA = 2
+PAGINAS = 3
+
+def iban_espanol(numero: int) -> str:
+    """IBAN español válido (con sus dígitos de control) a partir de un número de cuenta"""
+    bban = f"{numero:020d}"
+    control = 98 - int(bban + '142800') % 97  # 'ES00' -> 14 28 00
+    return f"ES{control:02d}{bban}"
+
+def crear_pdf_varias_paginas(ruta: str) -> None:
+    documento = fitz.open()
+    linea = 0
+    for numero_pagina in range(PAGINAS):
+        pagina = documento.new_page()
+        texto = "Remesa multipagina\n"
+        if numero_pagina == 0:
+            # El IBAN del acreedor aparece sin importe: no es una línea de detalle
+            texto += f"Cuenta del acreedor: {iban_espanol(999)}\n"
+        for _ in range(LINEAS_POR_PAGINA):
+            texto += f"REF{linea}  Librado {linea}  {iban_espanol(linea)}  {linea}.50\n"
+            linea += 1
+        pagina.insert_text((72, 72), texto)
+    documento.save(ruta)
+    documento.close()
+
+def run_row_count_test():
+    peticiones = []
+
+    def modelo_stub(texto):
+        peticiones.append(texto)
+        filas = []
+        for referencia, iban, importe in re.findall(r'REF(\d+)\s+Librado \d+\s+(ES\d{22})\s+([\d.]+)', texto):
+            # En la primera petición el modelo "se salta" las líneas de la segunda página
+            if len(peticiones) == 1 and int(referencia) // LINEAS_POR_PAGINA == 1:
+                continue
+            filas.append(f"REF{referencia}\tLibrado {referencia}\t{iban}\t{importe}\t01/01/2025\t"
+                         f"EmisorX\tID123\tFileRef\t10/10/2025\t09/10/2025\tDoc{referencia}")
+        return '\n'.join(filas)
+
+    main.estructurar_informacion_con_gemini = modelo_stub
+
+    with tempfile.TemporaryDirectory() as pdf_dir:
+        crear_pdf_varias_paginas(os.path.join(pdf_dir, 'remesa.pdf'))
+        main.procesar_carpeta(pdf_dir, 1)
+        df = pd.read_csv(os.path.join(pdf_dir, 'output', 'remesa.tsv'), sep='\t', dtype=str)
+
+    referencias = df['Referencia Única'].tolist()
+    print(f'\nPeticiones: {len(peticiones)} - Filas: {referencias}')
+    if referencias != [f'REF{i}' for i in range(PAGINAS * LINEAS_POR_PAGINA)]:
+        print('❌ Las filas recuperadas no están completas o no están en el orden de las páginas')
+        return 1
+    if len(peticiones) != 2 or 'REF0' in peticiones[1] or 'REF2' not in peticiones[1]:
+        print('❌ Solo debía volver a pedirse la página con las líneas que faltaban')
+        return 1
+
+    print('✅ Prueba de la comprobación del número de filas correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_row_count_test())
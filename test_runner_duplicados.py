@@ -0,0 +1,121 @@
+import os
+import re
+import shutil
+import tempfile
+import fitz
+import pandas as pd
+
+# Import functions from main.py
+import main
+from indice_remesas import clave_remesa
+
+FILAS = {
+    'A': [(1, '1'), (2, '2')],
+    'D': [(1, '1'), (3, '3')],  # la fila REF1 también está en la remesa A
+}
+
+def crear_pdf(ruta: str, texto: str) -> None:
+    documento = fitz.open()
+    documento.new_page().insert_text((72, 72), texto)
+    documento.save(ruta)
+    documento.close()
+
+def texto_remesa(remesa: str, referencia: str, titulo: str = None) -> str:
+    lineas = [titulo or f"Remesa {remesa}", f"Referencia del Fichero: {referencia}", "Identificación del Emisor: EMI01"]
+    lineas += [f"REF{n}  Librado {n}  ES00{n:020d}  {importe}.50" for n, importe in FILAS[remesa]]
+    return '\n'.join(lineas)
+
+def run_duplicates_test():
+    llamadas = []
+
+    def modelo_stub(texto):
+        llamadas.append(re.search(r'Remesa (\w+)', texto).group(1))
+        return '\n'.join(f"REF{n}\tLibrado {n}\tES00{int(n):020d}\t{importe}.50\t01/01/2025\tEmisorX\tID123\tFileRef\t10/10/2025\t09/10/2025\tDoc{n}"
+                         for n, importe in re.findall(r'REF(\d+)\s+Librado \d+\s+ES\d{22}\s+(\d+)\.50', texto))
+
+    original = main.estructurar_informacion_con_gemini
+    main.estructurar_informacion_con_gemini = modelo_stub
+    os.environ.update({'PARSERS_LOCALES': '0', 'CACHE_RESPUESTAS': '0', 'ALMACEN_TEXTO': '0', 'INFORME_EJECUCION': '0'})
+    try:
+        with tempfile.TemporaryDirectory() as pdf_dir:
+            salida = os.path.join(pdf_dir, 'output')
+            crear_pdf(os.path.join(pdf_dir, 'a_remesa.pdf'), texto_remesa('A', 'FICH001'))
+            # Misma remesa con otro nombre: texto idéntico
+            shutil.copy(os.path.join(pdf_dir, 'a_remesa.pdf'), os.path.join(pdf_dir, 'b_copia.pdf'))
+            # Misma remesa con otro texto: se reconoce por la referencia y el emisor
+            crear_pdf(os.path.join(pdf_dir, 'c_reenvio.pdf'), texto_remesa('A', 'FICH001', 'Remesa A (reenvío)'))
+            # Otra remesa con una fila que ya está en la A
+            crear_pdf(os.path.join(pdf_dir, 'd_otra.pdf'), texto_remesa('D', 'FICH002'))
+
+            # 1. Solo las remesas distintas llegan al modelo y el combinado no repite filas
+            procesados = main.procesar_carpeta(pdf_dir, 1)
+            primera = sorted(llamadas)
+            combinado = pd.read_csv(os.path.join(salida, main.NOMBRE_COMBINADO), sep='\t', dtype=str)
+            filas_copia = len(pd.read_csv(os.path.join(salida, 'b_copia.tsv'), sep='\t', dtype=str))
+
+            # 2. En otra ejecución, una nueva copia se reconoce por el índice guardado
+            llamadas.clear()
+            shutil.copy(os.path.join(pdf_dir, 'd_otra.pdf'), os.path.join(pdf_dir, 'e_copia_tardia.pdf'))
+            main._indices_remesas.clear()
+            procesados_2 = main.procesar_carpeta(pdf_dir, 1)
+            segunda = sorted(llamadas)
+
+            # 3. Si se elimina el original, su duplicado pasa a aportar las filas
+            llamadas.clear()
+            os.remove(os.path.join(pdf_dir, 'a_remesa.pdf'))
+            main._indices_remesas.clear()
+            main.procesar_carpeta(pdf_dir, 1)
+            tercera = sorted(llamadas)
+            combinado_3 = pd.read_csv(os.path.join(salida, main.NOMBRE_COMBINADO), sep='\t', dtype=str)
+
+        # 4. Dos remesas distintas sin Referencia del Fichero no se confunden por la etiqueta que la sigue
+        llamadas.clear()
+        with tempfile.TemporaryDirectory() as pdf_dir:
+            for remesa in ('A', 'D'):
+                texto = texto_remesa(remesa, '   Fecha de Envío: 01/10/2025')
+                crear_pdf(os.path.join(pdf_dir, f"sin_referencia_{remesa}.pdf"), texto)
+            main._indices_remesas.clear()
+            procesados_4 = main.procesar_carpeta(pdf_dir, 1)
+            cuarta = sorted(llamadas)
+    finally:
+        main.estructurar_informacion_con_gemini = original
+        main._indices_remesas.clear()
+        for variable in ('PARSERS_LOCALES', 'CACHE_RESPUESTAS', 'ALMACEN_TEXTO', 'INFORME_EJECUCION'):
+            os.environ.pop(variable, None)
+
+    print(f"\nLlamadas al modelo: {primera} / {segunda} / {tercera} - Filas del combinado: {len(combinado)} / {len(combinado_3)}")
+    if len(procesados) != 4 or primera != ['A', 'D']:
+        print(f'❌ Los duplicados no debían enviarse al modelo: {procesados} {primera}')
+        return 1
+    if filas_copia != 0:
+        print('❌ El TSV de un duplicado debía quedar sin filas')
+        return 1
+    if sorted(combinado['Referencia Única']) != ['REF1', 'REF2', 'REF3']:
+        print(f"❌ El combinado no debía repetir filas: {list(combinado['Referencia Única'])}")
+        return 1
+    if len(procesados_2) != 5 or segunda:
+        print(f'❌ La copia tardía debía detectarse con el índice de la ejecución anterior: {segunda}')
+        return 1
+    if tercera != ['A'] or sorted(combinado_3['Referencia Única']) != ['REF1', 'REF2', 'REF3'] \
+            or set(combinado_3.loc[combinado_3['Referencia Única'] == 'REF2', 'Archivo_Origen']) != {'b_copia.pdf'}:
+        print(f"❌ Sin el original, una de sus copias debía procesarse: {tercera} {list(combinado_3['Archivo_Origen'])}")
+        return 1
+
+    if len(procesados_4) != 2 or cuarta != ['A', 'D']:
+        print(f'❌ Las remesas sin referencia no debían tomarse por duplicadas: {cuarta}')
+        return 1
+    claves = [clave_remesa(texto) for texto in (
+        "Referencia del Fichero: PRE2025/01-A   Fecha: 01/10/2025\nIdentificación del Emisor: ES12ZZZ123",
+        "Referencia del Fichero:\tFecha: 01/10/2025\nIdentificación del Emisor: EMI01",
+        "Referencia del Fichero: Identificación del Emisor: EMI01",
+        "Referencia del Fichero: FICHÑ01\nIdentificación del Emisor: EMI01",
+    )]
+    if claves != ['PRE2025/01-A|ES12ZZZ123', None, None, None]:
+        print(f'❌ La clave debía tomar solo valores con caracteres SEPA y nunca la etiqueta siguiente: {claves}')
+        return 1
+
+    print('✅ Prueba de detección de remesas duplicadas correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_duplicates_test())
@@ -0,0 +1,80 @@
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import fitz
+
+from extraccion_pdf import extraer_paginas
+
+PAGINAS = 20
+PAGINAS_POR_TAREA = 3
+
+class PoolRegistrado(ProcessPoolExecutor):
+    """Pool de procesos que anota el rango de páginas de cada tarea"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rangos = []
+
+    def submit(self, funcion, *args, **kwargs):
+        self.rangos.append(args[1:3])
+        return super().submit(funcion, *args, **kwargs)
+
+def crear_pdf(ruta: str, paginas: int) -> None:
+    documento = fitz.open()
+    for n in range(paginas):
+        documento.new_page().insert_text((72, 72), f"Página {n}\nREF{n}  Librado {n}  {n}.50")
+    documento.save(ruta)
+    documento.close()
+
+def numeros_de_pagina(paginas: list) -> list:
+    return [int(re.search(r'Página (\d+)', texto).group(1)) for texto in paginas]
+
+def run_extraction_test():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'remesa_larga.pdf')
+        ruta_corta = os.path.join(directorio, 'remesa_corta.pdf')
+        crear_pdf(ruta, PAGINAS)
+        crear_pdf(ruta_corta, 1)
+
+        # 1. Sin pool, todo en el proceso actual
+        sin_pool, _ = extraer_paginas(ruta)
+
+        # 2. Con pool, por rangos de páginas repartidos entre los procesos
+        with PoolRegistrado(max_workers=3) as pool:
+            con_pool, _ = extraer_paginas(ruta, pool, paginas_por_tarea=PAGINAS_POR_TAREA)
+            rangos = list(pool.rangos)
+            corta, _ = extraer_paginas(ruta_corta, pool, paginas_por_tarea=PAGINAS_POR_TAREA)
+            rangos_corta = pool.rangos[len(rangos):]
+
+        # 3. Si el pool no se puede usar (cerrado, o roto porque murió un proceso), se extrae sin él
+        cerrado = ProcessPoolExecutor(max_workers=2)
+        cerrado.shutdown()
+        con_pool_cerrado, _ = extraer_paginas(ruta, cerrado, paginas_por_tarea=PAGINAS_POR_TAREA)
+        roto = ProcessPoolExecutor(max_workers=2)
+        try:
+            roto.submit(os._exit, 1).exception()
+            con_pool_roto, _ = extraer_paginas(ruta, roto, paginas_por_tarea=PAGINAS_POR_TAREA)
+        finally:
+            roto.shutdown()
+
+    print(f"\nRangos repartidos: {rangos} - Páginas en orden: {numeros_de_pagina(con_pool)}")
+    esperados = [(i, i + PAGINAS_POR_TAREA) for i in range(0, PAGINAS, PAGINAS_POR_TAREA)]
+    if rangos != esperados or rangos_corta != [(0, PAGINAS_POR_TAREA)]:
+        print(f'❌ Las páginas debían repartirse en rangos de {PAGINAS_POR_TAREA}: {rangos} {rangos_corta}')
+        return 1
+    if numeros_de_pagina(sin_pool) != list(range(PAGINAS)) or con_pool != sin_pool:
+        print('❌ El texto extraído con el pool debía coincidir con el extraído sin él, en el orden de las páginas')
+        return 1
+    if numeros_de_pagina(corta) != [0]:
+        print('❌ Un documento de una sola página debía extraerse entero con el pool')
+        return 1
+    if con_pool_cerrado != sin_pool or con_pool_roto != sin_pool:
+        print('❌ Con el pool cerrado o roto debía extraerse en el proceso actual')
+        return 1
+
+    print('✅ Prueba de la extracción de texto con el pool de procesos correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_extraction_test())
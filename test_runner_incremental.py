@@ -0,0 +1,59 @@
+import os
+import tempfile
+import fitz
+
+# Import functions from main.py
+import main
+from test_runner_concurrencia import crear_pdfs_sinteticos
+
+def run_incremental_test():
+    llamadas = []
+
+    def modelo_stub(texto):
+        numero = texto.split()[3]
+        llamadas.append(numero)
+        return f"REF{numero}\tLibrado {numero}\tES00\t{numero}.50\t01/01/2025\tEmisorX\tID123\tFileRef\t10/10/2025\t09/10/2025\tDoc{numero}"
+
+    main.estructurar_informacion_con_gemini = modelo_stub
+
+    with tempfile.TemporaryDirectory() as pdf_dir:
+        archivos = crear_pdfs_sinteticos(pdf_dir, 5)
+
+        # 1. Primera ejecución: se procesa todo
+        procesados = main.procesar_carpeta(pdf_dir, 2)
+        if len(procesados) != 5 or len(llamadas) != 5:
+            print(f'❌ Primera ejecución: {len(procesados)} procesados, {len(llamadas)} llamadas')
+            return 1
+
+        # 2. Segunda ejecución sin cambios: ninguna llamada al modelo
+        llamadas.clear()
+        procesados = main.procesar_carpeta(pdf_dir, 2)
+        if len(procesados) != 5 or llamadas:
+            print(f'❌ Segunda ejecución: {len(procesados)} procesados, {len(llamadas)} llamadas')
+            return 1
+
+        # 3. Un PDF modificado y uno nuevo: solo esos dos se reprocesan
+        for nombre, texto in ((archivos[2], "Remesa de prueba 2\nmodificada"), ('remesa_nueva.pdf', "Remesa de prueba 5")):
+            documento = fitz.open()
+            documento.new_page().insert_text((72, 72), texto)
+            documento.save(os.path.join(pdf_dir, nombre))
+            documento.close()
+        llamadas.clear()
+        procesados = main.procesar_carpeta(pdf_dir, 2)
+        if len(procesados) != 6 or sorted(llamadas) != ['2', '5']:
+            print(f'❌ Tercera ejecución: {len(procesados)} procesados, llamadas {llamadas}')
+            return 1
+
+        # 4. Simular una ejecución interrumpida: falta el TSV de un archivo ya confirmado
+        os.remove(main.ruta_tsv_salida(archivos[0], os.path.join(pdf_dir, 'output')))
+        llamadas.clear()
+        main.procesar_carpeta(pdf_dir, 2)
+        if llamadas != ['0']:
+            print(f'❌ Reanudación: llamadas {llamadas}')
+            return 1
+
+    print('✅ Prueba de procesamiento incremental correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_incremental_test())
@@ -0,0 +1,96 @@
+import os
+import re
+import json
+import time
+import pstats
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+# Import functions from main.py
+import main
+from backends_llm import BackendLLM
+from cache_llm import CacheRespuestas
+from limitador import LimitadorPeticiones
+from informe_ejecucion import InformeEjecucion, NOMBRE_INFORME, DIRECTORIO_PERFILES
+from test_runner_concurrencia import crear_pdfs_sinteticos
+
+ESPERAS = {'1': 0.1, '2': 0.3}  # segundos de respuesta por documento; el resto responde al momento
+# (el 1 espera además la pausa tras el aviso de cuota, con un margen al azar: su orden frente al 2 varía)
+
+class BackendInforme(BackendLLM):
+    """Responde dos filas por documento con su uso de tokens; la primera petición del documento 1 supera la cuota"""
+
+    nombre = 'prueba'
+
+    def __init__(self):
+        super().__init__('prueba')
+        self.llamadas = []
+
+    def generar(self, prompt: str, generation_config: dict = None):
+        numero = re.search(r'Remesa de prueba (\d+)', prompt).group(1)
+        self.llamadas.append(numero)
+        if numero == '1' and self.llamadas.count('1') == 1:
+            raise Exception('429 Resource has been exhausted. Please retry in 0s.')
+        time.sleep(ESPERAS.get(numero, 0))
+        filas = [f"REF{numero}_{i}\tLibrado\tES00\t{numero}.50\t01/01/2025\tEmisorX\tID123\tFile{numero}\tnull\t09/10/2025\tDoc{numero}"
+                 for i in range(2)]
+        return SimpleNamespace(text='\n'.join(filas), usage_metadata=SimpleNamespace(
+            prompt_token_count=100, candidates_token_count=20, total_token_count=120))
+
+def run_report_test():
+    backend = BackendInforme()
+    os.environ['DETECTAR_DUPLICADOS'] = '0'  # el documento copiado debe resolverse por la caché
+    with tempfile.TemporaryDirectory() as pdf_dir, tempfile.TemporaryDirectory() as dir_cache:
+        crear_pdfs_sinteticos(pdf_dir, 3)
+        # Mismo contenido que remesa_000: se procesa después y su respuesta sale de la caché
+        shutil.copy(os.path.join(pdf_dir, 'remesa_000.pdf'), os.path.join(pdf_dir, 'remesa_003.pdf'))
+        salida = os.path.join(pdf_dir, 'output')
+        informe = InformeEjecucion(salida, perfilar_mas_lentos=2)
+        main.configurar_backend(backend)
+        main.configurar_cache_respuestas(CacheRespuestas(dir_cache, 10 * 1024 * 1024, 3600))
+        main.configurar_limitador(LimitadorPeticiones(rpm=6000))
+        main.configurar_informe(informe)
+        try:
+            perfilado = main.perfilado_activo()
+            main.procesar_carpeta(pdf_dir, 1)
+            resumen = informe.cerrar()
+        finally:
+            main.configurar_backend(None)
+            main.configurar_cache_respuestas(None)
+            main.configurar_limitador(None)
+            main.configurar_informe(None)
+            os.environ.pop('DETECTAR_DUPLICADOS', None)
+        with open(os.path.join(salida, NOMBRE_INFORME), 'r', encoding='utf-8') as f:
+            lineas = [json.loads(linea) for linea in f]
+        perfiles = sorted(os.listdir(os.path.join(salida, DIRECTORIO_PERFILES)))
+        funciones = {funcion for _, _, funcion in pstats.Stats(
+            os.path.join(salida, DIRECTORIO_PERFILES, 'remesa_002.prof')).stats}
+
+    archivos = {r['archivo']: r for r in lineas if r['tipo'] == 'archivo'}
+    campos = ('peticiones', 'reintentos', 'tokens_prompt', 'tokens_respuesta', 'aciertos_cache', 'filas')
+    por_archivo = {nombre: tuple(r[c] for c in campos) for nombre, r in archivos.items()}
+    print(f"\nPor archivo {campos}: {por_archivo} - Perfiles: {perfiles}")
+    if [r['tipo'] for r in lineas] != ['archivo'] * 4 + ['resumen'] or lineas[-1] != json.loads(json.dumps(resumen)):
+        print('❌ El informe debía tener una línea por archivo y la del resumen al final')
+        return 1
+    if por_archivo != {'remesa_000.pdf': (1, 0, 100, 20, 0, 2), 'remesa_001.pdf': (1, 1, 100, 20, 0, 2),
+                       'remesa_002.pdf': (1, 0, 100, 20, 0, 2), 'remesa_003.pdf': (0, 0, 0, 0, 1, 2)}:
+        print('❌ Las peticiones, reintentos, tokens, aciertos de caché y filas de cada archivo no son los esperados')
+        return 1
+    if tuple(resumen[c] for c in campos) != (3, 1, 300, 60, 1, 8) or resumen['archivos'] != 4 or resumen['exitosos'] != 4:
+        print(f'❌ Los totales del resumen no suman los de los archivos: {resumen}')
+        return 1
+    if not all(archivos[a]['etapas'].get('modelo', 0) >= ESPERAS[n] for n, a in (('1', 'remesa_001.pdf'), ('2', 'remesa_002.pdf'))) \
+            or {r['archivo'] for r in resumen['mas_lentos'][:2]} != {'remesa_001.pdf', 'remesa_002.pdf'}:
+        print(f"❌ Los tiempos por etapa y los archivos más lentos no son los esperados: {resumen['mas_lentos']}")
+        return 1
+    if not perfilado or perfiles != ['remesa_001.prof', 'remesa_002.prof'] or 'generar' not in funciones:
+        print('❌ Debían guardarse los perfiles de los 2 archivos más lentos, con las llamadas de cada uno')
+        return 1
+
+    print('✅ Prueba del informe de ejecución correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_report_test())
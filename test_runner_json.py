@@ -0,0 +1,67 @@
+import os
+import re
+import json
+import tempfile
+from types import SimpleNamespace
+import pandas as pd
+
+# Import functions from main.py
+import main
+from respuesta_json import CAMPOS
+from test_runner_concurrencia import crear_pdfs_sinteticos
+
+def objeto(numero, importe=None):
+    valores = [f"REF{numero}", f"Librado {numero}", "ES00", importe or f"{numero}.50", "01/01/2025",
+               "EmisorX", "ID123", "FileRef", "10/10/2025", "09/10/2025", f"Doc{numero}"]
+    return dict(zip(CAMPOS, valores))
+
+def run_json_test():
+    peticiones = []
+
+    def llamar_modelo_stub(prompt, generation_config=None):
+        peticiones.append(prompt)
+        if generation_config is None or 'response_schema' not in generation_config:
+            raise AssertionError('Falta el esquema de respuesta')
+        if 'Filas a corregir' in prompt:
+            filas = json.loads(prompt.split('Filas a corregir:\n', 1)[1])
+            if filas[0]['fila']['referencia_unica'] == 'REF1':
+                return SimpleNamespace(text='[]')  # La corrección de este documento falla
+            return SimpleNamespace(text=json.dumps([dict(f['fila'], importe='1234.56') for f in filas]))
+        numero = re.search(r'Remesa de prueba (\d+)', prompt).group(1)
+        # El importe con coma y moneda se normaliza localmente; el escrito en letra se pide corregido
+        filas = [objeto(numero), objeto(numero, importe='mil doscientos'), objeto(numero, importe='1.234,56 €')]
+        texto = json.dumps(filas)
+        if numero == '2':
+            texto = texto[:-30]  # Respuesta cortada: la última fila se pierde
+        return SimpleNamespace(text=texto)
+
+    main.llamar_modelo = llamar_modelo_stub
+    os.environ['FORMATO_RESPUESTA'] = 'json'
+
+    with tempfile.TemporaryDirectory() as pdf_dir:
+        crear_pdfs_sinteticos(pdf_dir, 3)
+        procesados = main.procesar_carpeta(pdf_dir, 2)
+        df = pd.read_csv(os.path.join(pdf_dir, 'output', main.NOMBRE_COMBINADO), sep='\t', dtype=str)
+
+    reparaciones = [p for p in peticiones if 'Filas a corregir' in p]
+    print(f'\nPeticiones: {len(peticiones)} ({len(reparaciones)} de corrección)')
+    if len(procesados) != 3 or len(df) != 8:
+        print(f'❌ Se esperaban 3 archivos y 8 filas: {len(procesados)} archivos, {len(df)} filas')
+        return 1
+    if len(reparaciones) != 3 or any('Remesa de prueba' in p for p in reparaciones):
+        print('❌ Las peticiones de corrección deben ser una por documento y sin el texto del documento')
+        return 1
+    if df['Importe'].tolist().count('1234.56') != 4:
+        print(f"❌ Las filas corregidas no llegaron al TSV: {df['Importe'].tolist()}")
+        return 1
+    # La fila que no se pudo corregir se conserva y la validación la marca
+    sin_corregir = df[df['Importe'] == 'mil doscientos']
+    if len(sin_corregir) != 1 or 'importe' not in str(sin_corregir['Validacion'].iloc[0]):
+        print('❌ La fila que sigue sin ser válida debía conservarse marcada por la validación')
+        return 1
+
+    print('✅ Prueba de la salida estructurada JSON correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_json_test())
@@ -0,0 +1,122 @@
+import os
+import time
+from types import SimpleNamespace
+
+# Import functions from main.py
+import main
+from backends_llm import BackendLLM
+from limitador import LimitadorPeticiones, es_error_de_cuota, espera_sugerida
+
+class ResourceExhausted(Exception):
+    """Como la excepción que lanza la API de Gemini al superar la cuota"""
+
+class BackendCuota(BackendLLM):
+    """Responde con errores de cuota las primeras 'fallos' peticiones"""
+
+    nombre = 'prueba'
+
+    def __init__(self, fallos: int, error: Exception):
+        super().__init__('prueba')
+        self.fallos = fallos
+        self.error = error
+        self.llamadas = []
+
+    def generar(self, prompt: str, generation_config: dict = None):
+        self.llamadas.append(prompt)
+        if len(self.llamadas) <= self.fallos:
+            raise self.error
+        return SimpleNamespace(text='respuesta', usage_metadata=SimpleNamespace(
+            prompt_token_count=10, candidates_token_count=5, total_token_count=15))
+
+def cronometrar(funcion, *args) -> float:
+    inicio = time.monotonic()
+    funcion(*args)
+    return time.monotonic() - inicio
+
+def llamar(backend: BackendLLM, limitador: LimitadorPeticiones):
+    """llamar_modelo con el backend y el limitador indicados; retorna la respuesta o la excepción"""
+    main.configurar_backend(backend)
+    main.configurar_limitador(limitador)
+    try:
+        return main.llamar_modelo('prompt')
+    except Exception as e:
+        return e
+    finally:
+        main.configurar_backend(None)
+        main.configurar_limitador(None)
+
+def run_rate_limiter_test():
+    # 1. Reconocimiento de los errores de cuota y de la espera que sugiere la API
+    cuota = [es_error_de_cuota(e) for e in (ResourceExhausted('x'), Exception('429 Too Many Requests'),
+                                            Exception('Quota exceeded for metric'), Exception('rate limit reached'))]
+    no_cuota = es_error_de_cuota(ValueError('400 Bad Request'))
+    esperas = [espera_sugerida(Exception('429 retry_delay { seconds: 17 }')),
+               espera_sugerida(Exception('Please retry in 2.5s.')), espera_sugerida(Exception('429'))]
+
+    # 2. Presupuestos: la petición que no cabe espera a que se recargue el cubo
+    por_peticiones = LimitadorPeticiones(rpm=600)  # 10 por segundo
+    for _ in range(600):
+        por_peticiones.adquirir()
+    espera_rpm = cronometrar(por_peticiones.adquirir)
+    por_tokens = LimitadorPeticiones(tpm=6000)  # 100 tokens por segundo
+    por_tokens.adquirir(10000)  # mayor que el presupuesto: se limita a él en lugar de bloquear para siempre
+    espera_tpm = cronometrar(por_tokens.adquirir, 50)
+
+    # 3. Un aviso de cuota pausa todas las peticiones, reduce el ritmo a la mitad y se recupera con los éxitos
+    adaptativo = LimitadorPeticiones(rpm=6000)
+    pausa = adaptativo.notificar_limite(0.3)
+    espera_pausa = cronometrar(adaptativo.adquirir)
+    factor_tras_limite = adaptativo.factor
+    adaptativo.notificar_exito()
+    factor_tras_exito = adaptativo.factor
+    # Sin espera sugerida, retroceso exponencial (más un segundo de azar como mucho)
+    retroceso = LimitadorPeticiones(rpm=6000)
+    retrocesos = [retroceso.notificar_limite() for _ in range(3)]
+
+    # 4. llamar_modelo reintenta los errores de cuota tras la pausa y propaga los demás
+    con_reintentos = BackendCuota(2, Exception('429 Resource has been exhausted. Please retry in 0s.'))
+    limitador = LimitadorPeticiones(rpm=6000)
+    respuesta = llamar(con_reintentos, limitador)
+    os.environ['MAX_REINTENTOS_CUOTA'] = '1'
+    try:
+        agotado = BackendCuota(5, ResourceExhausted('quota'))
+        error_agotado = llamar(agotado, LimitadorPeticiones(rpm=6000))
+    finally:
+        os.environ.pop('MAX_REINTENTOS_CUOTA', None)
+    otro_error = BackendCuota(5, ValueError('400 Bad Request'))
+    error_otro = llamar(otro_error, LimitadorPeticiones(rpm=6000))
+
+    print(f"\nEsperas: rpm {espera_rpm:.2f}s, tpm {espera_tpm:.2f}s, pausa {espera_pausa:.2f}s "
+          f"(ritmo {factor_tras_limite:.0%} → {factor_tras_exito:.0%}) - Retrocesos: {[round(r, 1) for r in retrocesos]} - "
+          f"Llamadas con reintentos: {len(con_reintentos.llamadas)}, agotado: {len(agotado.llamadas)}, "
+          f"otro error: {len(otro_error.llamadas)}")
+    if cuota != [True] * 4 or no_cuota or esperas != [17.0, 2.5, None]:
+        print('❌ Los errores de cuota y la espera sugerida no se reconocieron correctamente')
+        return 1
+    if not 0.02 <= espera_rpm < 1 or not 0.3 <= espera_tpm < 2:
+        print('❌ Las peticiones debían esperar a que se recargara el presupuesto de peticiones y de tokens')
+        return 1
+    if not 0.3 <= pausa < 1.3 or espera_pausa < 0.3 or factor_tras_limite != 0.5 or round(factor_tras_exito, 2) != 0.55:
+        print('❌ El aviso de cuota debía pausar las peticiones, reducir el ritmo y recuperarlo poco a poco')
+        return 1
+    if not all(2 ** n <= r < 2 ** n + 1 for n, r in enumerate(retrocesos, 1)):
+        print('❌ Sin espera sugerida el retroceso debía ser exponencial')
+        return 1
+    if getattr(respuesta, 'text', None) != 'respuesta' or len(con_reintentos.llamadas) != 3:
+        print(f'❌ Los errores de cuota debían reintentarse hasta obtener la respuesta: {respuesta!r}')
+        return 1
+    if limitador.limites_recibidos != 2 or round(limitador.factor, 2) != 0.3:
+        print(f'❌ Cada error de cuota debía notificarse al limitador: {limitador.resumen()}')
+        return 1
+    if not isinstance(error_agotado, ResourceExhausted) or len(agotado.llamadas) != 2:
+        print('❌ Tras MAX_REINTENTOS_CUOTA reintentos debía propagarse el error')
+        return 1
+    if not isinstance(error_otro, ValueError) or len(otro_error.llamadas) != 1:
+        print('❌ Un error que no es de cuota no debía reintentarse')
+        return 1
+
+    print('✅ Prueba del limitador de peticiones correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_rate_limiter_test())
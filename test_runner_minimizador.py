@@ -0,0 +1,65 @@
+from collections import Counter
+
+from minimizador import minimizar_paginas, LINEAS_ZONA_CABECERA
+from conteo_filas import ibans_por_pagina
+
+def iban(numero: int) -> str:
+    """IBAN español con dígitos de control correctos"""
+    bban = f"{numero:020d}"
+    control = 98 - int(bban + '142800') % 97  # 'ES' -> 14 28, seguido de '00'
+    return f"ES{control:02d}{bban}"
+
+def detalle(numero: int, referencia: str = None) -> str:
+    return f"{referencia or f'R{numero:06d}'}      Librado {numero}      {iban(numero)}      {numero},50      01/11/2025"
+
+MEMBRETE = ["BANCO EJEMPLO, S.A.", "Remesa de adeudos SEPA"]
+PIE = ["Documento generado electrónicamente"]
+
+def run_minimizer_test():
+    # Página 1: membrete, encabezado de la remesa y detalle; las siguientes repiten membrete y pie.
+    # En las páginas 2 y 3 las líneas de detalle caen dentro de la zona de encabezado, y el
+    # mismo cargo (misma línea) aparece en las dos: son dos filas y ninguna debe perderse
+    repetido = detalle(7, referencia='CUOTA')
+    paginas = [
+        "\n".join(MEMBRETE + ["Emisor: EMPRESA EJEMPLO SA", "Referencia del Fichero: PRE2025000001", ""]
+                  + [detalle(n) for n in range(1, 4)] + PIE + ["Página 1 de 3"]),
+        "\n".join(MEMBRETE + [detalle(4), repetido] + PIE + ["Página 2 de 3"]),
+        "\n".join(MEMBRETE + [repetido, detalle(5)] + PIE + ["Pág. 3/3"]),
+    ]
+    # Una página larga sin membrete: una línea igual a él, pero fuera de la zona de encabezado y pie, no se quita
+    larga = "\n".join([detalle(n) for n in range(10, 10 + LINEAS_ZONA_CABECERA + 5)] + MEMBRETE[:1]
+                      + [detalle(40)] * 5 + PIE)
+
+    minimizadas = minimizar_paginas(paginas)
+    una_pagina = minimizar_paginas([paginas[0]])
+    con_larga = minimizar_paginas(paginas + [larga])
+    texto = "\n".join(minimizadas)
+
+    detalle_antes = sum(ibans_por_pagina(paginas), Counter())
+    detalle_despues = sum(ibans_por_pagina(minimizadas), Counter())
+    print(f"\nCaracteres: {sum(map(len, paginas))} → {sum(map(len, minimizadas))} - "
+          f"Líneas de detalle: {sum(detalle_antes.values())} → {sum(detalle_despues.values())}")
+    if detalle_despues != detalle_antes or texto.count('CUOTA') != 2:
+        print(f'❌ No debía perderse ninguna línea de detalle:\n{texto}')
+        return 1
+    if texto.count(MEMBRETE[0]) != 1 or texto.count(MEMBRETE[1]) != 1 or texto.count(PIE[0]) != 1:
+        print(f'❌ El membrete y el pie repetidos debían conservarse solo la primera vez:\n{texto}')
+        return 1
+    if 'Emisor: EMPRESA EJEMPLO SA' not in minimizadas[0] or not minimizadas[0].startswith(MEMBRETE[0]):
+        print('❌ El encabezado de la primera página debía conservarse')
+        return 1
+    if 'Página' in texto or 'Pág.' in texto or '   ' in texto or '\n\n' in texto:
+        print(f'❌ Debían quitarse los números de página, las líneas vacías y el relleno:\n{texto}')
+        return 1
+    if una_pagina[0].count(MEMBRETE[0]) != 1 or 'Página' in una_pagina[0]:
+        print('❌ Un documento de una página solo debía perder el número de página y el relleno')
+        return 1
+    if con_larga[3].count(MEMBRETE[0]) != 1 or con_larga[3].count(iban(40)) != 5:
+        print('❌ En una página larga solo debían quitarse las repeticiones de la zona de encabezado y pie')
+        return 1
+
+    print('✅ Prueba de la minimización del texto correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_minimizer_test())
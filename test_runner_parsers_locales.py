@@ -0,0 +1,97 @@
+import os
+import tempfile
+import fitz
+import pandas as pd
+
+# Import functions from main.py
+import main
+from plugins_bancos import extraer_con_parsers_locales
+
+def iban(numero: int) -> str:
+    """IBAN español con dígitos de control correctos"""
+    bban = f"{numero:020d}"
+    control = 98 - int(bban + '142800') % 97  # 'ES' -> 14 28, seguido de '00'
+    return f"ES{control:02d}{bban}"
+
+ENCABEZADO = [
+    "Emisor: EMPRESA EJEMPLO SA",
+    "Identificación del Emisor: ES12000B12345678",
+    "Referencia del Fichero: PRE2025000001",
+    "Fecha de Recepción: 10/10/2025   Fecha del Documento: 09/10/2025",
+    "",
+]
+
+COMPLETO = "\n".join(ENCABEZADO + [
+    f"R000001  Ana López  {iban(1)}  1.234,56  01/11/2025  DOC001",
+    f"R000002  Juan Pérez  {iban(2)}  99,00 EUR  01/11/2025  DOC002",
+    f"R000003  Eva Ruiz  {iban(3)}  10,50  15/11/2025  DOC003",
+    f"R000004  Luis Gil  {iban(4)}  7,25  15/11/2025  DOC004",
+])
+
+# Las mismas cuatro líneas, pero dos que el patrón del parser no entiende:
+# la moneda delante del importe y una línea sin referencia del documento
+PARCIAL = "\n".join([linea.replace('PRE2025000001', 'PRE2025000003') for linea in ENCABEZADO] + [
+    f"R000001  Ana López  {iban(1)}  1.234,56  01/11/2025  DOC001",
+    f"R000002  Juan Pérez  {iban(2)}  € 99,00  01/11/2025  DOC002",
+    f"R000003  Eva Ruiz  {iban(3)}  10,50  15/11/2025  DOC003",
+    f"R000004  Luis Gil  {iban(4)}  7,25  15/11/2025",
+])
+
+# Solo dos de las etiquetas del encabezado: no es el formato del parser
+GENERICO = "\n".join(["Referencia del Fichero: PRE2025000002", "Identificación del Emisor: ES12000B12345678",
+                      f"R000005  Ana López  {iban(5)}  5,00  01/11/2025  DOC005"])
+
+def crear_pdf(ruta: str, texto: str) -> None:
+    documento = fitz.open()
+    documento.new_page().insert_text((36, 40), texto, fontsize=8)
+    documento.save(ruta)
+    documento.close()
+
+def run_local_parsers_test():
+    completo = extraer_con_parsers_locales(COMPLETO)
+    parcial = extraer_con_parsers_locales(PARCIAL)
+    generico = extraer_con_parsers_locales(GENERICO)
+
+    llamadas = []
+
+    def modelo_stub(texto):
+        llamadas.append(texto)
+        return '\n'.join(f"R00000{n}\tLibrado\t{iban(n)}\t1.00\t01/11/2025\tEMPRESA EJEMPLO SA\tES12000B12345678\t"
+                         f"PRE2025000001\t10/10/2025\t09/10/2025\tDOC00{n}" for n in range(1, 5))
+
+    original = main.estructurar_informacion_con_gemini
+    main.estructurar_informacion_con_gemini = modelo_stub
+    os.environ.update({'CACHE_RESPUESTAS': '0', 'ALMACEN_TEXTO': '0', 'INFORME_EJECUCION': '0'})
+    try:
+        with tempfile.TemporaryDirectory() as pdf_dir:
+            salida = os.path.join(pdf_dir, 'output')
+            filas = {}
+            for nombre, texto in (('completo', COMPLETO), ('parcial', PARCIAL)):
+                crear_pdf(os.path.join(pdf_dir, f"{nombre}.pdf"), texto)
+                main.procesar_pdf(os.path.join(pdf_dir, f"{nombre}.pdf"), salida)
+                filas[nombre] = len(pd.read_csv(os.path.join(salida, f"{nombre}.tsv"), sep='\t', dtype=str))
+    finally:
+        main.estructurar_informacion_con_gemini = original
+        for variable in ('CACHE_RESPUESTAS', 'ALMACEN_TEXTO', 'INFORME_EJECUCION'):
+            os.environ.pop(variable, None)
+
+    print(f"\nFilas locales: completo {completo and len(completo[1].splitlines())}, parcial {parcial}, "
+          f"genérico {generico} - Llamadas al modelo: {len(llamadas)} - Filas en los TSV: {filas}")
+    if not completo or completo[0] != 'remesa_etiquetada' or len(completo[1].splitlines()) != 4:
+        print('❌ El documento completo debía extraerse localmente con sus 4 filas')
+        return 1
+    if '\t99.00\t' not in completo[1] or '\t1234.56\t' not in completo[1]:
+        print('❌ Los importes debían normalizarse')
+        return 1
+    if parcial is not None or generico is not None:
+        print('❌ Un resultado incompleto o un formato no reconocido debía pasar al modelo')
+        return 1
+    if len(llamadas) != 1 or filas != {'completo': 4, 'parcial': 4}:
+        print('❌ Solo el documento parcial debía enviarse al modelo y ninguno perder filas')
+        return 1
+
+    print('✅ Prueba de los parsers locales correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_local_parsers_test())
@@ -0,0 +1,106 @@
+import os
+import sys
+import tempfile
+from datetime import date
+from decimal import Decimal
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# Import functions from main.py
+import main
+from salida_columnar import tabla_tipada, escribir_salida_columnar, formato_columnar_activo
+from test_runner_concurrencia import crear_pdfs_sinteticos
+
+IBAN = 'ES9121000418450200051332'
+FILA_MODELO = f"00123\tLibrado 0\t{IBAN}\t100.50\t01/01/2025\tEmisorX\tID123\t000045\tnull\t09/10/2025\tDoc0"
+# El TSV guarda los valores tal como los devolvió el modelo: sin quitar ceros ni reformatear importes
+TSV_ESPERADO = ('\t'.join(main.COLUMNAS_TSV + ['Archivo_Origen']) + os.linesep
+                + f"00123\tLibrado 0\t{IBAN}\t100.50\t01/01/2025\tEmisorX\tID123\t000045\t\t09/10/2025\tDoc0\tremesa_000.pdf"
+                + os.linesep)
+
+def escribir_tsv(ruta: str, filas: list) -> None:
+    pd.DataFrame(filas, columns=main.COLUMNAS_TSV + ['Archivo_Origen']).to_csv(ruta, sep='\t', index=False)
+
+def fila(importe: str, vencimiento: str = '01/01/2025', emisor: str = 'EmisorX') -> list:
+    return ['00123', 'Librado', IBAN, importe, vencimiento, emisor, 'ID123', '000045', 'null', '09/10/2025', 'Doc', 'a.pdf']
+
+def leer_dataset(destino: str, formato: str):
+    return ds.dataset(destino, format=formato, partitioning='hive').to_table()
+
+def run_columnar_output_test():
+    # 1. El TSV de cada documento conserva exactamente los valores de texto (dtype=str)
+    main.estructurar_informacion_con_gemini = lambda texto: FILA_MODELO
+    with tempfile.TemporaryDirectory() as pdf_dir:
+        crear_pdfs_sinteticos(pdf_dir, 1)
+        main.procesar_carpeta(pdf_dir, 1)
+        with open(os.path.join(pdf_dir, 'output', 'remesa_000.tsv'), 'r', encoding='utf-8', newline='') as f:
+            tsv = f.read()
+
+    # 2. Conversión tipada: importes decimales (también con coma), fechas existentes y el resto como texto;
+    #    lo que no se puede convertir queda nulo y se cuenta, y 'null' o vacío no cuentan como error
+    df = pd.DataFrame([fila('100.50'), fila('1.234,56'), fila('1.005'), fila('abc'), fila('null', vencimiento='31/02/2025'),
+                       fila('', vencimiento='29/02/2024')], columns=main.COLUMNAS_TSV + ['Archivo_Origen'], dtype=str)
+    tabla, no_convertidos = tabla_tipada(df)
+    importes = tabla.column('Importe').to_pylist()
+    vencimientos = tabla.column('Vencimiento').to_pylist()
+
+    # 3. Dataset particionado en Parquet y Arrow, y fallos de la conversión
+    leidos = {}
+    with tempfile.TemporaryDirectory() as salida:
+        ruta = os.path.join(salida, 'todos_los_documentos.tsv')
+        escribir_tsv(ruta, [fila('100.50'), fila('2.00', emisor='EmisorY'), fila('3.10')])
+        for formato, formato_ds in (('parquet', 'parquet'), ('arrow', 'ipc')):
+            destino = escribir_salida_columnar(ruta, salida, formato)
+            leidos[formato] = (destino, leer_dataset(destino, formato_ds), sorted(os.listdir(destino)))
+
+        # Un TSV sin las columnas de partición no se puede escribir: el dataset anterior se conserva
+        pd.DataFrame({'Importe': ['1.00']}).to_csv(ruta, sep='\t', index=False)
+        fallido = escribir_salida_columnar(ruta, salida, 'parquet')
+        conservado = leer_dataset(os.path.join(salida, 'todos_los_documentos_parquet'), 'parquet').num_rows
+        restos = [n for n in os.listdir(salida) if n.endswith('.tmp')]
+        # Sin pyarrow se omite con un aviso
+        modulo = sys.modules.get('pyarrow.dataset')
+        sys.modules['pyarrow.dataset'] = None
+        try:
+            sin_pyarrow = escribir_salida_columnar(ruta, salida, 'parquet')
+        finally:
+            sys.modules['pyarrow.dataset'] = modulo
+
+    formatos = {}
+    for valor in ('parquet', 'ARROW', 'csv', ''):
+        os.environ['SALIDA_COLUMNAR'] = valor
+        formatos[valor] = formato_columnar_activo()
+    os.environ.pop('SALIDA_COLUMNAR', None)
+
+    print(f"\nImportes: {importes} ({no_convertidos} no convertidos) - Vencimientos: {vencimientos} - "
+          f"Particiones: {leidos['parquet'][2]}")
+    if tsv != TSV_ESPERADO:
+        print(f'❌ El TSV debía conservar los valores como texto:\n{tsv!r}\n{TSV_ESPERADO!r}')
+        return 1
+    if importes != [Decimal('100.50'), Decimal('1234.56'), None, None, None, None] \
+            or vencimientos != [date(2025, 1, 1)] * 4 + [None, date(2024, 2, 29)] or no_convertidos != 3:
+        print('❌ Los importes y las fechas debían convertirse, y contarse solo los valores no válidos')
+        return 1
+    if tabla.schema.field('Importe').type != pa.decimal128(18, 2) or tabla.schema.field('Vencimiento').type != pa.date32() \
+            or tabla.column('Referencia Única').to_pylist()[0] != '00123' or tabla.column('Fecha de Recepción').null_count != 6:
+        print(f'❌ Tipos de la tabla inesperados: {tabla.schema}')
+        return 1
+    for formato, (destino, leida, particiones) in leidos.items():
+        importes_leidos = sorted(leida.column('Importe').to_pylist())
+        if particiones != ['Emisor=EmisorX', 'Emisor=EmisorY'] or leida.num_rows != 3 \
+                or importes_leidos != [Decimal('2.00'), Decimal('3.10'), Decimal('100.50')]:
+            print(f'❌ El dataset {formato} debía tener las 3 filas tipadas, particionado por Emisor: {particiones}')
+            return 1
+    if fallido is not None or conservado != 3 or restos or sin_pyarrow is not None:
+        print(f'❌ Si la conversión falla debía conservarse el dataset anterior sin dejar temporales: {restos}')
+        return 1
+    if formatos != {'parquet': 'parquet', 'ARROW': 'arrow', 'csv': None, '': None}:
+        print(f'❌ SALIDA_COLUMNAR mal interpretado: {formatos}')
+        return 1
+
+    print('✅ Prueba de la salida columnar correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_columnar_output_test())
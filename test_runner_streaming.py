@@ -0,0 +1,225 @@
+import os
+import re
+import time
+import glob
+import tempfile
+from collections import Counter
+from types import SimpleNamespace
+import fitz
+
+# Import functions from main.py
+import main
+from backends_llm import BackendLLM, FlujoRespuesta, ErrorBackend
+from respuesta_streaming import FilasTSV
+
+LINEAS_POR_DOCUMENTO = 5
+
+def crear_pdfs(directorio: str, cantidad: int) -> None:
+    for d in range(cantidad):
+        documento = fitz.open()
+        texto = f"Remesa {d}\n" + "\n".join(f"REF{d}_{i}  Librado {i}  ES00{d:010d}{i:010d}  {i}.50"
+                                            for i in range(LINEAS_POR_DOCUMENTO))
+        documento.new_page().insert_text((72, 72), texto)
+        documento.save(os.path.join(directorio, f"remesa_{d:03d}.pdf"))
+        documento.close()
+
+def crear_pdf_largo(directorio: str, paginas: int = 3) -> None:
+    """Documento '9' de varias páginas; solo la primera tiene el encabezado de la remesa"""
+    documento = fitz.open()
+    for p in range(paginas):
+        texto = ("Remesa 9\n" if p == 0 else "") + "\n".join(
+            f"REF9_{n}  Librado {n}  ES00{9:010d}{n:010d}  {n}.50"
+            for n in range(p * LINEAS_POR_DOCUMENTO, (p + 1) * LINEAS_POR_DOCUMENTO))
+        documento.new_page().insert_text((72, 72), texto)
+    documento.save(os.path.join(directorio, "remesa_largo.pdf"))
+    documento.close()
+
+class BackendPrueba(BackendLLM):
+    """Responde línea a línea, partiendo cada línea en dos trozos; puede cortar la respuesta de un documento"""
+
+    nombre = 'prueba'
+
+    def __init__(self):
+        super().__init__('prueba')
+        self.al_emitir = None
+        self.fallar = set()
+        self.lento = None
+        self.peticiones = Counter()
+
+    @staticmethod
+    def _respuesta(prompt: str):
+        filas = re.findall(r'REF(\d+)_(\d+)\s+Librado \d+\s+(ES\d{22})', prompt)
+        documento = filas[0][0]
+        # Las ventanas sin el encabezado de la remesa no conocen el emisor
+        emisor = 'EmisorX' if re.search(r'Remesa \d', prompt) else 'null'
+        if os.getenv('FORMATO_RESPUESTA') == 'compacto':
+            lineas = [f"{main.MARCA_CABECERA}\t{emisor}\tID123\tFile{documento}\tnull\t09/10/2025"]
+            lineas += [f"REF{d}_{i}\tLibrado {i}\t{iban}\t{i}.50\t01/01/2025\tDoc{d}" for d, i, iban in filas]
+        else:
+            lineas = [f"REF{d}_{i}\tLibrado {i}\t{iban}\t{i}.50\t01/01/2025\t{emisor}\tID123\tFile{d}\tnull\t09/10/2025\tDoc{d}"
+                      for d, i, iban in filas]
+        return documento, lineas
+
+    def generar(self, prompt: str, generation_config: dict = None):
+        documento, lineas = self._respuesta(prompt)
+        self.peticiones[documento] += 1
+        return SimpleNamespace(text='```tsv\n' + '\n'.join(lineas) + '\n```', usage_metadata=None)
+
+    def generar_streaming(self, prompt: str, generation_config: dict = None):
+        documento, lineas = self._respuesta(prompt)
+        self.peticiones[documento] += 1
+        lento = self.lento is not None and self.lento in prompt
+
+        def trozos(flujo):
+            yield '```tsv\n'
+            for i, linea in enumerate(lineas):
+                if lento:
+                    time.sleep(0.1)
+                yield linea[:7]
+                yield linea[7:] + '\n'
+                # Aquí el consumidor ya ha procesado la línea i (o la tiene en cola, si hay varias ventanas)
+                if self.al_emitir is not None:
+                    self.al_emitir(documento, i, linea)
+                if documento in self.fallar and i == 2:
+                    raise ErrorBackend('conexión cortada')
+            yield '```'
+        return FlujoRespuesta(trozos)
+
+def ruta_parcial(salida: str, nombre_tsv: str) -> str:
+    """TSV parcial que este proceso está escribiendo para nombre_tsv (con su PID en el nombre)"""
+    parciales = glob.glob(os.path.join(glob.escape(salida), f"{nombre_tsv}.{os.getpid()}.*.parcial"))
+    assert len(parciales) == 1, parciales
+    return parciales[0]
+
+def leer(ruta: str) -> str:
+    with open(ruta, 'r', encoding='utf-8', newline='') as f:
+        return f.read()
+
+def convertir_en_streaming(respuesta: str) -> list:
+    filas_tsv = FilasTSV(main.COLUMNAS_TSV, main.COLUMNAS_CABECERA, main.MARCA_CABECERA)
+    return [campos for campos in map(filas_tsv.fila, respuesta.splitlines()) if campos is not None]
+
+def run_streaming_test():
+    backend = BackendPrueba()
+    main.configurar_backend(backend)
+    observado = {}
+
+    def al_emitir(documento, i, linea):
+        # A mitad de la respuesta del primer documento sus filas ya están en disco
+        if documento == '0' and i == 1:
+            salida = os.path.join(pdf_dir, 'output')
+            observado[os.environ['FORMATO_RESPUESTA']] = (
+                leer(ruta_parcial(salida, 'remesa_000.tsv')).count('REF0_'),
+                leer(os.path.join(salida, main.NOMBRE_COMBINADO)).count('REF0_'))
+
+    try:
+        resultados = {}
+        for formato in ('completo', 'compacto'):
+            os.environ['FORMATO_RESPUESTA'] = formato
+            for streaming in ('0', '1'):
+                os.environ['RESPUESTA_STREAMING'] = streaming
+                with tempfile.TemporaryDirectory() as pdf_dir:
+                    crear_pdfs(pdf_dir, 3)
+                    backend.al_emitir = al_emitir if streaming == '1' else None
+                    backend.fallar = {'1'} if streaming == '1' else set()
+                    procesados = main.procesar_carpeta(pdf_dir, 1)
+                    salida = os.path.join(pdf_dir, 'output')
+                    resultados[formato, streaming] = {
+                        'procesados': procesados,
+                        'remesa_000': leer(os.path.join(salida, 'remesa_000.tsv')),
+                        'combinado': leer(os.path.join(salida, main.NOMBRE_COMBINADO)),
+                        'restos': [n for n in os.listdir(salida) if n.endswith('.parcial') or n == 'remesa_001.tsv'],
+                    }
+
+        # Documento largo, dividido en una ventana por página: la primera es la
+        # más lenta, así que las siguientes terminan antes y deben esperar a ella
+        os.environ['MAX_TOKENS_FRAGMENTO'] = '80'
+        backend.lento = 'REF9_0 '
+        largo = {}
+        en_disco = {}
+
+        def al_emitir_largo(documento, i, linea):
+            if linea.startswith('REF9_2\t'):
+                ruta = ruta_parcial(os.path.join(pdf_dir, 'output'), 'remesa_largo.tsv')
+                limite = time.time() + 5
+                while 'REF9_1\t' not in leer(ruta) and time.time() < limite:
+                    time.sleep(0.01)
+                en_disco[os.environ['FORMATO_RESPUESTA']] = re.findall(r'^REF9_(\d+)\t', leer(ruta), re.MULTILINE)
+
+        for formato in ('completo', 'compacto'):
+            os.environ['FORMATO_RESPUESTA'] = formato
+            for streaming in ('0', '1'):
+                os.environ['RESPUESTA_STREAMING'] = streaming
+                backend.al_emitir = al_emitir_largo if streaming == '1' else None
+                backend.fallar = set()
+                backend.peticiones.clear()
+                with tempfile.TemporaryDirectory() as pdf_dir:
+                    crear_pdf_largo(pdf_dir)
+                    main.procesar_carpeta(pdf_dir, 1)
+                    largo[formato, streaming] = (leer(os.path.join(pdf_dir, 'output', 'remesa_largo.tsv')),
+                                                 backend.peticiones['9'])
+    finally:
+        main.configurar_backend(None)
+        os.environ.pop('FORMATO_RESPUESTA', None)
+        os.environ.pop('RESPUESTA_STREAMING', None)
+        os.environ.pop('MAX_TOKENS_FRAGMENTO', None)
+
+    # Las líneas con columnas de más o de menos, y las de detalle sin la línea de
+    # encabezado, se descartan en lugar de completarse desplazando los valores
+    cabecera = f"{main.MARCA_CABECERA}\tEmisorX\tID123\tFile1\tnull\t09/10/2025"
+    compacta = '\n'.join([cabecera, 'R1\tN\tES91\t1.00\t01/01/2025\tD1',
+                          'R2\tN\tES92\t2.00\t01/01/2025\tEXTRA\tD2', 'R3\tN\tES93\t3.00'])
+    sin_cabecera = 'R1\tN\tES91\t1.00\t01/01/2025\tD1'
+    expandida = main.expandir_respuesta_compacta(compacta).splitlines()
+    en_streaming = convertir_en_streaming(compacta)
+    if [linea.split('\t')[0] for linea in expandida] != ['R1'] or [campos[0] for campos in en_streaming] != ['R1']:
+        print(f'❌ Las líneas de detalle sin las columnas esperadas debían descartarse: {expandida} {en_streaming}')
+        return 1
+    if expandida[0].split('\t')[5] != 'EmisorX' or en_streaming[0][5] != 'EmisorX':
+        print('❌ La línea de detalle válida debía conservar el encabezado en su columna')
+        return 1
+    if main.expandir_respuesta_compacta(sin_cabecera) or convertir_en_streaming(sin_cabecera):
+        print('❌ Las líneas de detalle sin la línea de encabezado debían descartarse')
+        return 1
+
+    print(f"\nFilas en disco a mitad de la respuesta: {observado}")
+    # (filas en el parcial, filas en el combinado); en compacto la primera línea es el encabezado
+    if observado != {'completo': (2, 2), 'compacto': (1, 1)}:
+        print('❌ Las filas debían escribirse en el TSV y en el combinado según llegaban')
+        return 1
+    for formato in ('completo', 'compacto'):
+        normal, streaming = resultados[formato, '0'], resultados[formato, '1']
+        if streaming['remesa_000'] != normal['remesa_000']:
+            print(f'❌ El TSV escrito en streaming ({formato}) no coincide con el normal')
+            return 1
+        if streaming['procesados'] != ['remesa_000.pdf', 'remesa_002.pdf'] or streaming['restos']:
+            print(f"❌ El documento cortado debía fallar sin dejar archivos: {streaming['procesados']} {streaming['restos']}")
+            return 1
+        # El combinado en streaming es el normal sin las filas del documento que falló
+        esperado = ''.join(linea for linea in normal['combinado'].splitlines(True) if 'remesa_001' not in linea)
+        if streaming['combinado'] != esperado:
+            print(f'❌ El combinado en streaming ({formato}) debía quedar sin las filas del documento cortado')
+            return 1
+
+    print(f"Filas del documento largo en disco mientras llegaba la primera ventana: {en_disco}")
+    for formato in ('completo', 'compacto'):
+        (normal, ventanas_normal), (streaming, ventanas_streaming) = largo[formato, '0'], largo[formato, '1']
+        if ventanas_normal != 3 or ventanas_streaming != 3:
+            print(f'❌ El documento largo debía dividirse en 3 ventanas: {ventanas_normal} y {ventanas_streaming}')
+            return 1
+        if streaming != normal or normal.count('EmisorX') != 3 * LINEAS_POR_DOCUMENTO:
+            print(f'❌ El TSV del documento largo en streaming ({formato}) debía coincidir con el normal, '
+                  f'en el orden de las páginas y con el encabezado en todas las filas')
+            return 1
+    # Las filas de la primera ventana se escriben antes de que termine, y las de las
+    # siguientes (ya recibidas) no se adelantan a ellas
+    if set(en_disco) != {'completo', 'compacto'} or any(
+            not {'0', '1'} <= set(filas) or any(int(n) >= LINEAS_POR_DOCUMENTO for n in filas) for filas in en_disco.values()):
+        print('❌ Las filas del documento largo debían escribirse según llegaban y en el orden de las páginas')
+        return 1
+
+    print('✅ Prueba de la respuesta en streaming correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_streaming_test())
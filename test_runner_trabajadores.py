@@ -0,0 +1,137 @@
+import os
+import re
+import sys
+import json
+import time
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from http.server import ThreadingHTTPServer
+import pandas as pd
+
+# Import functions from main.py
+import main
+from cola_compartida import ColaCompartida, DIRECTORIO_COLA, EXTENSION_CONCESION
+from test_runner_concurrencia import crear_pdfs_sinteticos
+from test_runner_backend_local import ServidorLocal
+
+DOCUMENTOS = 12
+TRABAJADORES = 3
+LATENCIA = 0.4
+
+class ServidorLento(ServidorLocal):
+    """El servidor local, con latencia y registro de los documentos atendidos"""
+
+    peticiones = []
+    conexiones = set()
+    en_curso = 0
+    max_en_curso = 0
+    lock = threading.Lock()
+    atendidos = []
+
+    def _completar(self, cuerpo: dict) -> dict:
+        time.sleep(LATENCIA)
+        with self.lock:
+            self.atendidos.extend(re.findall(r'REF(\d+)', cuerpo['messages'][0]['content']))
+        return super()._completar(cuerpo)
+
+def tsv_tras_perder_concesion(streaming: str) -> tuple:
+    """
+    Procesa un PDF cuya concesión otro trabajador recuperó a mitad del proceso;
+    retorna (resultado, TSV que queda en disco, temporales que quedan)
+    """
+    def modelo_stub(texto):
+        # Mientras el modelo responde, otro trabajador recupera la concesión caducada
+        with open(os.path.join(salida, DIRECTORIO_COLA, f"remesa_000.pdf{EXTENSION_CONCESION}"), 'w', encoding='utf-8') as f:
+            json.dump({'trabajador': 'otro-equipo-1', 'token': 'otro'}, f)
+        return 'REF0\tLibrado\tES00\t0.50\t01/01/2025\tEmisorX\tID123\tFileRef\t10/10/2025\t09/10/2025\tDoc0'
+
+    with tempfile.TemporaryDirectory() as pdf_dir:
+        crear_pdfs_sinteticos(pdf_dir, 1)
+        salida = os.path.join(pdf_dir, 'output')
+        cola = ColaCompartida(salida)
+        cola.reclamar('remesa_000.pdf')
+        with open(os.path.join(salida, 'remesa_000.tsv'), 'w', encoding='utf-8') as f:
+            f.write('del otro trabajador')
+        os.environ['RESPUESTA_STREAMING'] = streaming
+        original = main.estructurar_informacion_con_gemini, main.estructurar_en_streaming
+        main.estructurar_informacion_con_gemini = modelo_stub
+        main.estructurar_en_streaming = lambda texto: iter([modelo_stub(texto).split('\n')])
+        main.configurar_cola(cola)
+        try:
+            ok = main.procesar_pdf(os.path.join(pdf_dir, 'remesa_000.pdf'), salida)
+        finally:
+            main.configurar_cola(None)
+            main.estructurar_informacion_con_gemini, main.estructurar_en_streaming = original
+            os.environ.pop('RESPUESTA_STREAMING', None)
+            cola.cerrar()
+        with open(os.path.join(salida, 'remesa_000.tsv'), 'r', encoding='utf-8') as f:
+            return ok, f.read(), [n for n in os.listdir(salida) if n.endswith(('.tmp', '.parcial'))]
+
+def run_workers_test():
+    # Un trabajador cuya concesión caducó no sustituye el TSV que ya escribe otro
+    for streaming in ('0', '1'):
+        ok, contenido, restos = tsv_tras_perder_concesion(streaming)
+        if ok or contenido != 'del otro trabajador' or restos:
+            print(f'❌ Sin la concesión no debía sustituirse el TSV (streaming={streaming}): {contenido!r} {restos}')
+            return 1
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), ServidorLento)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    entorno = dict(os.environ, URL_LLM=f"http://127.0.0.1:{servidor.server_address[1]}/v1",
+                   CACHE_RESPUESTAS='0', ALMACEN_TEXTO='0', INFORME_EJECUCION='0', PYTHONIOENCODING='utf-8')
+    directorio = os.path.dirname(os.path.abspath(__file__))
+
+    try:
+        with tempfile.TemporaryDirectory() as pdf_dir:
+            crear_pdfs_sinteticos(pdf_dir, DOCUMENTOS)
+            # Concesión de un trabajador que cayó hace una hora a mitad del primer PDF
+            cola = os.path.join(pdf_dir, 'output', DIRECTORIO_COLA)
+            os.makedirs(cola)
+            caida = os.path.join(cola, f"remesa_000.pdf{EXTENSION_CONCESION}")
+            with open(caida, 'w', encoding='utf-8') as f:
+                json.dump({'trabajador': 'equipo-caido-1', 'token': 'caido'}, f)
+            os.utime(caida, (time.time() - 3600, time.time() - 3600))
+
+            procesos = [subprocess.Popen([sys.executable, 'main.py', pdf_dir, '--trabajador', '--backend', 'openai',
+                                          '--modelo', 'modelo-local', '--concurrencia', '1'],
+                                         cwd=directorio, env=entorno, stdout=subprocess.PIPE,
+                                         stderr=subprocess.STDOUT, text=True, encoding='utf-8')
+                        for _ in range(TRABAJADORES)]
+            salidas = [p.communicate(timeout=300)[0] for p in procesos]
+            codigos = [p.returncode for p in procesos]
+
+            df = pd.read_csv(os.path.join(pdf_dir, 'output', main.NOMBRE_COMBINADO), sep='\t', dtype=str)
+            with open(os.path.join(pdf_dir, 'output', 'manifiesto.json'), 'r', encoding='utf-8') as f:
+                manifiesto = json.load(f)['archivos']
+            restos = os.listdir(cola)
+    finally:
+        servidor.shutdown()
+
+    por_trabajador = [int(re.search(r'Procesados por este trabajador: (\d+)', salida).group(1))
+                      if 'Procesados por este trabajador' in salida else None for salida in salidas]
+    veces = Counter(ServidorLento.atendidos)
+    print(f"\nPor trabajador: {por_trabajador} - Peticiones por documento: {dict(sorted(veces.items()))} - "
+          f"Filas: {len(df)} - Restos en la cola: {restos}")
+    if any(codigos) or None in por_trabajador:
+        print('❌ Algún trabajador terminó con error:\n' + '\n'.join(s[-2000:] for s in salidas))
+        return 1
+    if sorted(veces) != sorted(str(i) for i in range(DOCUMENTOS)) or set(veces.values()) != {1}:
+        print('❌ Cada documento debía enviarse al modelo una sola vez entre todos los trabajadores')
+        return 1
+    if sum(por_trabajador) != DOCUMENTOS or sum(1 for n in por_trabajador if n) < 2:
+        print('❌ Los documentos debían repartirse entre los trabajadores')
+        return 1
+    if sorted(df['Referencia Única']) != sorted(f'REF{i}' for i in range(DOCUMENTOS)) or len(manifiesto) != DOCUMENTOS:
+        print('❌ El combinado y el manifiesto debían tener todos los documentos una vez')
+        return 1
+    if not any('Recuperada la concesión caducada de remesa_000.pdf' in s for s in salidas) or restos:
+        print('❌ La concesión caducada debía recuperarse y no debían quedar concesiones')
+        return 1
+
+    print('✅ Prueba de varios trabajadores sobre la misma carpeta correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_workers_test())
@@ -0,0 +1,95 @@
+import os
+import re
+import shutil
+import tempfile
+from types import SimpleNamespace
+import pandas as pd
+
+# Import functions from main.py
+import main
+from cache_llm import CacheRespuestas
+from validacion import validar_dataframe, NOMBRE_INFORME
+from test_runner_concurrencia import crear_pdfs_sinteticos
+
+IBAN_VALIDO = 'ES9121000418450200051332'
+
+def run_validation_test():
+    # Comprobaciones sueltas de cada regla
+    df = pd.DataFrame({
+        'Referencia Única': ['R1', 'R 2ñ', None], 'IBAN': [IBAN_VALIDO, 'ES9121000418450200051333', None],
+        'Importe': ['12.50', '1.234,56', None], 'Vencimiento': ['29/02/2024', '31/02/2025', None],
+        'Fecha de Recepción': [None] * 3, 'Fecha del Documento': ['09/10/2025'] * 3,
+        'Referencia del Fichero': ['F1'] * 3, 'Referencia Única del Documento': ['D'] * 3,
+    })
+    marcas = validar_dataframe(df).tolist()
+    if marcas != ['', 'iban,importe,vencimiento,referencia_unica', 'iban,importe']:
+        print(f'❌ Marcas inesperadas: {marcas}')
+        return 1
+
+    # Un documento con un IBAN mal leído se vuelve a enviar sin leer la caché, y la
+    # respuesta corregida reemplaza a la guardada; el resto no se reenvía
+    llamadas = []
+
+    def llamar_modelo_stub(prompt, generation_config=None):
+        numero = re.search(r'Remesa de prueba (\d+)', prompt).group(1)
+        llamadas.append(numero)
+        iban = 'ES9121000418450200051333' if numero == '1' and llamadas.count('1') == 1 else IBAN_VALIDO
+        return SimpleNamespace(text=f"REF{numero}\tLibrado {numero}\t{iban}\t{numero}.50\t01/01/2025\tEmisorX\tID123\tFileRef\t10/10/2025\t09/10/2025\tDoc{numero}")
+
+    main.llamar_modelo = llamar_modelo_stub
+    os.environ['REPROCESAR_MARCADOS'] = '1'
+
+    with tempfile.TemporaryDirectory() as pdf_dir, tempfile.TemporaryDirectory() as dir_cache:
+        cache = CacheRespuestas(dir_cache, 10 * 1024 * 1024, 3600)
+        main.configurar_cache_respuestas(cache)
+        crear_pdfs_sinteticos(pdf_dir, 3)
+        main.procesar_carpeta(pdf_dir, 2)
+        df = pd.read_csv(os.path.join(pdf_dir, 'output', main.NOMBRE_COMBINADO), sep='\t', dtype=str, keep_default_na=False)
+        informe = pd.read_csv(os.path.join(pdf_dir, 'output', NOMBRE_INFORME), sep='\t')
+        # Sin la salida anterior todo sale de la caché, que ya tiene la respuesta corregida
+        shutil.rmtree(os.path.join(pdf_dir, 'output'))
+        llamadas_previas = len(llamadas)
+        main.procesar_carpeta(pdf_dir, 2)
+        llamadas_desde_cache = len(llamadas) - llamadas_previas
+        df_cache = pd.read_csv(os.path.join(pdf_dir, 'output', main.NOMBRE_COMBINADO), sep='\t', dtype=str, keep_default_na=False)
+        cache_activa = main._cache_respuestas is cache and not cache._refrescar
+        main.configurar_cache_respuestas(None)
+
+    # Un documento que sigue marcado tras reprocesarlo no se reenvía en las ejecuciones sin cambios
+    llamadas_persistentes = []
+
+    def modelo_siempre_marcado(texto):
+        numero = texto.split()[3]
+        llamadas_persistentes.append(numero)
+        iban = 'ES9121000418450200051333' if numero == '0' else IBAN_VALIDO
+        return f"REF{numero}\tLibrado {numero}\t{iban}\t{numero}.50\t01/01/2025\tEmisorX\tID123\tFileRef\t10/10/2025\t09/10/2025\tDoc{numero}"
+
+    main.estructurar_informacion_con_gemini = modelo_siempre_marcado
+    with tempfile.TemporaryDirectory() as pdf_dir:
+        crear_pdfs_sinteticos(pdf_dir, 2)
+        main.procesar_carpeta(pdf_dir, 1)
+        primera = len(llamadas_persistentes)
+        main.procesar_carpeta(pdf_dir, 1)
+        segunda = len(llamadas_persistentes) - primera
+    os.environ.pop('REPROCESAR_MARCADOS', None)
+
+    print(f'\nLlamadas al modelo: {llamadas}')
+    if sorted(llamadas) != ['0', '1', '1', '2']:
+        print('❌ Solo el documento marcado debía reprocesarse')
+        return 1
+    if len(df) != 3 or (df['Validacion'] != '').any() or len(informe) != 0:
+        print(f"❌ Tras reprocesar no deberían quedar filas marcadas: {df['Validacion'].tolist()}")
+        return 1
+    if llamadas_desde_cache != 0 or (df_cache['Validacion'] != '').any() or not cache_activa:
+        print('❌ El reproceso debía reemplazar en la caché la respuesta incorrecta sin desactivarla')
+        return 1
+
+    if primera != 3 or segunda != 0:
+        print(f'❌ El documento marcado sin cambios no debía reenviarse: {primera} y {segunda} llamadas')
+        return 1
+
+    print('✅ Prueba de la validación de datos correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_validation_test())
@@ -0,0 +1,77 @@
+import re
+import time
+
+# Import functions from main.py
+import main
+
+def fila(referencia: str, emisor: str = 'EmisorX', identificacion: str = 'ID123', fichero: str = 'FileRef') -> str:
+    return '\t'.join([referencia, 'Librado', 'ES00', '1.50', '01/01/2025', emisor, identificacion, fichero,
+                      '10/10/2025', '09/10/2025', 'Doc1'])
+
+def run_windows_test():
+    # 1. División en ventanas de páginas consecutivas (unos 4 caracteres por token)
+    paginas = ['a' * 39] * 5  # 10 tokens por página
+    por_tamano = main.dividir_en_ventanas(paginas, 25)
+    sin_division = main.dividir_en_ventanas(paginas, 0)
+    con_pagina_grande = main.dividir_en_ventanas(['a' * 39, 'b' * 400, 'c' * 39, 'd' * 39], 25)
+
+    # 2. Los campos de encabezado vacíos o 'null' se rellenan con el valor más frecuente
+    propagadas = main.propagar_cabecera([
+        fila('REF1'), fila('REF2'), fila('REF3', emisor='EmisorY'),
+        fila('REF4', emisor='null', identificacion='', fichero='null'),
+        'linea\tcon pocas\tcolumnas',
+    ])
+    emisores = [linea.split('\t')[5] for linea in propagadas[:4]]
+    ficheros = [linea.split('\t')[7] for linea in propagadas[:4]]
+
+    # 3. Los fragmentos se piden en paralelo y sus filas se unen en el orden de las páginas,
+    #    aunque los últimos terminen antes; una ventana vacía no se envía
+    peticiones = []
+
+    def estructurar_stub(texto):
+        numeros = [int(n) for n in re.findall(r'Página (\d+)', texto)]
+        peticiones.append(numeros)
+        time.sleep(0.05 * (4 - numeros[0]))
+        if numeros[0] == fallar:
+            return None
+        emisor = 'EmisorX' if 'Remesa' in texto else 'null'
+        return '\n'.join(fila(f'REF{n}', emisor=emisor) for n in numeros)
+
+    original = main.estructurar_informacion_con_gemini
+    main.estructurar_informacion_con_gemini = estructurar_stub
+    paginas_documento = ['Remesa\nPágina 0', 'Página 1', '', 'Página 3']
+    ventanas = [[0], [1], [2], [3]]
+    try:
+        fallar = None
+        unidas = main.estructurar_por_fragmentos(paginas_documento, ventanas)
+        peticiones_correctas = sorted(peticiones)
+        fallar = 1
+        con_fallo = main.estructurar_por_fragmentos(paginas_documento, ventanas)
+    finally:
+        main.estructurar_informacion_con_gemini = original
+
+    referencias = [linea.split('\t')[0] for linea in (unidas or '').splitlines()]
+    emisores_unidas = {linea.split('\t')[5] for linea in (unidas or '').splitlines()}
+    print(f"\nVentanas: {por_tamano} / {sin_division} / {con_pagina_grande} - Emisores: {emisores} - "
+          f"Filas unidas: {referencias}")
+    if por_tamano != [[0, 1], [2, 3], [4]] or sin_division != [[0, 1, 2, 3, 4]]:
+        print('❌ Las páginas debían agruparse en ventanas consecutivas sin superar el límite')
+        return 1
+    if con_pagina_grande != [[0], [1], [2, 3]]:
+        print('❌ Una página que supera el límite por sí sola debía formar su propia ventana')
+        return 1
+    if emisores != ['EmisorX'] * 4 or ficheros != ['FileRef'] * 4 or propagadas[4] != 'linea\tcon pocas\tcolumnas':
+        print(f'❌ El encabezado debía propagarse con el valor más frecuente: {propagadas}')
+        return 1
+    if peticiones_correctas != [[0], [1], [3]] or referencias != ['REF0', 'REF1', 'REF3'] or emisores_unidas != {'EmisorX'}:
+        print('❌ Los fragmentos debían unirse en el orden de las páginas, sin la ventana vacía y con el encabezado')
+        return 1
+    if con_fallo is not None:
+        print('❌ Si falla un fragmento debía fallar el documento')
+        return 1
+
+    print('✅ Prueba de la división en ventanas de páginas correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_windows_test())
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import fitz
+import pyarrow.dataset as ds
+import pandas as pd
+
+# Import functions from main.py
+import main
+from test_runner_concurrencia import crear_pdfs_sinteticos
+from validacion import NOMBRE_INFORME
+
+INTERVALO = 0.2
+
+def columnas_por_linea(ruta: str) -> set:
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return {len(linea.rstrip('\n').split('\t')) for linea in f}
+
+def run_watch_test():
+    llamadas = []
+
+    def modelo_stub(texto):
+        numero = texto.split()[3]
+        llamadas.append(numero)
+        return f"REF{numero}\tLibrado {numero}\tES00\t{numero}.50\t01/01/2025\tEmisorX\tID123\tFileRef\t10/10/2025\t09/10/2025\tDoc{numero}"
+
+    main.estructurar_informacion_con_gemini = modelo_stub
+    os.environ['SALIDA_COLUMNAR'] = 'parquet'
+
+    with tempfile.TemporaryDirectory() as pdf_dir, tempfile.TemporaryDirectory() as origen:
+        crear_pdfs_sinteticos(pdf_dir, 2)
+        nuevos = crear_pdfs_sinteticos(origen, 5)[2:]
+
+        hilo = threading.Thread(target=main.vigilar_carpeta, args=(pdf_dir, 2, INTERVALO, 25))
+        hilo.start()
+        time.sleep(INTERVALO * 3)
+
+        # Llegan PDFs nuevos mientras el proceso sigue vivo
+        for nombre in nuevos:
+            shutil.copy(os.path.join(origen, nombre), os.path.join(pdf_dir, nombre))
+        time.sleep(INTERVALO * 8)
+
+        ruta_combinado = os.path.join(pdf_dir, 'output', main.NOMBRE_COMBINADO)
+        df = pd.read_csv(ruta_combinado, sep='\t')
+        if len(df) != 5 or sorted(llamadas) != ['0', '1', '2', '3', '4']:
+            print(f'❌ Tras la llegada de PDFs nuevos: {len(df)} filas, llamadas {llamadas}')
+            hilo.join()
+            return 1
+        # Las filas anexadas se validan al llegar (el IBAN 'ES00' no es válido): todas
+        # las líneas tienen la columna Validacion y el informe numera las filas nuevas a continuación
+        informe = pd.read_csv(os.path.join(pdf_dir, 'output', NOMBRE_INFORME), sep='\t')
+        columnar = ds.dataset(os.path.join(pdf_dir, 'output', 'todos_los_documentos_parquet'),
+                              format='parquet', partitioning='hive').count_rows()
+        if columnas_por_linea(ruta_combinado) != {len(main.COLUMNAS_TSV) + 2} or not df['Validacion'].str.contains('iban').all():
+            print(f'❌ Las filas anexadas debían añadirse validadas: {columnas_por_linea(ruta_combinado)} columnas')
+            hilo.join()
+            return 1
+        if informe['Fila'].tolist() != [1, 2, 3, 4, 5] or columnar != 5:
+            print(f"❌ Informe de validación {informe['Fila'].tolist()} y salida columnar con {columnar} filas")
+            hilo.join()
+            return 1
+
+        # Un PDF modificado se reprocesa y el combinado se reconstruye sin duplicados
+        documento = fitz.open()
+        documento.new_page().insert_text((72, 72), "Remesa de prueba 7\nmodificada")
+        documento.save(os.path.join(pdf_dir, nuevos[0]))
+        documento.close()
+        hilo.join()
+        os.environ.pop('SALIDA_COLUMNAR', None)
+
+        df = pd.read_csv(ruta_combinado, sep='\t')
+        if len(df) != 5 or llamadas[-1] != '7' or '7.5' not in df['Importe'].astype(str).tolist() \
+                or columnas_por_linea(ruta_combinado) != {len(main.COLUMNAS_TSV) + 2}:
+            print(f'❌ Tras modificar un PDF: {len(df)} filas, llamadas {llamadas}')
+            return 1
+
+    print('✅ Prueba del modo vigilancia correcta')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_watch_test())
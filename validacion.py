@@ -0,0 +1,174 @@
+import os
+import string
+
+COLUMNA_VALIDACION = 'Validacion'
+NOMBRE_INFORME = 'informe_validacion.tsv'
+FILAS_POR_BLOQUE = 200000
+
+COLUMNAS_FECHA = {
+    'Vencimiento': 'vencimiento',
+    'Fecha de Recepción': 'fecha_recepcion',
+    'Fecha del Documento': 'fecha_documento',
+}
+COLUMNAS_REFERENCIA = {
+    'Referencia Única': 'referencia_unica',
+    'Referencia del Fichero': 'referencia_fichero',
+    'Referencia Única del Documento': 'referencia_documento',
+}
+COLUMNAS_INFORME = ['Fila', 'Archivo_Origen', COLUMNA_VALIDACION, 'Referencia Única', 'IBAN', 'Importe']
+
+# Caracteres admitidos por SEPA en las referencias, con su longitud máxima
+_PATRON_REFERENCIA = r"[A-Za-z0-9/\-?:().,'+ ]{1,35}"
+_PATRON_IMPORTE = r'-?\d+(\.\d{1,2})?'
+_PATRON_IBAN = r'[A-Z]{2}\d{2}[A-Z0-9]{11,30}'
+_DIGITOS_POR_PASO = 7
+
+def _vacio(serie):
+    return serie.isna() | serie.isin(['', 'null'])
+
+def iban_valido(serie):
+    """
+    Valida los IBAN de una serie de texto de forma vectorizada: formato y
+    dígitos de control (módulo 97 = 1). Los espacios se ignoran; un valor
+    vacío no es válido.
+    """
+    import numpy as np
+
+    iban = serie.fillna('').astype(str).str.replace(r'\s+', '', regex=True).str.upper()
+    valido = iban.str.fullmatch(_PATRON_IBAN).fillna(False).astype(bool)
+    if not valido.any():
+        return valido
+    # Mover el país y los dígitos de control al final y cambiar cada letra por su número (A=10...)
+    digitos = iban[valido].str[4:] + iban[valido].str[:4]
+    for numero, letra in enumerate(string.ascii_uppercase, 10):
+        digitos = digitos.str.replace(letra, str(numero), regex=False)
+    # Módulo 97 por trozos de 7 dígitos, todos los IBAN a la vez (los ceros a la izquierda no cambian el resto)
+    ancho = -(-int(digitos.str.len().max()) // _DIGITOS_POR_PASO) * _DIGITOS_POR_PASO
+    digitos = digitos.str.zfill(ancho)
+    resto = np.zeros(len(digitos), dtype=np.int64)
+    for inicio in range(0, ancho, _DIGITOS_POR_PASO):
+        trozo = digitos.str[inicio:inicio + _DIGITOS_POR_PASO].astype(np.int64).to_numpy()
+        resto = (resto * 10 ** _DIGITOS_POR_PASO + trozo) % 97
+    valido.loc[valido] = resto == 1
+    return valido
+
+def importe_valido(serie):
+    """Importe con punto decimal y como mucho dos decimales; un valor vacío no es válido"""
+    return serie.fillna('').astype(str).str.strip().str.fullmatch(_PATRON_IMPORTE).fillna(False).astype(bool)
+
+def fecha_valida(serie):
+    """Fecha DD/MM/YYYY existente (31/02 no lo es); un valor vacío se considera válido"""
+    import pandas as pd
+
+    fechas = pd.to_datetime(serie.where(~_vacio(serie)), format='%d/%m/%Y', errors='coerce')
+    return _vacio(serie) | fechas.notna()
+
+def referencia_valida(serie):
+    """Referencia con los caracteres admitidos por SEPA (máx. 35); un valor vacío se considera válido"""
+    return _vacio(serie) | serie.fillna('').astype(str).str.fullmatch(_PATRON_REFERENCIA).fillna(False).astype(bool)
+
+def validar_dataframe(df):
+    """
+    Valida todas las filas de un DataFrame leído como texto y retorna una
+    serie con los problemas de cada fila separados por comas (vacía si la fila
+    es válida): iban, importe, vencimiento, fecha_recepcion, fecha_documento,
+    referencia_unica, referencia_fichero, referencia_documento.
+    """
+    import numpy as np
+    import pandas as pd
+
+    comprobaciones = [('iban', iban_valido(df['IBAN'])), ('importe', importe_valido(df['Importe']))]
+    comprobaciones += [(codigo, fecha_valida(df[columna])) for columna, codigo in COLUMNAS_FECHA.items()]
+    comprobaciones += [(codigo, referencia_valida(df[columna])) for columna, codigo in COLUMNAS_REFERENCIA.items()]
+    marcas = np.full(len(df), '', dtype=object)
+    for codigo, valido in comprobaciones:
+        marcas = np.where(valido.to_numpy(), marcas, marcas + codigo + ',')
+    return pd.Series(marcas, index=df.index, dtype=object).str.rstrip(',')
+
+def validar_archivo_combinado(ruta_tsv: str, ruta_informe: str = None):
+    """
+    Valida el TSV combinado por bloques y lo reescribe con la columna
+    Validacion (vacía en las filas correctas). Las filas con problemas se
+    escriben además en el informe (por defecto informe_validacion.tsv junto al
+    combinado). Si el archivo ya tenía la columna, se recalcula.
+    Retorna (total_filas, filas_marcadas, archivos_marcados).
+    """
+    import pandas as pd
+
+    ruta_informe = ruta_informe or os.path.join(os.path.dirname(ruta_tsv), NOMBRE_INFORME)
+    ruta_tmp = f"{ruta_tsv}.{os.getpid()}.tmp"
+    ruta_informe_tmp = f"{ruta_informe}.{os.getpid()}.tmp"
+    total = 0
+    marcadas = 0
+    archivos_marcados = set()
+    try:
+        with open(ruta_tmp, 'w', encoding='utf-8', newline='') as salida, \
+                open(ruta_informe_tmp, 'w', encoding='utf-8', newline='') as informe:
+            informe.write('\t'.join(COLUMNAS_INFORME) + '\n')
+            primero = True
+            for bloque in pd.read_csv(ruta_tsv, sep='\t', dtype=str, chunksize=FILAS_POR_BLOQUE):
+                bloque = bloque.drop(columns=[COLUMNA_VALIDACION], errors='ignore')
+                bloque[COLUMNA_VALIDACION] = validar_dataframe(bloque)
+                bloque.to_csv(salida, sep='\t', index=False, header=primero)
+                primero = False
+
+                con_problemas = bloque[bloque[COLUMNA_VALIDACION] != ''].copy()
+                con_problemas['Fila'] = con_problemas.index + 1
+                con_problemas[COLUMNAS_INFORME].to_csv(informe, sep='\t', index=False, header=False)
+                total += len(bloque)
+                marcadas += len(con_problemas)
+                archivos_marcados.update(con_problemas['Archivo_Origen'].dropna())
+        os.replace(ruta_tmp, ruta_tsv)
+        os.replace(ruta_informe_tmp, ruta_informe)
+    finally:
+        for ruta in (ruta_tmp, ruta_informe_tmp):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+    return total, marcadas, sorted(archivos_marcados)
+
+def _contar_lineas(ruta: str, hasta: int) -> int:
+    """Número de saltos de línea en los primeros `hasta` bytes del archivo, sin decodificarlo"""
+    lineas = 0
+    with open(ruta, 'rb') as f:
+        while hasta > 0:
+            datos = f.read(min(hasta, 1024 * 1024))
+            if not datos:
+                break
+            lineas += datos.count(b'\n')
+            hasta -= len(datos)
+    return lineas
+
+def validar_filas_anexadas(ruta_tsv: str, desde: int, ruta_informe: str = None):
+    """
+    Valida solo las filas añadidas al combinado a partir del byte `desde` (modo
+    vigilancia) y las reescribe en su sitio con la columna Validacion, que el
+    combinado ya tiene; el resto del archivo no se lee ni se reescribe. Las
+    filas con problemas se añaden al informe.
+    Retorna (filas_nuevas, filas_marcadas, archivos_marcados).
+    """
+    import pandas as pd
+
+    ruta_informe = ruta_informe or os.path.join(os.path.dirname(ruta_tsv), NOMBRE_INFORME)
+    # Número de la primera fila nueva, con la misma numeración que validar_archivo_combinado
+    primera_fila = _contar_lineas(ruta_tsv, desde)
+    with open(ruta_tsv, 'r+', encoding='utf-8', newline='') as f:
+        columnas = f.readline().rstrip('\r\n').split('\t')
+        f.seek(desde)
+        # Las filas anexadas no tienen aún la columna Validacion
+        bloque = pd.read_csv(f, sep='\t', dtype=str, header=None,
+                             names=[c for c in columnas if c != COLUMNA_VALIDACION])
+        if bloque.empty:
+            return 0, 0, []
+        bloque[COLUMNA_VALIDACION] = validar_dataframe(bloque)
+        f.seek(desde)
+        f.truncate()
+        bloque[columnas].to_csv(f, sep='\t', index=False, header=False)
+
+    con_problemas = bloque[bloque[COLUMNA_VALIDACION] != ''].copy()
+    con_problemas['Fila'] = con_problemas.index + primera_fila
+    nuevo_informe = not os.path.exists(ruta_informe)
+    with open(ruta_informe, 'a', encoding='utf-8', newline='') as informe:
+        if nuevo_informe:
+            informe.write('\t'.join(COLUMNAS_INFORME) + '\n')
+        con_problemas[COLUMNAS_INFORME].to_csv(informe, sep='\t', index=False, header=False)
+    return len(bloque), len(con_problemas), sorted(set(con_problemas['Archivo_Origen'].dropna()))